@@ -7,7 +7,9 @@ from app.blueprints.api_v1 import (
 
 #extensions
 from app.extensions import (
-    assets, migrate, jwt, db, cors
+    assets, migrate, jwt, db, cors, redis_service, token_blocklist, email_queue,
+    password_hasher, rate_limiter, metrics, health_monitor, user_cache, catalog,
+    version_stamps, compression, db_router, asset_index
 )
 
 #utils
@@ -15,25 +17,46 @@ from app.utils.exceptions import (
     APIException
 )
 from app.utils.helpers import JSONResponse
-from app.utils.redis_service import redis_client
+from app.utils.json_provider import AppJSONProvider
+from app.commands import register_commands
 from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 def create_app(test_config=None):
     ''' Application-Factory Pattern '''
     app = Flask(__name__)
     if test_config == None:
         app.config.from_object(os.environ['APP_SETTINGS'])
+    else:
+        app.config.from_mapping(test_config)
+
+    app.json = AppJSONProvider(app)
+    if app.config.get('PROXY_FIX_X_FOR'): #client ip behind the platform router
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
     
     #error hanlders
     app.register_error_handler(HTTPException, handle_http_error)
     app.register_error_handler(APIException, handle_API_Exception)
         
     #extensions
+    metrics.init_app(app) #first, its before_request hook starts the request timer
     db.init_app(app)
+    db_router.init_app(app)
     assets.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     cors.init_app(app, resources={r"/api/*": {"origins": "*"}})
+    redis_service.init_app(app)
+    token_blocklist.init_app(app)
+    email_queue.init_app(app)
+    password_hasher.init_app(app)
+    rate_limiter.init_app(app)
+    health_monitor.init_app(app)
+    user_cache.init_app(app)
+    version_stamps.init_app(app)
+    catalog.init_app(app) #after version_stamps, as asset_index
+    asset_index.init_app(app) #after version_stamps, its commit listener reads the bumped stamp
+    compression.init_app(app)
 
     #API BLUEPRINTS
     app.register_blueprint(auth.auth_bp, url_prefix='/api/v1/auth')
@@ -41,6 +64,9 @@ def create_app(test_config=None):
     app.register_blueprint(status.status_bp, url_prefix='/api/v1/status')
     app.register_blueprint(manage.manage_bp, url_prefix='/api/v1/manage')
 
+    #cli commands
+    register_commands(app)
+
     return app
 
 
@@ -56,15 +82,12 @@ def handle_API_Exception(exception): #exception == APIException
 #callbacks
 @jwt.token_in_blocklist_loader #check if a token is stored in the blocklist db.
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload['jti']
-    r = redis_client()
+    return token_blocklist.is_revoked(jwt_payload)
 
-    try:
-        token_in_redis = r.get(jti)
-    except:
-        raise APIException("connection error with redis service", status_code=500)
 
-    return token_in_redis is not None
+@jwt.additional_claims_loader #token generation of the identity, see token_blocklist.revoke_all
+def add_token_generation(identity):
+    return token_blocklist.generation_claims(identity)
 
 
 @jwt.revoked_token_loader
@@ -6,7 +6,7 @@ from flask import (
 )
 #extensions
 from app.extensions import (
-    db
+    db, password_hasher, token_blocklist
 )
 #models
 from app.models.main import (
@@ -18,7 +18,6 @@ from sqlalchemy.exc import (
 )
 from app.utils.exceptions import APIException
 #jwt
-from werkzeug.security import check_password_hash
 from flask_jwt_extended import (
     create_access_token, get_jwt
 )
@@ -27,7 +26,7 @@ from app.utils.helpers import (
     normalize_names, JSONResponse
 )
 from app.utils.validations import (
-    validate_email, validate_pw, only_letters, validate_inputs
+    email_field, password_field, letters_field
 )
 from app.utils.email_service import (
     send_verification_email
@@ -35,15 +34,19 @@ from app.utils.email_service import (
 from app.utils.decorators import (
     json_required, verification_token_required, verified_token_required, user_required
 )
-from app.utils.redis_service import add_jwt_to_blocklist
-from app.utils.db_operations import get_user_by_email
+from app.utils.db_operations import get_user_by_email, rehash_password
 
 
 auth_bp = Blueprint('auth_bp', __name__)
 
 
 @auth_bp.route('/sign-up', methods=['POST']) #normal signup
-@json_required({"email":str, "password":str, "fname":str, "lname":str})
+@json_required({
+    "email": email_field(),
+    "password": password_field(),
+    "fname": letters_field(spaces=True),
+    "lname": letters_field(spaces=True)
+})
 def signup():
     """
     * PUBLIC ENDPOINT *
@@ -58,12 +61,6 @@ def signup():
 
     body = request.get_json(silent=True)
     email, password, fname, lname = body['email'].lower(), body['password'], body['fname'], body['lname']
-    validate_inputs({
-        'email': validate_email(email),
-        'password': validate_pw(password),
-        'fname': only_letters(fname, spaces=True),
-        'lname': only_letters(lname, spaces=True)
-    })
 
     q_user = User.check_user_exists(email=email)
 
@@ -92,7 +89,7 @@ def signup():
 
 
 @auth_bp.route('/login', methods=['POST']) #normal login
-@json_required({"email":str, "password":str})
+@json_required({"email": email_field(), "password": password_field()})
 def login():
     """
     * PUBLIC ENDPOINT *
@@ -104,11 +101,6 @@ def login():
     body = request.get_json(silent=True)
     email, pw = body['email'].lower(), body['password']
 
-    validate_inputs({
-        'email': validate_email(email),
-        'password': validate_pw(pw)
-    })
-
     #?processing
     user = get_user_by_email(email)
 
@@ -118,8 +110,11 @@ def login():
     if not user.email_confirmed:
         raise APIException("user's email not validated", status_code=401)
 
-    if not check_password_hash(user.password_hash, pw):
+    if not password_hasher.verify(user.password_hash, pw):
         raise APIException("wrong password", status_code=403)
+
+    if password_hasher.needs_rehash(user.password_hash):
+        rehash_password(user, pw)
     
     #*user-access-token
     access_token = create_access_token(
@@ -152,22 +147,19 @@ def logout():
 
     """
 
-    add_jwt_to_blocklist(get_jwt())
+    token_blocklist.revoke_token(get_jwt())
     resp = JSONResponse("user logged-out of current session")
     return resp.to_json()
 
 
 @auth_bp.route('/get-verification-code', methods=['GET'])
-@json_required({'email':str}, query_params=True)
+@json_required({'email': email_field()}, query_params=True)
 def get_verification_code():
     """
     * PUBLIC ENDPOINT *
     Endpoint to request a new verification code to restar the password or to validate a user email.
     """
     email = str(request.args.get('email'))
-    validate_inputs({
-        'email': validate_email(email)
-    })
 
     #?processing
     user = get_user_by_email(email)
@@ -216,7 +208,7 @@ def check_verification_code():
     if (code_in_request != code_in_token):
         raise APIException("invalid verification code")
     
-    add_jwt_to_blocklist(claims) #invalida el uso del token una vez se haya validado del codigo
+    token_blocklist.revoke_token(claims) #invalida el uso del token una vez se haya validado del codigo
 
     verified_user_token = create_access_token(
         identity=claims['sub'], 
@@ -253,14 +245,14 @@ def confirm_user_email():
         db.session.rollback()
         raise APIException(e.orig.args[0], status_code=422) # integrityError or DataError info
     
-    add_jwt_to_blocklist(claims)
+    token_blocklist.revoke_token(claims)
 
     resp = JSONResponse(message="user's email has been confirmed")
     return resp.to_json()
 
 
 @auth_bp.route("/password-change", methods=['PUT'])
-@json_required({"new_password":str})
+@json_required({"new_password": password_field()})
 @verified_token_required()
 def password_change():
     """
@@ -272,10 +264,6 @@ def password_change():
     claims = get_jwt()
     new_password = request.get_json().get('new_password')
 
-    validate_inputs({
-        'password': validate_pw(new_password)
-    })
-
     user = get_user_by_email(claims['sub'])
     
     user.password = new_password
@@ -285,14 +273,14 @@ def password_change():
     except (IntegrityError, DataError) as e:
         raise APIException(e.orig.args[0], status_code=422)
 
-    add_jwt_to_blocklist(claims)
+    token_blocklist.revoke_all(user.email) #cierra todas las sesiones del usuario, incluido este token
 
     resp = JSONResponse(message="user's password updated")
     return resp.to_json()
 
 
 @auth_bp.route('/login/super-user', methods=['POST']) #super-user login
-@json_required({"password":str})
+@json_required({"password": password_field()})
 @verified_token_required()
 def login_super_user():
     """
@@ -304,10 +292,6 @@ def login_super_user():
     body = request.get_json(silent=True)
     pw = body['password']
 
-    validate_inputs({
-        'password': validate_pw(pw)
-    })
-
     claims = get_jwt()
     email = claims['sub']
     user = get_user_by_email(email)
@@ -323,8 +307,11 @@ def login_super_user():
     if not user.email_confirmed:
         raise APIException("user's email not validated", status_code=401)
 
-    if not check_password_hash(user.password_hash, pw):
+    if not password_hasher.verify(user.password_hash, pw):
         raise APIException("wrong password", status_code=403)
+
+    if password_hasher.needs_rehash(user.password_hash):
+        rehash_password(user, pw)
     
     #*super-user_access-token
     access_token = create_access_token(
@@ -335,7 +322,7 @@ def login_super_user():
         }
     )
 
-    add_jwt_to_blocklist(claims)
+    token_blocklist.revoke_token(claims)
 
     #?response
     resp = JSONResponse(
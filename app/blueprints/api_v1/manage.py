@@ -1,11 +1,16 @@
+import io
 from flask import (
-    Blueprint
+    Blueprint, request, current_app
 )
 
-from app.models.main import Role, Plan, Asset
+from app.extensions import db, asset_index
+from app.models.main import Role, Plan, Asset, User
 from app.utils.exceptions import APIException
 from app.utils.helpers import JSONResponse
-from app.utils.decorators import (json_required, super_user_required)
+from app.utils.pagination import encode_cursor, decode_cursor, page_size, keyset_page
+from app.utils.asset_import import AssetImport, read_rows
+from app.utils.provisioning import provision_users
+from app.utils.decorators import (json_required, super_user_required, conditional_get, read_only)
 
 manage_bp = Blueprint('manage_bp', __name__)
 
@@ -23,14 +28,263 @@ def set_app_globals():
 
 @manage_bp.route('/get-asset-path/<int:asset_id>', methods=['GET'])
 @json_required()
+@read_only()
+@conditional_get('assets')
 def get_asset_path(asset_id):
 
-    asset = Asset.query.get(asset_id)
-    if not asset:
+    path = Asset.get_path(asset_id)
+    if path is None:
         raise APIException(f"asset {asset_id} not found")
-        
-    path = asset.serialize_path()
     
     resp = JSONResponse("path to root",payload=path)
 
-    return resp.to_json()
\ No newline at end of file
+    return resp.to_json()
+
+
+@manage_bp.route('/get-asset-hierarchy/<int:asset_id>', methods=['GET'])
+@json_required()
+@read_only()
+def get_asset_hierarchy(asset_id):
+    """
+    Posicion de un activo en el arbol, respondida por el indice en memoria (asset_index), sin consultas a la db.
+    Los activos que aun no estan en el indice se buscan en la db.
+    query params:
+        under: int, id de otro activo. "under" en la respuesta indica si asset_id esta debajo de el.
+    """
+    under = request.args.get('under', type=int)
+    if asset_index.available():
+        try:
+            payload = {
+                'id': asset_id,
+                'parent_id': asset_index.parent(asset_id),
+                'depth': asset_index.depth(asset_id),
+                'path': asset_index.path(asset_id),
+                'subtree_size': asset_index.subtree_size(asset_id)
+            }
+        except KeyError: #not in the index, or newer than the arrays being reloaded
+            payload = _asset_hierarchy_from_db(asset_id, under)
+        else:
+            if under is not None:
+                payload['under'] = asset_index.is_under(asset_id, under)
+    else:
+        payload = _asset_hierarchy_from_db(asset_id, under)
+
+    resp = JSONResponse("asset hierarchy", payload=payload)
+    return resp.to_json()
+
+
+def _asset_hierarchy_from_db(asset_id, under):
+    #arbol mayor que ASSET_INDEX_MAX_NODES o indice deshabilitado.
+    node = Asset.get_path(asset_id)
+    if node is None:
+        raise APIException(f"asset {asset_id} not found")
+    path = []
+    while node != 'root':
+        path.append(node['id'])
+        node = node['parent']
+    path.reverse()
+
+    descendants = Asset.subtree_query(asset_id).subquery()
+    payload = {
+        'id': asset_id,
+        'parent_id': path[-2] if len(path) > 1 else None,
+        'depth': len(path) - 1,
+        'path': path,
+        'subtree_size': db.session.scalar(db.select(db.func.count()).select_from(descendants)) + 1
+    }
+    if under is not None:
+        payload['under'] = under in path[:-1]
+    return payload
+
+
+@manage_bp.route('/assets', methods=['GET'])
+@json_required()
+@read_only()
+def list_assets():
+    """
+    Lista de activos ordenados por id, paginada por cursor.
+    query params:
+        parent_id: int, solo los hijos directos de este activo.
+        roots: 'true', solo los activos sin padre.
+        limit: int, activos por pagina.
+        cursor: str, "next_cursor" de la pagina anterior.
+    """
+    parent_id = request.args.get('parent_id', type=int)
+    roots = request.args.get('roots', '').lower() == 'true'
+    limit = _list_page_size()
+
+    stmt = db.select(Asset)
+    if roots:
+        stmt = stmt.where(Asset.parent_id.is_(None))
+    elif parent_id is not None:
+        stmt = stmt.where(Asset.parent_id == parent_id)
+
+    assets, next_cursor = keyset_page(
+        'assets', stmt, Asset.id, limit, cursor=request.args.get('cursor'),
+        filters={'parent_id': parent_id, 'roots': roots}
+    )
+
+    resp = JSONResponse("assets", payload={
+        'assets': [{**a.serialize(), 'parent_id': a.parent_id} for a in assets],
+        'next_cursor': next_cursor
+    })
+    return resp.to_json()
+
+
+@manage_bp.route('/users', methods=['GET'])
+@json_required()
+@super_user_required()
+@read_only()
+def list_users():
+    """
+    Lista de usuarios ordenados por id, paginada por cursor.
+    query params:
+        limit: int, usuarios por pagina.
+        cursor: str, "next_cursor" de la pagina anterior.
+    """
+    users, next_cursor = keyset_page(
+        'users', db.select(User), User.id, _list_page_size(), cursor=request.args.get('cursor')
+    )
+
+    resp = JSONResponse("users", payload={
+        'users': [{**u.serialize(), 'email': u.email} for u in users],
+        'next_cursor': next_cursor
+    })
+    return resp.to_json()
+
+
+def _list_page_size() -> int:
+    return page_size(
+        request.args.get('limit', type=int),
+        default=current_app.config.get('LIST_PAGE_SIZE', 100),
+        maximum=current_app.config.get('LIST_MAX_PAGE_SIZE', 1000)
+    )
+
+
+@manage_bp.route('/get-asset-subtree/<int:asset_id>', methods=['GET'])
+@json_required()
+@read_only() #rows are streamed after the handler returns, a replica failure there isn't retried
+def get_asset_subtree(asset_id):
+    """
+    Descendientes de un activo, ordenados por nivel (depth) e id. La respuesta se envia por partes.
+    query params:
+        max_depth: int, niveles a incluir debajo del activo. default: todo el arbol.
+        limit: int, nodos por pagina.
+        cursor: str, "next_cursor" de la pagina anterior.
+    """
+    max_depth = request.args.get('max_depth', type=int)
+    if max_depth is not None and max_depth < 0:
+        raise APIException("invalid max_depth, must be >= 0", payload={"invalid": {"max_depth": max_depth}})
+
+    limit = page_size(
+        request.args.get('limit', type=int),
+        default=current_app.config.get('ASSET_SUBTREE_PAGE_SIZE', 5000),
+        maximum=current_app.config.get('ASSET_SUBTREE_MAX_PAGE_SIZE', 20000)
+    )
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = decode_cursor('asset-subtree', cursor)
+        if position.get('root') != asset_id:
+            raise APIException("invalid cursor in request", payload={"invalid": {"cursor": cursor}})
+        after = (position['depth'], position['id'])
+
+    if db.session.query(Asset.id).filter_by(id=asset_id).scalar() is None:
+        raise APIException(f"asset {asset_id} not found")
+
+    last = {}
+
+    def nodes():
+        rows = db.session.execute(
+            Asset.subtree_query(asset_id, max_depth=max_depth, after=after, limit=limit + 1),
+            execution_options={'yield_per': 500}
+        )
+        for n, row in enumerate(rows):
+            if n == limit:
+                last['more'] = True
+                break
+            last['row'] = row
+            yield {
+                'id': row.id,
+                'name': row.name,
+                'description': row.description,
+                'parent_id': row.parent_id,
+                'depth': row.depth
+            }
+        rows.close()
+
+    def trailer():
+        if not last.get('more'):
+            return {'next_cursor': None}
+        row = last['row']
+        return {'next_cursor': encode_cursor('asset-subtree', {'root': asset_id, 'depth': row.depth, 'id': row.id})}
+
+    resp = JSONResponse("asset subtree", payload={'asset_id': asset_id, 'max_depth': max_depth})
+    return resp.to_json_stream('nodes', nodes(), trailer)
+
+
+@manage_bp.route('/import-assets', methods=['POST'])
+@super_user_required()
+def import_assets():
+    """
+    Importa un arbol de activos desde un archivo csv o ndjson, enviado como cuerpo de la solicitud.
+    Cada fila: key, parent_key (vacio en las raices), name, description.
+    La importacion corre dentro del request, limitada por ASSET_IMPORT_MAX_BYTES y ASSET_IMPORT_MAX_ROWS;
+    para archivos grandes usar el comando `flask import-assets`.
+    query params:
+        format: 'csv' o 'ndjson'. default: segun el content-type.
+        parent_id: int, activo bajo el cual se crean las raices del archivo.
+    respuesta:
+        "created": int, "error_count": int, "errors": [{"line", "key", "error"}]
+    """
+    max_bytes = current_app.config.get('ASSET_IMPORT_MAX_BYTES', 5 * 2**20)
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise APIException(f"file too large, max is {max_bytes} bytes, use the import-assets command for larger files", status_code=413)
+
+    fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (request.mimetype or '') else 'csv')
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+
+    importer = AssetImport(
+        parent_id=request.args.get('parent_id', type=int),
+        chunk_size=current_app.config.get('ASSET_IMPORT_CHUNK_SIZE', 5000)
+    )
+    report = importer.run(_limit_rows(read_rows(stream, fmt), current_app.config.get('ASSET_IMPORT_MAX_ROWS', 50000)))
+
+    resp = JSONResponse("assets imported", payload=report)
+    return resp.to_json()
+
+
+def _limit_rows(rows, max_rows):
+    #the whole file is read before the first insert, a larger one is rejected without changes.
+    for n, row in enumerate(rows, start=1):
+        if n > max_rows:
+            raise APIException(f"too many rows in file, max is {max_rows}, use the import-assets command for larger files", status_code=413)
+        yield row
+
+
+@manage_bp.route('/provision-users', methods=['POST'])
+@json_required({"users": list})
+@super_user_required()
+def provision_users_batch():
+    """
+    Crea usuarios en lote. Los hashes se calculan dentro del request, el lote esta limitado
+    por PROVISION_MAX_USERS; para archivos grandes usar el comando `flask provision-users`.
+    requerido: {
+        "users": [{"email": str, "password": str, "fname": str, "lname": str}, ...],
+        "send_invitations": bool, optional, default: true
+    }
+    respuesta:
+        "created": int, "existing": [email], "errors": [{"row", "email", "error", "data"}]
+    """
+    body = request.get_json(silent=True)
+    users = body['users']
+    max_users = current_app.config.get('PROVISION_MAX_USERS', 200)
+    if len(users) > max_users:
+        raise APIException(f"too many users in request, max is {max_users}, use the provision-users command for larger files", status_code=413)
+
+    report = provision_users(users, send_invitations=body.get('send_invitations', True) is not False)
+
+    resp = JSONResponse(f"{report['created']} users created", status_code=201 if report['created'] else 200, payload=report)
+    return resp.to_json()
+
@@ -8,9 +8,9 @@ from sqlalchemy.exc import IntegrityError, DataError
 #utils
 from app.utils.exceptions import APIException
 from app.utils.helpers import normalize_names, JSONResponse
-from app.utils.validations import validate_inputs, only_letters
-from app.utils.decorators import json_required, user_required
-from app.utils.db_operations import get_user_by_email
+from app.utils.validations import letters_field
+from app.utils.decorators import json_required, user_required, conditional_get, read_only
+from app.utils.db_operations import get_user_by_email, get_user_profile
 
 #models
 from app.models.main import User
@@ -21,6 +21,8 @@ profile_bp = Blueprint('profile_bp', __name__)
 @profile_bp.route('/', methods=['GET'])
 @json_required()
 @user_required()
+@read_only()
+@conditional_get('user', key=lambda **kw: get_jwt_identity(), private=True)
 def get_profile():
     """
     * PRIVATE ENDPOINT *
@@ -37,15 +39,12 @@ def get_profile():
         }
     """
     identity = get_jwt_identity()
-    # user = get_user_by_email(identity) #get_jwt_indentity get the user id from jwt.
-    user = get_user_by_email(email=identity)
-    if user is None:
-        raise APIException(f"email: {identity} not found in database", status_code=404, app_result="q_not_found")
+    user = get_user_profile(identity) #served from the user cache when warm
 
     resp = JSONResponse(
         message="user profile", 
         payload={
-            "user": user.serialize(), 
+            "user": user, 
             "identity": identity
         })
 
@@ -53,7 +52,13 @@ def get_profile():
 
 
 @profile_bp.route('/update', methods=['PUT'])
-@json_required({"fname":str, "lname":str, "home_address":dict, "image":str, "phone":str})
+@json_required({
+    "fname": letters_field(spaces=True, max_length=128),
+    "lname": letters_field(spaces=True, max_length=128),
+    "home_address": dict,
+    "image": str,
+    "phone": str
+})
 @user_required()
 def update_profile():
 
@@ -62,11 +67,6 @@ def update_profile():
     body = request.get_json(silent=True)
     fname, lname, home_address, image, phone = \
     body['fname'], body['lname'], body['home_address'], body['image'], body['phone']
-    
-    validate_inputs({
-        'fname': only_letters(fname, spaces=True, max_length=128),
-        'lname': only_letters(lname, spaces=True, max_length=128)
-    })
 
     if len(image) > 255: #?special validation, find out if you needo to do more validations on urls
         raise APIException("profile img url is too long")
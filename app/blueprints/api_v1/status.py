@@ -1,28 +1,72 @@
+import os
 from flask import (
-    Blueprint
+    Blueprint, Response
 )
 
-from app.models.main import Role
-from app.utils.redis_service import redis_client
+from app.extensions import redis_service, metrics, health_monitor, db_router
 from app.utils.exceptions import APIException
 from app.utils.helpers import JSONResponse
+from app.utils.decorators import metrics_token_required
 
 status_bp = Blueprint('status_bp', __name__)
 
 @status_bp.route('/', methods=['GET'])
 def api_status_ckeck():
 
-    try:
-        Role.query.get(1)
-    except:
-        raise APIException(message="postgresql service is down", app_result="error", status_code=500)
+    snapshot = health_monitor.snapshot() #cached, refreshed in the background
+    if snapshot['status'] == 'down':
+        down = [name for name, dep in snapshot['dependencies'].items() if not dep['up']]
+        raise APIException(message=f"{', '.join(down)} service is down", app_result="error", status_code=500, payload=snapshot)
 
-    try:
-        r = redis_client()
-        r.ping()
+    resp = JSONResponse("app online", payload=snapshot)
+    return resp.to_json()
 
-    except:
-        raise APIException(message="redis service is down", app_result="error", status_code=500)
 
-    resp = JSONResponse("app online")
-    return resp.to_json()
\ No newline at end of file
+@status_bp.route('/redis-pool', methods=['GET'])
+@metrics_token_required()
+def redis_pool_stats():
+
+    #the pool of the worker process that answered
+    resp = JSONResponse("redis pool stats", payload={'pid': os.getpid(), 'pool': redis_service.pool_stats()})
+    return resp.to_json()
+
+
+@metrics.add_gauges
+def redis_pool_gauges():
+    stats = redis_service.pool_stats()
+    return {
+        'redis_pool_connections': {
+            (('state', state),): stats[state] for state in ('in_use', 'idle', 'created', 'max_connections')
+        },
+        'redis_pool_waits': {(): stats['waits']},
+        'redis_pool_timeouts': {(): stats['timeouts']}
+    }
+
+
+@status_bp.route('/db-pools', methods=['GET'])
+@metrics_token_required()
+def db_pool_stats():
+
+    resp = JSONResponse("db pool stats", payload={'pid': os.getpid(), 'pools': db_router.pool_stats()})
+    return resp.to_json()
+
+
+@metrics.add_gauges
+def db_pool_gauges():
+    stats = db_router.pool_stats()
+    gauges = {'db_pool_connections': {}, 'db_routed_reads': {}, 'db_replica_failures': {}}
+    for bind, item in stats.items():
+        for state in ('size', 'checked_in', 'checked_out', 'overflow'):
+            if item[state] is not None:
+                gauges['db_pool_connections'][(('bind', bind), ('state', state))] = item[state]
+        if 'reads' in item:
+            gauges['db_routed_reads'][(('bind', bind),)] = item['reads']
+            gauges['db_replica_failures'][(('bind', bind),)] = item['failures']
+    return gauges
+
+
+@status_bp.route('/metrics', methods=['GET'])
+@metrics_token_required()
+def prometheus_metrics():
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,89 @@
+import csv
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.extensions import assets, token_blocklist
+from app.utils.email_queue import EmailWorker
+from app.utils.asset_import import AssetImport, read_rows, FORMATS
+from app.utils.provisioning import provision_users
+
+
+@click.command('email-worker')
+@click.option('--burst', is_flag=True, help="exit once the queue is empty.")
+@click.option('--worker-id', default=None, help="stable id of this worker, defaults to the hostname.")
+@with_appcontext
+def email_worker_command(burst, worker_id):
+    '''sends the emails waiting in the email queue.'''
+    worker = EmailWorker(current_app._get_current_object(), worker_id=worker_id)
+    click.echo(f"email worker {worker.worker_id} started")
+    try:
+        worker.run(burst=burst)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@click.command('import-assets')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None, help="defaults to the file extension.")
+@click.option('--parent-id', type=int, default=None, help="asset under which the roots of the file are created.")
+@click.option('--chunk-size', type=int, default=None, help="rows inserted per transaction.")
+@with_appcontext
+def import_assets_command(path, fmt, parent_id, chunk_size):
+    '''imports an asset tree from a csv or ndjson file.'''
+    fmt = fmt or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    importer = AssetImport(
+        parent_id=parent_id,
+        chunk_size=chunk_size or current_app.config.get('ASSET_IMPORT_CHUNK_SIZE', 5000)
+    )
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = importer.run(read_rows(f, fmt))
+
+    click.echo(f"{report['created']} assets created, {report['error_count']} errors")
+    for error in report['errors'][:20]:
+        click.echo(f"line {error['line']}, key {error['key']}: {error['error']}")
+
+
+@click.command('provision-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--no-invitations', is_flag=True, help="don't queue the invitation emails.")
+@click.option('--chunk-size', type=int, default=1000, help="users inserted per transaction.")
+@with_appcontext
+def provision_users_command(path, no_invitations, chunk_size):
+    '''creates the users of a csv file (email,password,fname,lname).'''
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        users = list(csv.DictReader(f))
+
+    report = provision_users(users, send_invitations=not no_invitations, chunk_size=chunk_size)
+
+    click.echo(f"{report['created']} users created, {len(report['existing'])} already existed, {len(report['errors'])} errors")
+    for error in report['errors'][:20]:
+        click.echo(f"row {error['row']}, {error['email']}: {error['error']} {error['data'] or ''}")
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    '''compiles the css / js bundles into content-hashed, precompressed files and writes the asset manifest.'''
+    manifest = assets.build()
+    encodings = current_app.extensions['asset_pipeline'].precompress
+    for name, path in sorted(manifest.items()):
+        click.echo(f"{name}: {path} (precompressed: {', '.join(encodings) or 'none'})")
+    click.echo(f"manifest written to {current_app.config['ASSETS_MANIFEST']}")
+
+
+@click.command('revoke-sessions')
+@click.argument('email')
+@with_appcontext
+def revoke_sessions_command(email):
+    '''revokes every token issued to a user, all of its sessions are closed.'''
+    token_blocklist.revoke_all(email.lower())
+    click.echo(f"sessions of {email.lower()} revoked")
+
+
+def register_commands(app):
+    app.cli.add_command(email_worker_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(import_assets_command)
+    app.cli.add_command(provision_users_command)
+    app.cli.add_command(revoke_sessions_command)
@@ -1,15 +1,38 @@
-from flask_assets import Environment
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
-from .utils.assets import bundles
+from .utils.assets import AssetPipeline
+from .utils.migrations import LazyMigrate
+from .utils.redis_service import RedisService
+from .utils.token_blocklist import TokenBlocklist
+from .utils.email_queue import EmailQueue
+from .utils.passwords import PasswordHasher
+from .utils.rate_limit import RateLimiter
+from .utils.metrics import Metrics
+from .utils.health import HealthMonitor
+from .utils.user_cache import UserCache
+from .utils.catalog import Catalog
+from .utils.versions import VersionStamps
+from .utils.compression import Compression
+from .utils.db_routing import DatabaseRouter, RoutingSession
+from .utils.asset_index import AssetIndex
 
-assets = Environment()
-assets.register(bundles)
-
-migrate = Migrate()
-db = SQLAlchemy()
+assets = AssetPipeline()
+migrate = LazyMigrate()
+db = SQLAlchemy(session_options={'class_': RoutingSession}) #reads of read-only handlers go to the replicas
 jwt = JWTManager()
-cors = CORS()
\ No newline at end of file
+cors = CORS()
+redis_service = RedisService()
+token_blocklist = TokenBlocklist()
+email_queue = EmailQueue()
+password_hasher = PasswordHasher()
+rate_limiter = RateLimiter()
+metrics = Metrics()
+health_monitor = HealthMonitor()
+user_cache = UserCache()
+catalog = Catalog()
+version_stamps = VersionStamps()
+compression = Compression()
+db_router = DatabaseRouter()
+asset_index = AssetIndex()
\ No newline at end of file
@@ -2,8 +2,11 @@
 from app.extensions import db
 from datetime import datetime
 
+from sqlalchemy import literal_column, or_, and_
 from sqlalchemy.dialects.postgresql import JSON
-from sqlalchemy.orm import backref
+from sqlalchemy.orm import backref, aliased
+
+MAX_TREE_DEPTH = 256 #guard against cycles in the parent_id chain
 
 
 class Asset(db.Model):
@@ -29,10 +32,94 @@ class Asset(db.Model):
         }
 
     def serialize_path(self) -> dict: #path to root
-        return {
-            ** self.serialize(),
-            'parent': self.parent.serialize_path() if self.parent is not None else 'root'
-        }
+        return Asset.get_path(self.id)
+
+    @staticmethod
+    def get_path(asset_id) -> dict:
+        '''
+        path to root of an asset, loaded in a single query with a recursive CTE.
+        returns None if the asset doesn't exists.
+        '''
+        ancestors = db.select(
+            Asset.id, Asset.name, Asset.description, Asset.parent_id, literal_column("0").label('depth')
+        ).where(Asset.id == asset_id).cte('ancestors', recursive=True)
+
+        parent = aliased(Asset)
+        ancestors = ancestors.union_all(
+            db.select(
+                parent.id, parent.name, parent.description, parent.parent_id, ancestors.c.depth + 1
+            ).where(parent.id == ancestors.c.parent_id, ancestors.c.depth < MAX_TREE_DEPTH)
+        )
+
+        rows = db.session.execute(db.select(ancestors).order_by(ancestors.c.depth.desc())).all()
+        if not rows:
+            return None
+
+        path = 'root'
+        for row in rows: #from the root down to the requested asset
+            path = {
+                'id': row.id,
+                'name': row.name,
+                'description': row.description,
+                'parent': path
+            }
+        return path
+
+    @staticmethod
+    def subtree_query(asset_id, max_depth=None, after=None, limit=None):
+        '''
+        select of the descendants of asset_id (not included), ordered by (depth, id),
+        built with a recursive CTE. rows: id, name, description, parent_id, depth.
+        - max_depth: levels below asset_id to include, None = whole subtree.
+        - after: (depth, id) keyset position, only rows after it are returned.
+        - limit: max rows, also bounds the levels walked (every level adds at least one row).
+        with a cursor, the levels above it are walked carrying only (id, depth) and the
+        full rows start at the cursor level. those levels can't be skipped, the nodes
+        at the cursor level are only reachable through them.
+        '''
+        max_depth = MAX_TREE_DEPTH if max_depth is None else min(max_depth, MAX_TREE_DEPTH)
+        start = 1 if after is None else after[0]
+        if limit is not None:
+            #rows of a page span at most `limit` levels after the cursor level
+            max_depth = min(max_depth, start + limit - (1 if after is None else 0))
+
+        if after is None:
+            anchor = db.select(
+                Asset.id, Asset.name, Asset.description, Asset.parent_id, literal_column("1").label('depth')
+            ).where(Asset.parent_id == asset_id)
+        else:
+            levels = db.select(
+                Asset.id, literal_column("1").label('depth')
+            ).where(Asset.parent_id == asset_id).cte('levels', recursive=True)
+            node = aliased(Asset)
+            levels = levels.union_all(
+                db.select(node.id, levels.c.depth + 1).where(
+                    node.parent_id == levels.c.id, levels.c.depth < min(start, max_depth)
+                )
+            )
+            anchor = db.select(
+                Asset.id, Asset.name, Asset.description, Asset.parent_id, levels.c.depth
+            ).join(levels, Asset.id == levels.c.id).where(levels.c.depth == start)
+        descendants = anchor.cte('descendants', recursive=True)
+
+        child = aliased(Asset)
+        descendants = descendants.union_all(
+            db.select(
+                child.id, child.name, child.description, child.parent_id, descendants.c.depth + 1
+            ).where(child.parent_id == descendants.c.id, descendants.c.depth < max_depth)
+        )
+
+        q = db.select(descendants).where(descendants.c.depth <= max_depth)
+        if after is not None:
+            depth, last_id = after
+            q = q.where(or_(
+                descendants.c.depth > depth,
+                and_(descendants.c.depth == depth, descendants.c.id > last_id)
+            ))
+        q = q.order_by(descendants.c.depth, descendants.c.id)
+        if limit is not None:
+            q = q.limit(limit)
+        return q
 
     def serialize_children(self) -> dict:
         return {
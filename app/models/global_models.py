@@ -1,7 +1,24 @@
 from app.extensions import db
 from datetime import datetime
 from sqlalchemy.orm import backref
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.dialects.postgresql import JSON, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+DEFAULT_ROLES = [
+    #administrador
+    {'name': 'Administrador', 'code': 'admin', 'global_role': True,
+    'permits': {'create': True, 'read': True, 'update': True, 'delete': True}},
+    #tecnico ejecutor de mantenimientos
+    {'name': 'Tecnico', 'code': 'tech', 'global_role': True,
+    'permits': {'create': False, 'read': True, 'update': True, 'delete': False}},
+    #observador de datos, solo lectura
+    {'name': 'Observador', 'code': 'obs', 'global_role': True,
+    'permits': {'create': False, 'read': True, 'update': False, 'delete': False}}
+]
+
+DEFAULT_PLANS = [
+    {'name': 'Plan Basico', 'code': 'basic', 'limits': {'assets': 20, 'admin': 1, 'tech': 1, 'obs': 'nl'}}
+]
 
 
 class Role(db.Model):
@@ -26,47 +43,11 @@ class Role(db.Model):
         }
 
     def add_default_roles():
-        commit = False
-        admin = Role.query.filter_by(code='admin').first() #administrador
-        if admin is None:
-            admin = Role(
-                name = 'Administrador', 
-                code='admin', 
-                global_role=True
-                #default permits
-            )
-            
-            db.session.add(admin)
-            commit = True
-
-        tech = Role.query.filter_by(code='tech').first() #tecnico ejecutor de mantenimientos
-        if tech is None:
-            tech = Role(
-                name='Tecnico', 
-                code='tech', 
-                global_role=True,
-                permits = {'create': False, 'read': True, 'update': True, 'delete': False}
-            )
-
-            db.session.add(tech)
-            commit = True
-
-        obs = Role.query.filter_by(code='obs').first() #observador de datos, solo lectura
-        if obs is None:
-            obs = Role(
-                name='Observador', 
-                code = 'obs', 
-                global_role=True,
-                permits = {'create': False, 'read': True, 'update': False, 'delete': False}
-            )
-
-            db.session.add(obs)
-            commit = True
-
-        if commit:
-            db.session.commit()
-        
-        pass
+        '''
+        inserts the default roles missing in the db, one statement. existing roles are not modified.
+        '''
+        _insert_missing(Role, DEFAULT_ROLES)
+        db.session.commit()
 
 
 class Plan(db.Model):
@@ -90,20 +71,17 @@ class Plan(db.Model):
         }
 
     def add_default_plans():
-        
-        commit = False
-        basic = Plan.query.filter_by(code='basic').first()
-        if basic is None:
-            basic = Plan(
-                name = 'Plan Basico',
-                code = 'basic'
-                #default limits
-            )
-            
-            db.session.add(basic)
-            commit = True
-
-        if commit:
-            db.session.commit()
-
-        pass
\ No newline at end of file
+        '''
+        inserts the default plans missing in the db, one statement. existing plans are not modified.
+        '''
+        _insert_missing(Plan, DEFAULT_PLANS)
+        db.session.commit()
+
+
+def _insert_missing(model, rows):
+    #INSERT .. ON CONFLICT (code) DO NOTHING
+    if db.session.get_bind().dialect.name == 'sqlite':
+        stmt = sqlite_insert(model)
+    else:
+        stmt = pg_insert(model)
+    db.session.execute(stmt.values(rows).on_conflict_do_nothing(index_elements=['code']))
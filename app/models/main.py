@@ -1,8 +1,7 @@
 
-from app.extensions import db
+from app.extensions import db, password_hasher
 from datetime import datetime
 
-from werkzeug.security import generate_password_hash
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import backref
 
@@ -59,7 +58,7 @@ class User(db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password, method='sha256')
+        self.password_hash = password_hasher.hash(password)
 
 
 class Company(db.Model):
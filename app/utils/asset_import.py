@@ -0,0 +1,194 @@
+import csv
+import json
+from collections import defaultdict
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db
+from app.models.assets_models import Asset, MAX_TREE_DEPTH
+from app.utils.exceptions import APIException
+
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+NAME_MAX_LENGTH = 128
+
+
+def read_rows(stream, fmt:str):
+    '''
+    Lee las filas de un archivo de activos, linea por linea.
+    Args:
+        * stream: archivo de texto, csv con encabezado (key,parent_key,name,description)
+        o ndjson con un objeto por linea con las mismas llaves.
+        * fmt (str): 'csv' o 'ndjson'
+    Returns:
+        iterador de (line, row, error): row es una tupla (key, parent_key, name, description)
+        o None si la linea tiene un error.
+    '''
+    if fmt == 'csv':
+        return _read_csv(stream)
+    if fmt == 'ndjson':
+        return _read_ndjson(stream)
+    raise APIException(f"invalid import format, one of: {', '.join(FORMATS)}", payload={"invalid": {"format": fmt}})
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None or not {'key', 'name'} <= set(reader.fieldnames):
+        raise APIException("invalid csv header, required columns: key, name", payload={"invalid": {"header": reader.fieldnames}})
+
+    for data in reader:
+        yield _parse(reader.line_num, data)
+
+
+def _read_ndjson(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            yield line, None, f"invalid json: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield line, None, "invalid json, an object is expected"
+            continue
+        yield _parse(line, data)
+
+
+def _parse(line, data):
+    key = _text(data.get('key'))
+    parent_key = _text(data.get('parent_key'))
+    name = _text(data.get('name'))
+    description = data.get('description') or None
+
+    if not key:
+        return line, None, "missing key"
+    if not name:
+        return line, None, "missing name"
+    if len(name) > NAME_MAX_LENGTH:
+        return line, None, f"name is too long, max {NAME_MAX_LENGTH} characters"
+    return line, (key, parent_key, name, description), None
+
+
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+class AssetImport():
+    '''
+    Bulk import of an asset hierarchy, rows linked by external keys (key, parent_key).
+
+    - rows are read line by line and kept as tuples, parents are resolved once the
+    whole file is read: rows without parent_key are the roots (children of parent_id).
+    - levels of the tree are inserted in order, each level in chunks of chunk_size rows,
+    one executemany INSERT .. RETURNING and one transaction per chunk.
+    - errors are reported per row (line and key), the rest of the file is imported.
+    rows below a row with errors are not imported.
+    '''
+
+    def __init__(self, parent_id=None, chunk_size=5000):
+        self.parent_id = parent_id
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self._failed = set() #keys of valid rows that couldn't be inserted
+
+    def error(self, line, key, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "key": key, "error": message})
+
+    def run(self, rows) -> dict:
+        '''
+        rows: iterable of (line, row, error) as returned by read_rows.
+        '''
+        if self.parent_id is not None and db.session.get(Asset, self.parent_id) is None:
+            raise APIException(f"asset {self.parent_id} not found")
+
+        nodes = {} #key -> (line, parent_key, name, description)
+        children = defaultdict(list)
+        roots = []
+        for line, row, error in rows:
+            if row is None:
+                self.error(line, None, error)
+                continue
+            key, parent_key, name, description = row
+            if key in nodes:
+                self.error(line, key, f"duplicated key, first defined in line {nodes[key][0]}")
+                continue
+            nodes[key] = (line, parent_key, name, description)
+            if parent_key:
+                children[parent_key].append(key)
+            else:
+                roots.append(key)
+
+        ids = self._insert_levels(nodes, children, roots)
+        self._report_orphans(nodes, ids)
+
+        return {
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors
+        }
+
+    def _insert_levels(self, nodes, children, roots) -> dict:
+        ids = {} #key -> asset id
+        stmt = insert(Asset).returning(Asset.id, sort_by_parameter_order=True)
+        level, depth = roots, 0
+        while level:
+            depth += 1
+            if depth > MAX_TREE_DEPTH:
+                for key in level:
+                    self._failed.add(key)
+                    self.error(nodes[key][0], key, f"max tree depth ({MAX_TREE_DEPTH}) exceeded")
+                break
+
+            next_level = []
+            for i in range(0, len(level), self.chunk_size):
+                chunk = level[i:i + self.chunk_size]
+                params = []
+                for key in chunk:
+                    _, parent_key, name, description = nodes[key]
+                    params.append({
+                        'name': name,
+                        'description': description,
+                        'parent_id': ids[parent_key] if parent_key else self.parent_id
+                    })
+                try:
+                    new_ids = db.session.scalars(stmt, params).all()
+                    db.session.commit()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    reason = str(getattr(e, 'orig', None) or e)
+                    for key in chunk:
+                        self._failed.add(key)
+                        self.error(nodes[key][0], key, f"insert failed: {reason}")
+                    continue
+
+                self.created += len(new_ids)
+                for key, asset_id in zip(chunk, new_ids):
+                    ids[key] = asset_id
+                    next_level.extend(children.get(key, ()))
+            level = next_level
+        return ids
+
+    def _report_orphans(self, nodes, ids):
+        #valid rows never reached from a root: unknown parent, parent with errors, or a cycle.
+        for key, (line, parent_key, _, _) in nodes.items():
+            if key in ids or key in self._failed:
+                continue
+            if parent_key not in nodes:
+                self.error(line, key, f"parent_key {parent_key} not found")
+            elif _in_cycle(key, nodes):
+                self.error(line, key, "cycle in parent keys")
+            else:
+                self.error(line, key, f"parent_key {parent_key} was not imported")
+
+
+def _in_cycle(key, nodes) -> bool:
+    seen = set()
+    while key in nodes and key not in seen:
+        seen.add(key)
+        key = nodes[key][1]
+    return key in seen
@@ -0,0 +1,475 @@
+import time
+import logging
+import threading
+from array import array
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, func
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+ABSENT = -1 #parent of an id without asset
+ROOT = 0 #parent of the assets without parent, slot 0 is the virtual root of the forest
+MAX_WALK = 256 #same guard as MAX_TREE_DEPTH of the asset model, against cycles
+
+
+class _Hierarchy():
+    '''
+    asset tree in int32 arrays indexed by asset id (~20 bytes per id).
+
+    - parent: parent id, ROOT or ABSENT.
+    - depth: 0 for the assets without parent.
+    - size: nodes of the subtree, the asset included.
+    - tin / tout: euler tour interval (preorder), tin = -1 for assets inserted after the build.
+
+    stale: a move (reparent) changed the ancestors of a subtree, tin / tout / depth are
+    outdated until the next build. parent and size are always up to date.
+    '''
+
+    __slots__ = ('parent', 'depth', 'size', 'tin', 'tout', 'nodes', 'stale', 'version', 'stamp', 'loaded_at')
+
+    def __init__(self, parent, nodes):
+        self.parent = parent
+        self.nodes = nodes
+        self.stale = False
+        self.version = 0 #incremental updates applied
+        self.stamp = None #version stamp of the assets at load time
+        self.loaded_at = time.monotonic()
+        self._build()
+
+    def _build(self):
+        #children grouped by parent with a counting sort, then an iterative dfs from the virtual root.
+        parent = self.parent
+        n = len(parent)
+        start = array('i', [0]) * (n + 1)
+        for p in parent:
+            if p >= 0:
+                start[p + 1] += 1
+        for i in range(n):
+            start[i + 1] += start[i]
+
+        kids = array('i', [0]) * start[n]
+        fill = array('i', start)
+        for node, p in enumerate(parent):
+            if p >= 0 and node:
+                kids[fill[p]] = node
+                fill[p] += 1
+        del fill
+
+        depth = array('i', [-1]) * n
+        tin = array('i', [-1]) * n
+        tout = array('i', [-1]) * n
+        nxt = array('i', start)
+        clock = 0
+        stack = [ROOT]
+        while stack:
+            v = stack[-1]
+            i = nxt[v]
+            if i < start[v + 1]:
+                nxt[v] = i + 1
+                c = kids[i]
+                tin[c] = clock
+                clock += 1
+                depth[c] = depth[v] + 1
+                stack.append(c)
+            else:
+                tout[v] = clock
+                stack.pop()
+
+        size = array('i', [1]) * n
+        for node in range(1, n):
+            if tin[node] >= 0:
+                size[node] = tout[node] - tin[node]
+        self.depth, self.size, self.tin, self.tout = depth, size, tin, tout
+
+    def __contains__(self, asset_id):
+        return 0 < asset_id < len(self.parent) and self.parent[asset_id] != ABSENT
+
+    def ancestors(self, asset_id):
+        #parents of asset_id, nearest first.
+        parent = self.parent
+        node = parent[asset_id]
+        for _ in range(MAX_WALK):
+            if node <= ROOT:
+                return
+            yield node
+            node = parent[node]
+
+    def get_depth(self, asset_id) -> int:
+        if not self.stale and self.depth[asset_id] >= 0:
+            return self.depth[asset_id]
+        return sum(1 for _ in self.ancestors(asset_id))
+
+    def is_under(self, asset_id, ancestor_id) -> bool:
+        if self.stale:
+            return any(a == ancestor_id for a in self.ancestors(asset_id))
+        tin, tout = self.tin, self.tout
+        if tin[ancestor_id] < 0: #inserted after the build, its subtree is only of new assets
+            return any(a == ancestor_id for a in self.ancestors(asset_id))
+        node = asset_id
+        for _ in range(MAX_WALK):
+            if tin[node] >= 0:
+                return node != ancestor_id and tin[ancestor_id] <= tin[node] < tout[ancestor_id]
+            node = self.parent[node]
+            if node <= ROOT:
+                return False
+            if node == ancestor_id:
+                return True
+        return False
+
+    def grow(self, capacity):
+        extra = capacity - len(self.parent)
+        if extra > 0:
+            self.parent.extend(array('i', [ABSENT]) * extra)
+            self.depth.extend(array('i', [-1]) * extra)
+            self.size.extend(array('i', [1]) * extra)
+            self.tin.extend(array('i', [-1]) * extra)
+            self.tout.extend(array('i', [-1]) * extra)
+
+    def add_size(self, asset_id, delta):
+        for a in self.ancestors(asset_id):
+            self.size[a] += delta
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.parent, self.depth, self.size, self.tin, self.tout))
+
+
+class AssetIndex():
+    '''
+    In-memory index of the asset tree, answers hierarchy questions without the db:
+    parent, depth, path to root, "is X under Y" and subtree size.
+
+    - int32 arrays indexed by asset id: parent, depth, subtree size and euler tour
+    intervals. "is X under Y" is an interval check, O(1).
+    - memory is bounded by ASSET_INDEX_MAX_NODES: ~20 bytes per id. beyond it the index
+    is not built and available() is False, the callers use the db.
+    - commits of this process update it at once: inserts and deletes of single assets in
+    O(depth), a move updates parent and sizes and rebuilds the intervals in the background
+    (from the arrays, not the db). bulk statements reload it in the background on next use,
+    assets newer than the arrays are KeyError meanwhile.
+    - changes of other processes are found with the ('assets', None) version stamp, checked
+    every ASSET_INDEX_CHECK_INTERVAL seconds, and reloaded in the background while the
+    current index keeps answering. without stamps (redis down) the index is reloaded
+    every ASSET_INDEX_MAX_AGE seconds.
+
+    config:
+    - ASSET_INDEX_ENABLED: default True.
+    - ASSET_INDEX_MAX_NODES: largest asset id indexed.
+    - ASSET_INDEX_CHECK_INTERVAL: seconds between version stamp checks.
+    - ASSET_INDEX_MAX_AGE: seconds.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSET_INDEX_ENABLED', True)
+        app.config.setdefault('ASSET_INDEX_MAX_NODES', 2000000)
+        app.config.setdefault('ASSET_INDEX_CHECK_INTERVAL', 5)
+        app.config.setdefault('ASSET_INDEX_MAX_AGE', 300)
+
+        app.extensions['asset_index'] = _IndexState(app)
+        _listen_session_events()
+
+    @staticmethod
+    def _state(app=None):
+        return (app or current_app).extensions['asset_index']
+
+    def available(self) -> bool:
+        '''
+        False if the index is disabled or the tree is larger than ASSET_INDEX_MAX_NODES.
+        '''
+        return self._state().hierarchy() is not None
+
+    def parent(self, asset_id):
+        '''
+        parent id of asset_id, None for the assets without parent. KeyError if asset_id doesn't exists.
+        '''
+        p = self._get(asset_id).parent[asset_id]
+        return p if p != ROOT else None
+
+    def depth(self, asset_id) -> int:
+        '''
+        ancestors of asset_id, 0 for the assets without parent.
+        '''
+        return self._get(asset_id).get_depth(asset_id)
+
+    def path(self, asset_id) -> list:
+        '''
+        ids from the root down to asset_id, asset_id included.
+        '''
+        h = self._get(asset_id)
+        path = [asset_id, *h.ancestors(asset_id)]
+        path.reverse()
+        return path
+
+    def is_under(self, asset_id, ancestor_id) -> bool:
+        '''
+        True if ancestor_id is an ancestor (not itself) of asset_id.
+        '''
+        h = self._get(asset_id)
+        return ancestor_id in h and h.is_under(asset_id, ancestor_id)
+
+    def subtree_size(self, asset_id) -> int:
+        '''
+        assets of the subtree of asset_id, asset_id included.
+        '''
+        return self._get(asset_id).size[asset_id]
+
+    def stats(self) -> dict:
+        return self._state().stats()
+
+    def reload(self, app=None):
+        self._state(app).reload()
+
+    def _get(self, asset_id):
+        h = self._state().hierarchy()
+        if h is None:
+            raise RuntimeError("asset index unavailable, check available() first")
+        if asset_id not in h:
+            raise KeyError(asset_id)
+        return h
+
+
+class _IndexState():
+
+    def __init__(self, app):
+        self.enabled = app.config['ASSET_INDEX_ENABLED']
+        self.max_nodes = app.config['ASSET_INDEX_MAX_NODES']
+        self.check_interval = app.config['ASSET_INDEX_CHECK_INTERVAL']
+        self.max_age = app.config['ASSET_INDEX_MAX_AGE']
+        self._app = app
+        self._hierarchy = None
+        self._too_large = None #monotonic time of a load skipped by max_nodes
+        self._reload = False #bulk changes of this process, reloaded in the background
+        self._loading = False
+        self._next_check = 0
+        self._background = None
+        self._lock = threading.Lock()
+
+    def hierarchy(self):
+        if not self.enabled:
+            return None
+        h = self._hierarchy
+        now = time.monotonic()
+        if h is None:
+            if self._too_large is not None and now - self._too_large < self.max_age:
+                return None
+            with self._lock:
+                if self._hierarchy is None:
+                    self._load()
+            return self._hierarchy
+
+        if self._reload:
+            #answers from the current arrays until the new ones are read, apply() isn't blocked meanwhile.
+            self._start(self._background_load)
+            return h
+
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            stamp = self._stamp()
+            if (stamp is None and now - h.loaded_at > self.max_age) or (stamp is not None and stamp != h.stamp):
+                self._start(self._background_load)
+        if h.stale:
+            self._start(self._rebuild)
+        return h
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def stats(self) -> dict:
+        h = self._hierarchy
+        if h is None:
+            return {'loaded': False, 'too_large': self._too_large is not None}
+        return {
+            'loaded': True,
+            'nodes': h.nodes,
+            'capacity': len(h.parent),
+            'bytes': h.nbytes(),
+            'stale': h.stale,
+            'age': round(time.monotonic() - h.loaded_at, 1)
+        }
+
+    def _stamp(self):
+        stamps = self._app.extensions.get('version_stamps')
+        if stamps is None:
+            return None
+        value = stamps.get('assets', None)
+        return value[0] if value is not None else None
+
+    def _load(self):
+        self._hierarchy = self._read()
+        self._reload = False
+
+    def _read(self):
+        #own connection, also called from session.after_commit and background threads.
+        from app.models.main import Asset
+        stamp = self._stamp() #before the rows, a change made meanwhile is found by the next check
+        with self._app.app_context():
+            with self._app.extensions['sqlalchemy'].engine.connect() as conn:
+                max_id, nodes = conn.execute(select(func.max(Asset.id), func.count(Asset.id))).one()
+                max_id = max_id or 0
+                if max_id > self.max_nodes:
+                    logger.warning("asset index not built, %s ids over ASSET_INDEX_MAX_NODES (%s)", max_id, self.max_nodes)
+                    self._too_large = time.monotonic()
+                    return None
+
+                parent = array('i', [ABSENT]) * (max_id + 1)
+                rows = conn.execution_options(yield_per=50000).execute(select(Asset.id, Asset.parent_id))
+                for asset_id, parent_id in rows:
+                    parent[asset_id] = parent_id if parent_id is not None else ROOT
+
+        self._too_large = None
+        h = _Hierarchy(parent, nodes)
+        h.stamp = stamp
+        return h
+
+    def _start(self, target):
+        #one background job at a time, the index keeps answering with the current arrays.
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(target=target, name="asset-index", daemon=True)
+            self._background.start()
+
+    def _background_load(self):
+        with self._lock:
+            self._loading = True
+            self._reload = False
+        try:
+            h = self._read()
+        except Exception as e:
+            logger.warning("asset index reload failed: %s", e)
+            with self._lock:
+                self._loading = False
+            return
+        with self._lock:
+            self._loading = False
+            self._hierarchy = h
+
+    def _rebuild(self):
+        #new intervals and depths after a move, from a copy of the parent array.
+        h = self._hierarchy
+        if h is None:
+            return
+        with self._lock:
+            version, parent = h.version, array('i', h.parent)
+        new = _Hierarchy(parent, h.nodes)
+        with self._lock:
+            if self._hierarchy is h and h.version == version: #else the next answer starts another one
+                new.stamp, new.loaded_at = h.stamp, h.loaded_at
+                self._hierarchy = new
+
+    def apply(self, inserts, moves, deletes, stamp):
+        '''
+        changes committed by this process: inserts [(id, parent_id)], moves [(id, parent_id)], deletes [id].
+        '''
+        with self._lock:
+            h = self._hierarchy
+            if h is None or self._reload:
+                return
+            if self._loading: #the rows being read may not include these changes
+                self._reload = True
+                return
+            if max((i for i, _ in inserts), default=0) > self.max_nodes:
+                self._reload = True
+                return
+
+            h.grow(max((i for i, _ in inserts), default=0) + 1)
+            parent, depth, size = h.parent, h.depth, h.size
+            for asset_id, parent_id in sorted(inserts): #parents have lower ids than their new children
+                if parent_id and parent_id not in h: #parent of another process, not loaded yet
+                    self._reload = True
+                    return
+                parent[asset_id] = parent_id or ROOT
+                if not parent_id:
+                    depth[asset_id] = 0
+                else:
+                    depth[asset_id] = depth[parent_id] + 1 if depth[parent_id] >= 0 else -1
+                size[asset_id] = 1
+                h.add_size(asset_id, 1)
+                h.nodes += 1
+
+            for asset_id, parent_id in moves:
+                if asset_id not in h:
+                    continue
+                if parent_id and parent_id not in h:
+                    self._reload = True
+                    return
+                h.add_size(asset_id, -size[asset_id])
+                parent[asset_id] = parent_id or ROOT
+                h.add_size(asset_id, size[asset_id])
+                h.stale = True
+
+            for asset_id in sorted(deletes, key=lambda i: -h.get_depth(i) if i in h else 0): #leaves first
+                if asset_id not in h:
+                    continue
+                if size[asset_id] != 1: #children not deleted by the orm, e.g. a db cascade
+                    self._reload = True
+                    return
+                h.add_size(asset_id, -1)
+                parent[asset_id] = ABSENT
+                h.nodes -= 1
+
+            h.version += 1
+            if stamp is not None:
+                h.stamp = stamp
+
+
+_session_events = []
+
+
+def _listen_session_events():
+    #changes of the asset tree are applied to the index once committed.
+    if _session_events:
+        return
+    _session_events.append(True)
+
+    from app.models.main import Asset
+
+    @event.listens_for(Session, 'after_flush')
+    def _collect_changes(session, flush_context):
+        changes = None
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if not isinstance(obj, Asset):
+                continue
+            changes = changes or session.info.setdefault('asset_index', {'inserts': [], 'moves': [], 'deletes': []})
+            if obj in session.new:
+                changes['inserts'].append((obj.id, obj.parent_id))
+            elif obj in session.deleted:
+                changes['deletes'].append(obj.id)
+            elif inspect(obj).attrs.parent_id.history.has_changes():
+                changes['moves'].append((obj.id, obj.parent_id))
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _collect_statements(orm_execute_state):
+        #bulk statements, e.g. the asset import: the index is reloaded.
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            if orm_execute_state.bind_mapper is Asset.__mapper__: #statement.table is an annotated copy
+                orm_execute_state.session.info['asset_index_reload'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _apply_changes(session):
+        changes = session.info.pop('asset_index', None)
+        reload = session.info.pop('asset_index_reload', False)
+        if not (changes or reload) or not has_app_context() or 'asset_index' not in current_app.extensions:
+            return
+        state = current_app.extensions['asset_index']
+        if state._hierarchy is None: #not loaded yet in this process
+            return
+        if reload:
+            state._reload = True
+            return
+        try:
+            #the stamp was bumped by the version stamps listener, registered before this one.
+            state.apply(changes['inserts'], changes['moves'], changes['deletes'], state._stamp())
+        except Exception as e:
+            logger.warning("asset index update failed, reloaded on next use: %s", e)
+            state._reload = True
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_changes(session):
+        session.info.pop('asset_index', None)
+        session.info.pop('asset_index_reload', None)
@@ -1,26 +1,209 @@
 '''En este archivo se definen las reglas para crear el bundle de javascript y css'''
+import os
+import json
+import threading
+import mimetypes
+from flask import current_app, request, url_for, send_from_directory
 
-from flask_assets import Bundle
-from webassets.filter import get_filter
-
-libsass = get_filter( #se crea un filtro a partir de libsass, con todas las configuraciones necesarias
-    'libsass',
-    style='compressed', #parametro define el estilo de salida del bundle. En prod. debe ser 'compressed'
-    includes=['./app/static/scss'], #lista con las rutas que contienen los .scss importados en el index.scss
-    as_output=True
-)
-
-bundles = {
-    'main_js': Bundle(
-        'js/index.js',
-        'js/nav.js',
-        filters='jsmin',
-        output='bundle/main.%(version)s.js' #.%(version)s
-    ),
-    'main_css': Bundle(
-        'scss/index.scss',
-        filters= [libsass], #lista de los filtros usados para este bundle.
-        depends=['scss/*.scss'], #lista con las rutas a los archivos que son vigilados por el bundle y que deben ser compilados ante cualquier cambio.
-        output='bundle/main.%(version)s.css',
+from app.utils.compression import COMPRESSORS, compress, negotiate
+
+MANIFEST_NAME = 'manifest.json'
+#precompressed siblings of the bundles: encoding -> (file suffix, level)
+PRECOMPRESSED = {'br': ('.br', 11), 'gzip': ('.gz', 9)}
+
+
+def bundles() -> dict:
+    '''
+    Bundles de flask_assets, se crean al usarse: importa webassets y el filtro de libsass.
+    '''
+    from flask_assets import Bundle
+    from webassets.filter import get_filter
+
+    libsass = get_filter( #se crea un filtro a partir de libsass, con todas las configuraciones necesarias
+        'libsass',
+        style='compressed', #parametro define el estilo de salida del bundle. En prod. debe ser 'compressed'
+        includes=['./app/static/scss'], #lista con las rutas que contienen los .scss importados en el index.scss
+        as_output=True
     )
-}
\ No newline at end of file
+
+    return {
+        'main_js': Bundle(
+            'js/index.js',
+            'js/nav.js',
+            filters='jsmin',
+            output='bundle/main.%(version)s.js' #.%(version)s
+        ),
+        'main_css': Bundle(
+            'scss/index.scss',
+            filters= [libsass], #lista de los filtros usados para este bundle.
+            depends=['scss/*.scss'], #lista con las rutas a los archivos que son vigilados por el bundle y que deben ser compilados ante cualquier cambio.
+            output='bundle/main.%(version)s.css',
+        )
+    }
+
+
+class AssetPipeline():
+    '''
+    css / js bundles of the templates, resolved with the asset_url(name) template global.
+
+    - ASSETS_MODE 'runtime': flask_assets compiles the bundles on demand, for development.
+    - ASSETS_MODE 'manifest': the bundles are compiled by `flask build-assets` into
+    content-hashed files listed in the manifest. flask_assets, webassets and libsass are
+    never imported by the web workers, the manifest is read on the first asset_url().
+    - build-assets also writes .br / .gz siblings of each bundle, compressed once at the
+    highest level. the static view sends the sibling negotiated with Accept-Encoding,
+    the files of the manifest are sent with an immutable Cache-Control: a new build
+    gives them a new name.
+
+    config:
+    - ASSETS_MODE: 'runtime' or 'manifest'.
+    - ASSETS_MANIFEST: path of the manifest, default <static folder>/bundle/manifest.json.
+    - ASSETS_PRECOMPRESS: encodings written by build-assets, default ('br', 'gzip').
+    br is skipped when brotli is not installed.
+    - ASSETS_MAX_AGE: seconds, Cache-Control of the hashed files. default one year.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MODE', 'runtime')
+        app.config.setdefault('ASSETS_MANIFEST', os.path.join(app.static_folder, 'bundle', MANIFEST_NAME))
+        app.config.setdefault('ASSETS_PRECOMPRESS', ('br', 'gzip'))
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+
+        state = _AssetsState(app)
+        if state.mode == 'runtime':
+            state.environment()
+        app.extensions['asset_pipeline'] = state
+        app.add_template_global(self.url, 'asset_url')
+        if app.has_static_folder:
+            app.view_functions['static'] = self.send_static
+
+    def url(self, name) -> str:
+        '''
+        url of the bundle name, e.g. asset_url('main_css') in a template.
+        '''
+        return current_app.extensions['asset_pipeline'].url(name)
+
+    def send_static(self, filename):
+        '''
+        view of the static endpoint.
+        '''
+        return current_app.extensions['asset_pipeline'].send_static(filename)
+
+    def build(self, app=None) -> dict:
+        '''
+        compiles every bundle and writes the manifest. returns {bundle: file in the static folder}.
+        '''
+        return (app or current_app).extensions['asset_pipeline'].build()
+
+
+class _AssetsState():
+
+    def __init__(self, app):
+        self.mode = app.config['ASSETS_MODE']
+        self.manifest_path = app.config['ASSETS_MANIFEST']
+        self.precompress = tuple(e for e in app.config['ASSETS_PRECOMPRESS'] if e in PRECOMPRESSED and e in COMPRESSORS)
+        self.max_age = app.config['ASSETS_MAX_AGE']
+        self._app = app
+        self._env = None
+        self._manifest = None
+        self._files = None
+        self._lock = threading.Lock()
+
+    def environment(self):
+        if self._env is None:
+            from flask_assets import Environment
+            env = Environment(self._app)
+            env.register(bundles())
+            self._env = env
+        return self._env
+
+    def url(self, name):
+        if self.mode == 'runtime':
+            return self.environment()[name].urls()[0]
+        return url_for('static', filename=self.manifest()[name])
+
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            with self._lock:
+                if self._manifest is None:
+                    try:
+                        with open(self.manifest_path) as f:
+                            self._manifest = json.load(f)
+                    except FileNotFoundError:
+                        raise RuntimeError(f"asset manifest {self.manifest_path} not found, run `flask build-assets`") from None
+        return self._manifest
+
+    def hashed_files(self) -> dict:
+        '''
+        {file of the manifest: encodings of its precompressed siblings}, empty in runtime mode.
+        '''
+        if self._files is None:
+            files = {}
+            if self.mode == 'manifest':
+                try:
+                    manifest = self.manifest()
+                except RuntimeError:
+                    manifest = {} #asset_url() reports it, the other static files are still served
+                static = self._app.static_folder
+                for path in manifest.values():
+                    files[path] = tuple(
+                        e for e in PRECOMPRESSED
+                        if os.path.isfile(os.path.join(static, path + PRECOMPRESSED[e][0]))
+                    )
+            self._files = files
+        return self._files
+
+    def send_static(self, filename):
+        static = self._app.static_folder
+        encodings = self.hashed_files().get(filename)
+        if encodings is None:
+            return send_from_directory(static, filename) #flask defaults
+
+        encoding = negotiate(encodings, request.accept_encodings) #ties by PRECOMPRESSED order
+        path = filename + PRECOMPRESSED[encoding][0] if encoding else filename
+        response = send_from_directory(static, path, mimetype=mimetypes.guess_type(filename)[0], max_age=self.max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def build(self) -> dict:
+        env = self.environment()
+        env.url_expire = False #the version is in the file name
+        manifest = {}
+        for name, bundle in env._named_bundles.items():
+            bundle.build(force=True)
+            path = bundle.resolve_output(version=bundle.get_version(refresh=True))
+            manifest[name] = os.path.relpath(path, self._app.static_folder).replace(os.sep, '/')
+            precompress(path, self.precompress)
+
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        self._manifest = manifest
+        self._files = None
+        return manifest
+
+
+def precompress(path, encodings) -> list:
+    '''
+    escribe los archivos comprimidos junto a path (path.br, path.gz), con el nivel mas alto
+    de cada algoritmo: se comprimen una sola vez, al compilar. retorna las rutas creadas.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    written = []
+    for encoding in encodings:
+        suffix, level = PRECOMPRESSED[encoding]
+        with open(path + suffix, 'wb') as f:
+            f.write(compress(encoding, level, data))
+        written.append(path + suffix)
+    return written
@@ -0,0 +1,69 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache():
+
+    '''
+    Class
+    Cache local al proceso, thread-safe, con limite de elementos (LRU) y expiracion por elemento.
+
+    - maxsize: maximo numero de elementos, el menos usado se descarta primero.
+    - ttl: segundos de vida por defecto de cada elemento. None = sin expiracion.
+
+    methods:
+
+    - get(key, default=None) -> value or default
+    - set(key, value, ttl=None)
+    - pop(key) -> value or None
+    - clear()
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _missing)
+            if item is _missing:
+                return default
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_missing = object()
@@ -0,0 +1,205 @@
+import time
+import logging
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class RoleEntry(NamedTuple):
+    id: int
+    name: str
+    code: str
+    global_role: bool
+    permits: MappingProxyType
+
+
+class PlanEntry(NamedTuple):
+    id: int
+    name: str
+    code: str
+    limits: MappingProxyType
+
+
+class _Snapshot():
+    '''
+    roles and plans indexed by code and by id. never modified, a reload builds a new one.
+    '''
+
+    def __init__(self, roles=(), plans=()):
+        self.roles = tuple(roles)
+        self.plans = tuple(plans)
+        self.roles_by_code = MappingProxyType({r.code: r for r in self.roles})
+        self.roles_by_id = MappingProxyType({r.id: r for r in self.roles})
+        self.plans_by_code = MappingProxyType({p.code: p for p in self.plans})
+        self.plans_by_id = MappingProxyType({p.id: p for p in self.plans})
+        self.loaded_at = time.monotonic()
+        self.stamp = None #('catalog', None) version stamp read before the rows
+
+
+class Catalog():
+    '''
+    Process-wide, read-only catalog of the Role and Plan tables.
+
+    - loaded in create_app (CATALOG_PRELOAD), or on first use if the tables can't be read
+    yet (e.g. before the migrations run).
+    - commits that change a Role or Plan row (orm or bulk statements) reload it at once in the same process
+    and bump the ('catalog', None) version stamp. the other workers compare the stamp every
+    CATALOG_CHECK_INTERVAL seconds and reload on a change, or every CATALOG_MAX_AGE seconds
+    without stamps (redis down).
+    - a reload builds a new snapshot and replaces the old one in a single assignment,
+    readers never see a half loaded catalog.
+
+    config:
+    - CATALOG_MAX_AGE: seconds before a snapshot is reloaded from the db.
+    - CATALOG_CHECK_INTERVAL: seconds between version stamp checks.
+    - CATALOG_PRELOAD: default True. False skips the db round-trip at startup (fast cold start).
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_MAX_AGE', 60)
+        app.config.setdefault('CATALOG_CHECK_INTERVAL', 2)
+        app.config.setdefault('CATALOG_PRELOAD', True)
+
+        state = _CatalogState(app)
+        app.extensions['catalog'] = state
+        _listen_session_events()
+        if not app.config['CATALOG_PRELOAD']:
+            return
+        try:
+            state.reload()
+        except Exception as e:
+            logger.info("catalog not loaded at startup: %s", e)
+
+    @staticmethod
+    def _state(app=None):
+        return (app or current_app).extensions['catalog']
+
+    def role(self, key):
+        '''
+        returns the RoleEntry with the given id (int) or code (str), None if not found.
+        '''
+        snapshot = self._state().snapshot()
+        return (snapshot.roles_by_id if isinstance(key, int) else snapshot.roles_by_code).get(key)
+
+    def plan(self, key):
+        '''
+        returns the PlanEntry with the given id (int) or code (str), None if not found.
+        '''
+        snapshot = self._state().snapshot()
+        return (snapshot.plans_by_id if isinstance(key, int) else snapshot.plans_by_code).get(key)
+
+    def roles(self) -> tuple:
+        return self._state().snapshot().roles
+
+    def plans(self) -> tuple:
+        return self._state().snapshot().plans
+
+    def reload(self, app=None):
+        self._state(app).reload()
+
+
+class _CatalogState():
+
+    def __init__(self, app):
+        self.max_age = app.config['CATALOG_MAX_AGE']
+        self.check_interval = app.config['CATALOG_CHECK_INTERVAL']
+        self._app = app
+        self._snapshot = None
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> _Snapshot:
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > self.max_age or self._changed(snapshot):
+            with self._lock:
+                if self._snapshot is snapshot: #not reloaded by another thread in the meantime
+                    try:
+                        self._load()
+                    except Exception as e:
+                        if snapshot is None:
+                            raise
+                        #db unreachable, the old snapshot is kept until the next max_age.
+                        logger.warning("catalog reload failed: %s", e)
+                        self._snapshot = _Snapshot(snapshot.roles, snapshot.plans)
+                        self._snapshot.stamp = snapshot.stamp
+            snapshot = self._snapshot
+        return snapshot
+
+    def _changed(self, snapshot) -> bool:
+        #changes committed by other workers
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        stamp = self._stamp()
+        return stamp is not None and stamp != snapshot.stamp
+
+    def _stamp(self):
+        stamps = self._app.extensions.get('version_stamps')
+        if stamps is None:
+            return None
+        value = stamps.get('catalog', None)
+        return value[0] if value is not None else None
+
+    def reload(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        from app.models.global_models import Role, Plan
+        stamp = self._stamp() #before the rows, a change made meanwhile is found by the next check
+        #own connection, also called from session.after_commit where the session can't be used.
+        with self._app.app_context():
+            with self._app.extensions['sqlalchemy'].engine.connect() as conn:
+                roles = conn.execute(select(Role.id, Role.name, Role.code, Role.global_role, Role.permits)).all()
+                plans = conn.execute(select(Plan.id, Plan.name, Plan.code, Plan.limits)).all()
+
+        self._snapshot = _Snapshot(
+            roles=[RoleEntry(r.id, r.name, r.code, bool(r.global_role), MappingProxyType(dict(r.permits or {}))) for r in roles],
+            plans=[PlanEntry(p.id, p.name, p.code, MappingProxyType(dict(p.limits or {}))) for p in plans]
+        )
+        self._snapshot.stamp = stamp
+
+
+_session_events = []
+
+
+def _listen_session_events():
+    if _session_events:
+        return
+    _session_events.append(True)
+
+    from app.models.global_models import Role, Plan
+
+    @event.listens_for(Session, 'after_flush')
+    def _collect_changes(session, flush_context):
+        if any(isinstance(obj, (Role, Plan)) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info['catalog_changed'] = True
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _collect_statements(orm_execute_state):
+        #bulk insert / update / delete statements, e.g. the seeding upserts.
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            if orm_execute_state.bind_mapper in (Role.__mapper__, Plan.__mapper__): #statement.table is an annotated copy
+                orm_execute_state.session.info['catalog_changed'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _reload_catalog(session):
+        if session.info.pop('catalog_changed', False) and has_app_context() and 'catalog' in current_app.extensions:
+            try:
+                current_app.extensions['catalog'].reload()
+            except Exception as e:
+                logger.warning("catalog reload failed: %s", e)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_changes(session):
+        session.info.pop('catalog_changed', None)
@@ -0,0 +1,159 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError: #optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: #optional dependency
+    zstandard = None
+
+DEFAULT_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript')
+
+
+class _GzipCompressor():
+
+    def __init__(self, level):
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31) #31: gzip container
+
+    def compress(self, data) -> bytes:
+        return self._c.compress(data)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+class _BrotliCompressor():
+
+    def __init__(self, level):
+        self._c = brotli.Compressor(quality=level)
+
+    def compress(self, data) -> bytes:
+        return self._c.process(data)
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _ZstdCompressor():
+
+    def __init__(self, level):
+        self._c = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data) -> bytes:
+        return self._c.compress(data)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+COMPRESSORS = {'gzip': _GzipCompressor}
+if brotli is not None:
+    COMPRESSORS['br'] = _BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _ZstdCompressor
+
+
+def compress(encoding, level, data:bytes) -> bytes:
+    c = COMPRESSORS[encoding](level)
+    return c.compress(data) + c.finish()
+
+
+def negotiate(encodings, accept_encodings):
+    #encoding with the highest q value of the client, ties by the order of encodings.
+    best, best_q = None, 0
+    for encoding in encodings:
+        q = accept_encodings[encoding] #0 if not accepted, '*' included
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class Compression():
+    '''
+    Response compression negotiated with Accept-Encoding, in an after_request hook.
+    gzip is always available, br and zstd when brotli / zstandard are installed.
+
+    - the client's preference (q values) wins, ties are broken by COMPRESS_ALGORITHMS order.
+    - responses under COMPRESS_MIN_SIZE bytes are sent as they are. streamed responses
+    (unknown size) are compressed chunk by chunk as they are generated.
+    - strong ETags become weak (same content, other encoding), conditional GETs keep working.
+
+    config:
+    - COMPRESS_ENABLED: default True.
+    - COMPRESS_ALGORITHMS: server preference, default ('zstd', 'br', 'gzip').
+    - COMPRESS_LEVELS: {encoding: level}, default {'gzip': 6, 'br': 4, 'zstd': 3}.
+    - COMPRESS_MIN_SIZE: bytes.
+    - COMPRESS_MIMETYPES: mimetypes compressed.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_ALGORITHMS', ('zstd', 'br', 'gzip'))
+        app.config.setdefault('COMPRESS_LEVELS', {})
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        if not app.config['COMPRESS_ENABLED']:
+            return
+
+        app.extensions['compression'] = _CompressionState(app.config)
+        app.after_request(app.extensions['compression'].process)
+
+
+class _CompressionState():
+
+    def __init__(self, config):
+        self.algorithms = tuple(a for a in config['COMPRESS_ALGORITHMS'] if a in COMPRESSORS)
+        self.levels = {'gzip': 6, 'br': 4, 'zstd': 3, **config['COMPRESS_LEVELS']}
+        self.min_size = config['COMPRESS_MIN_SIZE']
+        self.mimetypes = frozenset(config['COMPRESS_MIMETYPES'])
+
+    def negotiate(self, accept_encodings):
+        return negotiate(self.algorithms, accept_encodings)
+
+    def process(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype not in self.mimetypes
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough): #files
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        level = self.levels[encoding]
+        if response.is_streamed:
+            response.response = _compress_stream(COMPRESSORS[encoding](level), response.iter_encoded(), response.response)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compress(encoding, level, data))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+def _compress_stream(compressor, chunks, original):
+    try:
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    finally:
+        if hasattr(original, 'close'):
+            original.close()
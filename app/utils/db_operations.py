@@ -1,3 +1,6 @@
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from app.extensions import db, user_cache, version_stamps
 from app.models.main import (
     User
 )
@@ -14,3 +17,27 @@ def get_user_by_email(email):
         raise APIException(f"email: {email} not found in database", status_code=404, app_result="q_not_found")
 
     return user
+
+
+def get_user_profile(email) -> dict:
+    '''
+    Helper function to get the serialized user from the user cache, the db is
+    queried on a miss. raises APIException (404) if the user doesn't exists.
+    the cached user must match the version stamp sent as ETag, if conditional_get read one.
+    '''
+    return user_cache.get(
+        email, lambda: get_user_by_email(email).serialize(), version=version_stamps.checked('user', email)
+    )
+
+
+def rehash_password(user, password):
+    '''
+    Helper function to upgrade the password hash of a user to the configured method,
+    called after a successful login. errors are logged, the login goes on.
+    '''
+    try:
+        user.password = password
+        db.session.commit()
+    except (SQLAlchemyError, APIException) as e:
+        db.session.rollback()
+        current_app.logger.warning(f"password rehash failed for user {user.id}: {e}")
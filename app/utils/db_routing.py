@@ -0,0 +1,295 @@
+import os
+import time
+import weakref
+import logging
+import itertools
+import threading
+from flask import current_app, g, request, has_request_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, create_engine
+from sqlalchemy.orm import Session
+
+from app.utils.cache import LRUCache
+from app.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+class RoutingSession(FlaskSession):
+    '''
+    Session of the db extension. SELECT statements of a read-only request are sent to
+    the replica chosen for the request, everything else goes to the binds as usual.
+    '''
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _is_read(clause) and has_request_context():
+            engine = _request_replica()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_read(clause) -> bool:
+    return (
+        clause is not None
+        and getattr(clause, 'is_select', False)
+        and getattr(clause, '_for_update_arg', None) is None
+    )
+
+
+def _request_replica():
+    name = g.get('_db_replica')
+    if name is None:
+        return None
+    return current_app.extensions['db_router'].engines[name]
+
+
+class DatabaseRouter():
+    '''
+    Primary / replica routing of the db extension, for the handlers marked with
+    the read_only decorator.
+
+    - each read-only request is pinned to one replica, replicas are used in round-robin.
+    writes, flushes and SELECT .. FOR UPDATE always go to the primary.
+    - read-your-writes: after a commit with changes, the reads of the same client (jwt
+    identity or ip) go to the primary for DB_READ_YOUR_WRITES_WINDOW seconds.
+    - a replica that fails is skipped for DB_REPLICA_RETRY_AFTER seconds, the request
+    is retried on the primary.
+    - without replicas every request goes to the primary.
+    - gunicorn --preload: the engines are disposed in each forked worker, pooled
+    connections opened by the master (e.g. the catalog preload) are never shared.
+
+    replica engines are kept by the router (replica_0, replica_1, ...), not as binds of
+    the db extension: create_all and migrations never touch them.
+    config:
+    - SQLALCHEMY_REPLICA_URIS: list of database urls.
+    - DB_READ_YOUR_WRITES_WINDOW: seconds, longer than the expected replication lag.
+    - DB_REPLICA_RETRY_AFTER: seconds.
+    - DB_ROUTING_BACKEND: 'redis' (shared by every worker) or 'memory', where the recent
+    writes of each client are kept.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('DB_READ_YOUR_WRITES_WINDOW', 5)
+        app.config.setdefault('DB_REPLICA_RETRY_AFTER', 30)
+        app.config.setdefault('DB_ROUTING_BACKEND', 'redis')
+
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        engines = {
+            f"{REPLICA_BIND_PREFIX}{i}": create_engine(uri, **options)
+            for i, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS'])
+        }
+
+        app.extensions['db_router'] = _RouterState(app, engines)
+        app.teardown_request(_end_request)
+        _listen_session_events()
+
+        with app.app_context():
+            _forked_engines.update(app.extensions['sqlalchemy'].engines.values())
+        _forked_engines.update(engines.values())
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['db_router']
+
+    def begin_read(self) -> bool:
+        '''
+        pins the current request to a replica. False if the reads go to the primary:
+        no replica available, or a recent write of the client.
+        '''
+        state = self._state()
+        if not state.replicas or g.get('_db_primary'):
+            return False
+        if state.recent_write(_client_key()):
+            state.count(None, 'ryw_primary')
+            return False
+
+        name = state.next_replica()
+        if name is None:
+            return False
+        g._db_replica = name
+        state.count(name, 'reads')
+        return True
+
+    def replica_failed(self, error) -> bool:
+        '''
+        called with a db error raised in a read-only request. marks the replica as down and
+        moves the request to the primary. False if the request wasn't using a replica.
+        '''
+        name = g.pop('_db_replica', None)
+        if name is None:
+            return False
+        logger.warning("replica %s failed, reads go to the primary: %s", name, error)
+        self._state().mark_down(name)
+        g._db_primary = True
+        current_app.extensions['sqlalchemy'].session.rollback()
+        return True
+
+    def pin_primary_after(self, modified):
+        '''
+        reads of the current request go to the primary if modified (datetime or timestamp)
+        is inside the read-your-writes window, the replicas may not have the change yet.
+        '''
+        if g.get('_db_replica') is None or modified is None:
+            return
+        if hasattr(modified, 'timestamp'):
+            modified = modified.timestamp()
+        if time.time() - modified < self._state().window:
+            g.pop('_db_replica', None)
+
+    def pool_stats(self) -> dict:
+        '''
+        {bind: {pool sizes and routing counters}}, bind 'primary' or replica_n.
+        '''
+        return self._state().pool_stats()
+
+
+class _RouterState():
+
+    def __init__(self, app, engines):
+        self.engines = engines
+        self.replicas = tuple(engines)
+        self.window = app.config['DB_READ_YOUR_WRITES_WINDOW']
+        self.retry_after = app.config['DB_REPLICA_RETRY_AFTER']
+        self.backend = app.config['DB_ROUTING_BACKEND']
+        self._app = app
+        self._writes = LRUCache(maxsize=10000, ttl=self.window) #local marks, also with redis
+        self._down = {} #replica -> retry at (monotonic)
+        self._rr = itertools.count()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def next_replica(self):
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            name = self.replicas[next(self._rr) % len(self.replicas)]
+            retry_at = self._down.get(name)
+            if retry_at is None or retry_at <= now:
+                return name
+        return None
+
+    def mark_down(self, name):
+        self._down[name] = time.monotonic() + self.retry_after
+        self.count(name, 'failures')
+
+    def count(self, name, counter):
+        with self._lock:
+            key = (name or 'primary', counter)
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def record_write(self, client):
+        self._writes.set(client, True)
+        if self.backend != 'redis':
+            return
+        try:
+            with track('redis'):
+                self._app.extensions['redis'].client.set(f"ryw:{client}", 1, ex=self.window)
+        except Exception as e:
+            logger.warning("db routing, write of %s not recorded: %s", client, e)
+
+    def recent_write(self, client) -> bool:
+        if client in self._writes:
+            return True
+        if self.backend != 'redis':
+            return False
+        try:
+            with track('redis'):
+                return bool(self._app.extensions['redis'].client.exists(f"ryw:{client}"))
+        except Exception as e:
+            logger.warning("db routing, redis unreachable, reading from the primary: %s", e)
+            return True
+
+    def pool_stats(self) -> dict:
+        engines = {'primary': self._app.extensions['sqlalchemy'].engines[None], **self.engines}
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+
+        stats = {}
+        for name, engine in engines.items():
+            pool = engine.pool
+            item = {
+                'pool': type(pool).__name__,
+                'size': _pool_value(pool, 'size'),
+                'checked_in': _pool_value(pool, 'checkedin'),
+                'checked_out': _pool_value(pool, 'checkedout'),
+                'overflow': _pool_value(pool, 'overflow')
+            }
+            item.update({c: counters.get((name, c), 0) for c in ('reads', 'failures', 'ryw_primary')})
+            if name in self.replicas:
+                item['up'] = self._down.get(name, 0) <= now
+            stats[name] = item
+        return stats
+
+
+def _end_request(exc):
+    #g outlives the request when the app context was pushed before it, e.g. in tests.
+    g.pop('_db_replica', None)
+    g.pop('_db_primary', None)
+
+
+def _pool_value(pool, attr):
+    fn = getattr(pool, attr, None)
+    return fn() if fn is not None else None
+
+
+def _client_key() -> str:
+    #jwt identity when the request has a verified token, the client ip otherwise.
+    jwt = g.get('_jwt_extended_jwt')
+    if jwt and jwt.get('sub') is not None:
+        return f"id:{jwt['sub']}"
+    return f"ip:{request.remote_addr}"
+
+
+_forked_engines = weakref.WeakSet()
+
+
+def _dispose_after_fork():
+    #close=False: the connections belong to the parent process, only the pool is replaced.
+    for engine in list(_forked_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+_session_events = []
+
+
+def _listen_session_events():
+    #the client of a request that committed changes reads from the primary for a while.
+    if _session_events:
+        return
+    _session_events.append(True)
+
+    @event.listens_for(Session, 'after_flush')
+    def _flagged_flush(session, flush_context):
+        session.info['db_router_write'] = True
+        if has_request_context():
+            g.pop('_db_replica', None) #later reads have to see the flushed rows
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _flagged_statement(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            orm_execute_state.session.info['db_router_write'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _record_write(session):
+        if not session.info.pop('db_router_write', False) or not has_request_context():
+            return
+        state = current_app.extensions.get('db_router')
+        if state is None or not state.replicas:
+            return
+        g._db_primary = True
+        g.pop('_db_replica', None)
+        state.record_write(_client_key())
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_write(session):
+        session.info.pop('db_router_write', None)
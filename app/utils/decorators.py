@@ -1,37 +1,38 @@
+import hmac
 import functools
-from flask import request
+from flask import request, make_response, current_app
+from werkzeug.http import is_resource_modified
 from app.utils.exceptions import (
     APIException
 )
+from app.utils.validations import Schema
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from sqlalchemy.exc import OperationalError, InterfaceError
+from app.extensions import version_stamps, db_router
 
 
 #decorator to be called every time an endpoint is reached
 def json_required(required:dict=None, query_params:bool=False):
+    """
+    required: {key: type | Field}, compiled once into a validation Schema.
+    """
+    schema = Schema(required, query_params=query_params) if required is not None else None
+
     def decorator(func):
         @functools.wraps(func)
         def wrapper_func(*args, **kwargs):
             if not request.is_json:
                 raise APIException("Missing header in request" ,payload={"missing":{"content-type":"application/json"}})
 
-            if required is not None:
-                _json = request.get_json(silent=True)
-                _qparams = request.args
-
+            if schema is not None:
                 if query_params:
-                    missing = [r for r in required.keys() if r not in _qparams]
-                else:             
-                    if _json is None:
+                    data = request.args
+                else:
+                    data = request.get_json(silent=True)
+                    if not isinstance(data, dict):
                         raise APIException("invalid json in request body")
-                    missing = [r for r in required.keys() if r not in _json]
 
-                if missing:
-                    raise APIException(f"Missing arguments in {'url' if query_params is True else 'query params'}", payload={"missing": missing})
-                
-                wrong_types = [r for r in required.keys() if not isinstance(_json[r], required[r])] if _json is not None else None
-                if wrong_types:
-                    param_types = {k: str(v) for k, v in required.items()}
-                    raise APIException("Data types in the request JSON doesn't match the required format", payload={"required": param_types})
+                schema.validate(data)
 
             return func(*args, **kwargs)
         return wrapper_func
@@ -97,4 +98,85 @@ def super_user_required():
                 raise APIException("super-user access token required for this endpoint", status_code=401)
 
         return decorator
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+#decorator for the status endpoints (metrics, pools), scraped by prometheus.
+def metrics_token_required():
+    """
+    METRICS_TOKEN as bearer token, or a super-user access token.
+    """
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorator(*args, **kwargs):
+            token = current_app.config.get('METRICS_TOKEN')
+            if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+                return fn(*args, **kwargs)
+            verify_jwt_in_request()
+            if get_jwt().get('super_user'):
+                return fn(*args, **kwargs)
+            raise APIException("metrics token or super-user access token required for this endpoint", status_code=401)
+
+        return decorator
+    return wrapper
+
+
+#decorator for handlers that only read, their queries may be served by a replica.
+def read_only():
+    """
+    goes below the access decorators, the read-your-writes window is kept per jwt identity.
+    the handler is called again on the primary if the replica fails.
+    """
+    def wrapper(fn):
+        @functools.wraps(fn)
+        def decorator(*args, **kwargs):
+            if not db_router.begin_read():
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            except (OperationalError, InterfaceError) as e:
+                if not db_router.replica_failed(e):
+                    raise
+                return fn(*args, **kwargs)
+
+        return decorator
+    return wrapper
+
+
+#decorator to answer conditional GETs (If-None-Match / If-Modified-Since) with a 304.
+def conditional_get(kind:str, key=None, private:bool=False):
+    """
+    kind, key: version stamp of the data behind the endpoint, key is a callable that
+    gets the view arguments, e.g. lambda **kw: get_jwt_identity().
+    the stamp is checked before calling the view, a match is answered without reading the db.
+    without a stamp (redis unreachable) the ETag is a hash of the payload.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper_func(*args, **kwargs):
+            stamp = version_stamps.get(kind, key(**kwargs) if key is not None else None)
+            if stamp is not None:
+                etag, last_modified = stamp
+                if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                    return _cache_headers(make_response("", 304), stamp, private)
+                db_router.pin_primary_after(last_modified) #a fresh change may not be in the replicas yet
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if stamp is None:
+                response.add_etag()
+            return _cache_headers(response, stamp, private).make_conditional(request)
+        return wrapper_func
+    return decorator
+
+
+def _cache_headers(response, stamp, private):
+    if stamp is not None:
+        response.set_etag(stamp[0])
+        response.last_modified = stamp[1]
+    response.cache_control.no_cache = True #clients keep the payload, but revalidate it
+    if private:
+        response.cache_control.private = True
+    return response
+
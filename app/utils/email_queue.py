@@ -0,0 +1,363 @@
+import json
+import time
+import uuid
+import heapq
+import random
+import socket
+import logging
+import threading
+from collections import deque
+from flask import current_app
+
+from app.utils.exceptions import APIException
+from app.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+#moves the retries that are due from the delayed zset to the ready list.
+_PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 100)
+for _, raw in ipairs(due) do
+    redis.call('ZREM', KEYS[1], raw)
+    redis.call('LPUSH', KEYS[2], raw)
+end
+return #due
+"""
+
+
+class RedisEmailQueue():
+    '''
+    Durable email queue on redis.
+
+    - <prefix>:ready      list, messages waiting to be sent.
+    - <prefix>:delayed    zset, retries scored by the time they are due.
+    - <prefix>:processing:<worker_id>  list, messages taken by a worker and not yet acknowledged.
+    - <prefix>:dead       list, messages that failed every retry.
+    - <prefix>:results:<batch>  hash, {recipient: result} of a bulk email, expires after results_ttl.
+    '''
+
+    def __init__(self, client, prefix='email', results_ttl=7 * 24 * 3600):
+        self.client = client
+        self.ready = f"{prefix}:ready"
+        self.delayed = f"{prefix}:delayed"
+        self.dead_letters = f"{prefix}:dead"
+        self.prefix = prefix
+        self.results_ttl = results_ttl
+        self._promote = client.register_script(_PROMOTE_SCRIPT)
+
+    def push(self, *messages):
+        self.client.lpush(self.ready, *[json.dumps(m) for m in messages])
+
+    def pop(self, worker_id, timeout=1):
+        processing = f"{self.prefix}:processing:{worker_id}"
+        self._promote(keys=[self.delayed, self.ready], args=[time.time()])
+        raw = self.client.brpoplpush(self.ready, processing, timeout=timeout)
+        if raw is None:
+            return None, None
+        return raw, json.loads(raw)
+
+    def ack(self, worker_id, raw):
+        self.client.lrem(f"{self.prefix}:processing:{worker_id}", 1, raw)
+
+    def retry(self, worker_id, raw, message, delay):
+        pipe = self.client.pipeline()
+        pipe.lrem(f"{self.prefix}:processing:{worker_id}", 1, raw)
+        pipe.zadd(self.delayed, {json.dumps(message): time.time() + delay})
+        pipe.execute()
+
+    def dead(self, worker_id, raw, message):
+        pipe = self.client.pipeline()
+        pipe.lrem(f"{self.prefix}:processing:{worker_id}", 1, raw)
+        pipe.lpush(self.dead_letters, json.dumps(message))
+        pipe.execute()
+
+    def recover(self, worker_id) -> int:
+        '''
+        returns to the ready list the messages left in processing by a previous run of this worker.
+        '''
+        processing = f"{self.prefix}:processing:{worker_id}"
+        n = 0
+        while self.client.rpoplpush(processing, self.ready) is not None:
+            n += 1
+        return n
+
+    def size(self) -> dict:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(self.ready)
+        pipe.zcard(self.delayed)
+        pipe.llen(self.dead_letters)
+        ready, delayed, dead = pipe.execute()
+        return {"ready": ready, "delayed": delayed, "dead": dead}
+
+    def set_results(self, batch, results:dict):
+        key = f"{self.prefix}:results:{batch}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping={r: json.dumps(v) for r, v in results.items()})
+        pipe.expire(key, self.results_ttl)
+        pipe.execute()
+
+    def get_results(self, batch) -> dict:
+        raw = self.client.hgetall(f"{self.prefix}:results:{batch}")
+        return {(r.decode() if isinstance(r, bytes) else r): json.loads(v) for r, v in raw.items()}
+
+
+class MemoryEmailQueue():
+    '''
+    In-process stand-in of RedisEmailQueue, for tests and local development.
+    '''
+
+    def __init__(self):
+        self._ready = deque()
+        self._delayed = []
+        self.dead_letters = []
+        self._results = {}
+        self._cond = threading.Condition()
+
+    def push(self, *messages):
+        with self._cond:
+            self._ready.extendleft(json.dumps(m) for m in messages)
+            self._cond.notify_all()
+
+    def pop(self, worker_id, timeout=1):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.appendleft(heapq.heappop(self._delayed)[2])
+                if self._ready:
+                    raw = self._ready.pop()
+                    return raw, json.loads(raw)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None, None
+                self._cond.wait(min(remaining, 0.05))
+
+    def ack(self, worker_id, raw):
+        pass
+
+    def retry(self, worker_id, raw, message, delay):
+        with self._cond:
+            heapq.heappush(self._delayed, (time.time() + delay, uuid.uuid4().hex, json.dumps(message)))
+
+    def dead(self, worker_id, raw, message):
+        with self._cond:
+            self.dead_letters.append(message)
+
+    def recover(self, worker_id) -> int:
+        return 0
+
+    def size(self) -> dict:
+        with self._cond:
+            return {"ready": len(self._ready), "delayed": len(self._delayed), "dead": len(self.dead_letters)}
+
+    def set_results(self, batch, results:dict):
+        with self._cond:
+            self._results.setdefault(batch, {}).update(results)
+
+    def get_results(self, batch) -> dict:
+        with self._cond:
+            return dict(self._results.get(batch, {}))
+
+
+class EmailQueue():
+    '''
+    Outbound email pipeline. Requests only enqueue the message, the emails are sent
+    by the email worker (flask email-worker).
+
+    config:
+    - EMAIL_QUEUE_BACKEND: 'redis' or 'memory' (in-process, for tests).
+    - EMAIL_QUEUE_PREFIX: prefix of the redis keys.
+    - EMAIL_MAX_RETRIES: failed sends are retried this many times, then dead-lettered.
+    - EMAIL_RETRY_BACKOFF: seconds before the first retry, doubled on each attempt.
+    - EMAIL_RETRY_MAX_DELAY: upper limit of the retry delay, in seconds.
+    - EMAIL_HTTP_TIMEOUT: timeout of the smtp api requests.
+    - EMAIL_HTTP_POOL_SIZE: keep-alive connections held by the worker.
+    - EMAIL_WORKER_CONCURRENCY: threads of each worker, max smtp api requests in flight.
+    - EMAIL_BATCH_SIZE: recipients per smtp api request of a bulk email.
+    - EMAIL_RESULTS_TTL: seconds the per-recipient results of a bulk email are kept.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EMAIL_QUEUE_BACKEND', 'redis')
+        app.config.setdefault('EMAIL_QUEUE_PREFIX', 'email')
+        app.config.setdefault('EMAIL_MAX_RETRIES', 5)
+        app.config.setdefault('EMAIL_RETRY_BACKOFF', 2.0)
+        app.config.setdefault('EMAIL_RETRY_MAX_DELAY', 600)
+        app.config.setdefault('EMAIL_HTTP_TIMEOUT', 5)
+        app.config.setdefault('EMAIL_HTTP_POOL_SIZE', 4)
+        app.config.setdefault('EMAIL_WORKER_CONCURRENCY', 4)
+        app.config.setdefault('EMAIL_BATCH_SIZE', 500)
+        app.config.setdefault('EMAIL_RESULTS_TTL', 7 * 24 * 3600)
+
+        #the redis backend is created on first use, redis_service must be initialized first.
+        app.extensions['email_queue'] = MemoryEmailQueue() if app.config['EMAIL_QUEUE_BACKEND'] == 'memory' else None
+
+    @staticmethod
+    def backend(app=None):
+        app = app or current_app
+        backend = app.extensions['email_queue']
+        if backend is None:
+            backend = app.extensions['email_queue'] = RedisEmailQueue(
+                app.extensions['redis'].client, prefix=app.config['EMAIL_QUEUE_PREFIX'], results_ttl=app.config['EMAIL_RESULTS_TTL']
+            )
+        return backend
+
+    def enqueue(self, *messages):
+        '''
+        adds one or more messages to the queue, raise APIException if the queue is unreachable.
+        '''
+        for m in messages:
+            m.setdefault('id', uuid.uuid4().hex)
+            m.setdefault('attempts', 0)
+        try:
+            with track('email'):
+                self.backend().push(*messages)
+        except Exception:
+            raise APIException("email queue service unavailable", status_code=503)
+
+    def record(self, batch, results:dict):
+        '''
+        stores the result of each recipient of a bulk email: {email: {"status", ...}}
+        '''
+        try:
+            with track('email'):
+                self.backend().set_results(batch, results)
+        except Exception:
+            raise APIException("email queue service unavailable", status_code=503)
+
+    def results(self, batch) -> dict:
+        '''
+        {email: {"status": queued | sent | failed | rejected, "message_id", "error"}} of a bulk email.
+        '''
+        try:
+            with track('email'):
+                return self.backend().get_results(batch)
+        except Exception:
+            raise APIException("email queue service unavailable", status_code=503)
+
+
+class EmailWorker():
+    '''
+    Consumes the email queue, sending each message through the smtp api with a keep-alive session.
+    EMAIL_WORKER_CONCURRENCY threads take messages from the queue, so at most that many
+    requests to the smtp api are in flight.
+    '''
+
+    def __init__(self, app, worker_id=None):
+        import requests #only the worker process sends emails
+        from app.extensions import redis_service
+
+        self.app = app
+        self.worker_id = worker_id or socket.gethostname()
+        self.max_retries = app.config['EMAIL_MAX_RETRIES']
+        self.backoff = app.config['EMAIL_RETRY_BACKOFF']
+        self.max_delay = app.config['EMAIL_RETRY_MAX_DELAY']
+        self.timeout = app.config['EMAIL_HTTP_TIMEOUT']
+        self.concurrency = max(1, app.config['EMAIL_WORKER_CONCURRENCY'])
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(app.config['EMAIL_HTTP_POOL_SIZE'], self.concurrency)
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        backend = EmailQueue.backend(app)
+        if isinstance(backend, RedisEmailQueue):
+            #blocking pops can't share the pooled connections (socket timeout).
+            client = redis_service.dedicated_client(app, socket_timeout=None)
+            backend = RedisEmailQueue(client, prefix=backend.prefix, results_ttl=backend.results_ttl)
+        self.queue = backend
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def retry_delay(self, attempts) -> float:
+        delay = min(self.backoff * 2 ** (attempts - 1), self.max_delay)
+        return delay * random.uniform(0.8, 1.2) #jitter, spreads retries after an outage
+
+    def run(self, burst=False):
+        '''
+        processes messages until stop() is called. burst=True returns once the queue is empty.
+        '''
+        recovered = self.queue.recover(self.worker_id)
+        if recovered:
+            logger.info("email worker %s: %s unacknowledged messages re-queued", self.worker_id, recovered)
+
+        if self.concurrency == 1:
+            return self._consume(burst)
+
+        threads = [
+            threading.Thread(target=self._consume, args=(burst,), name=f"email-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5) #the main thread keeps receiving KeyboardInterrupt
+        finally:
+            self.stop()
+
+    def _consume(self, burst):
+        while not self._stop.is_set():
+            raw, message = self.queue.pop(self.worker_id, timeout=0.2 if burst else 1)
+            if message is None:
+                if burst:
+                    return
+                continue
+            self.process(raw, message)
+
+    def process(self, raw, message):
+        from app.utils.email_service import email_from_message
+
+        try:
+            with self.app.app_context():
+                message_ids = email_from_message(message).send_request(session=self.session, timeout=self.timeout)
+
+        except Exception as e:
+            message['attempts'] = message.get('attempts', 0) + 1
+            message['last_error'] = str(e.__cause__ or e)
+            if message['attempts'] > self.max_retries or not _retryable(e):
+                logger.error("email %s dead-lettered after %s attempts: %s", message.get('id'), message['attempts'], message['last_error'])
+                self.queue.dead(self.worker_id, raw, message)
+                self._record(message, {'status': 'failed', 'error': message['last_error']})
+            else:
+                self.queue.retry(self.worker_id, raw, message, self.retry_delay(message['attempts']))
+            return False
+
+        self.queue.ack(self.worker_id, raw)
+        self._record(message, {'status': 'sent'}, message_ids)
+        return True
+
+    def _record(self, message, result, message_ids=None):
+        #per-recipient results of the batches of a bulk email.
+        if 'batch' not in message:
+            return
+        message_ids = message_ids or []
+        results = {}
+        for i, version in enumerate(message['versions']):
+            item = dict(result)
+            if i < len(message_ids):
+                item['message_id'] = message_ids[i]
+            for to in version['to']:
+                results[to['email']] = item
+        try:
+            self.queue.set_results(message['batch'], results)
+        except Exception as e:
+            logger.warning("results of email batch %s not recorded: %s", message['batch'], e)
+
+
+def _retryable(error) -> bool:
+    #4xx answers (except 429) won't succeed on a retry.
+    response = getattr(error.__cause__, 'response', None)
+    if response is None:
+        return True
+    return response.status_code == 429 or response.status_code >= 500
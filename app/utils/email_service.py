@@ -1,22 +1,29 @@
-import requests
 import os
-from requests.exceptions import (
-    ConnectionError, HTTPError
-)
-from flask import (
-    render_template
-)
+import uuid
+from functools import lru_cache
+from flask import current_app
+from markupsafe import Markup
 from app.utils.exceptions import APIException
+from app.utils.validations import EMAIL_RE
+from app.extensions import email_queue
 
 # constantes para la configuracion del correo
-smtp_api_url = os.environ['SMTP_API_URL']
-mail_mode = os.environ['MAIL_MODE']
-api_key = os.environ['SMTP_API_KEY']
 default_sender = {"name": "Luis from MyApp", "email": "luis.lucena89@gmail.com"}
 default_content = "<!DOCTYPE html><html><body><h1>Email de prueba</h1><p>development mode</p></body></html>"
 default_subject = "this is a test"
 
 
+def email_setting(name):
+    '''
+    SMTP_API_URL, SMTP_API_KEY o MAIL_MODE, leidos al usarse: de la configuracion de la app
+    o de las variables de entorno. MAIL_MODE por defecto es 'production'.
+    '''
+    value = current_app.config.get(name) or os.environ.get(name)
+    if value is None and name == 'MAIL_MODE':
+        return 'production'
+    return value
+
+
 class Email_api_service():
 
     '''
@@ -33,7 +40,7 @@ class Email_api_service():
         return {
             "Accept": "application/json",
             "Content-Type": "application/json",
-            "api-key": api_key
+            "api-key": email_setting('SMTP_API_KEY')
         }
 
     def body(self):
@@ -44,25 +51,149 @@ class Email_api_service():
             "htmlContent": self.content
         }
 
-    def send_request(self):
+    def to_message(self) -> dict:
+        '''
+        serializable form of the email, used by the email queue.
+        '''
+        return {
+            "sender": self.sender,
+            "recipient": self.recipient,
+            "subject": self.subject,
+            "content": self.content
+        }
+
+    @classmethod
+    def from_message(cls, message:dict):
+        return cls(
+            message['recipient'],
+            content=message['content'],
+            sender=message['sender'],
+            subject=message['subject']
+        )
+
+    def send_request(self, session=None, timeout=3):
         '''
         SMTP API request function
+        session: optional requests.Session, to reuse keep-alive connections.
         '''
 
-        if mail_mode == 'development':
+        if email_setting('MAIL_MODE') == 'development':
             print(self.content)
             return None
 
+        import requests
+        from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+        smtp_api_url = email_setting('SMTP_API_URL')
+        if not smtp_api_url:
+            raise APIException("smtp api url is not configured", status_code=503)
+
         try:
-            r = requests.post(headers=self.header(), json=self.body(), url=smtp_api_url, timeout=3)
+            r = (session or requests).post(headers=self.header(), json=self.body(), url=smtp_api_url, timeout=timeout)
             r.raise_for_status()
 
-        except (ConnectionError, HTTPError):
-            raise APIException("Connection error to smtp server", status_code=503)
+        except (ConnectionError, HTTPError, Timeout) as e:
+            raise APIException("Connection error to smtp server", status_code=503) from e
 
         pass
 
 
+class Email_batch_service(Email_api_service):
+
+    '''
+    SMTP Service via API, one request with many message versions.
+    content is the same for every version, with {{ params.x }} placeholders filled by the
+    smtp api with the params of each version.
+    versions: [{"to": [{"email", "name"}], "params": {}}]
+    '''
+
+    def __init__(self, versions, content=default_content, sender=default_sender, subject=default_subject) -> None:
+        super().__init__(None, content=content, sender=sender, subject=subject)
+        self.versions = versions
+
+    def body(self):
+        return {
+            "sender": self.sender,
+            "subject": self.subject,
+            "htmlContent": self.content,
+            "messageVersions": self.versions
+        }
+
+    def to_message(self) -> dict:
+        return {
+            "sender": self.sender,
+            "versions": self.versions,
+            "subject": self.subject,
+            "content": self.content
+        }
+
+    @classmethod
+    def from_message(cls, message:dict):
+        return cls(
+            message['versions'],
+            content=message['content'],
+            sender=message['sender'],
+            subject=message['subject']
+        )
+
+    def send_request(self, session=None, timeout=3):
+        '''
+        returns the message ids of the versions, in the same order. None in development mode.
+        '''
+        if email_setting('MAIL_MODE') == 'development':
+            for version in self.versions:
+                print(version['to'], version.get('params'))
+            print(self.content)
+            return None
+
+        import requests
+        from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+        smtp_api_url = email_setting('SMTP_API_URL')
+        if not smtp_api_url:
+            raise APIException("smtp api url is not configured", status_code=503)
+
+        try:
+            r = (session or requests).post(headers=self.header(), json=self.body(), url=smtp_api_url, timeout=timeout)
+            r.raise_for_status()
+            return r.json().get('messageIds') if r.content else None
+
+        except (ConnectionError, HTTPError, Timeout) as e:
+            raise APIException("Connection error to smtp server", status_code=503) from e
+
+
+def email_from_message(message:dict):
+    '''
+    Email_api_service o Email_batch_service de un mensaje de la cola de correos.
+    '''
+    if 'versions' in message:
+        return Email_batch_service.from_message(message)
+    return Email_api_service.from_message(message)
+
+
+class _TemplateParams():
+    #params of a template rendered for the smtp api: {{ params.x }} is left in the html.
+
+    def __getattr__(self, name):
+        return Markup("{{ params.%s }}" % name)
+
+    __getitem__ = __getattr__
+
+
+@lru_cache(maxsize=64)
+def _batch_content(template) -> str:
+    #one render per compiled template, a reloaded template is a new object (new cache entry).
+    return template.render(params=_TemplateParams())
+
+
+def render_email(template:str, params:dict) -> str:
+    '''
+    Renderiza un correo con la plantilla compilada en cache de jinja, sin los context processors
+    de render_template: las plantillas de correo solo usan params.
+    '''
+    return current_app.jinja_env.get_template(template).render(params=params)
+
+
 def send_verification_email(verification_code, user:dict=None):
     '''
     Funcion para enviar un codigo de verificacion al correo electronico, el cual sera ingresado por el usuario a la app
@@ -74,10 +205,69 @@ def send_verification_email(verification_code, user:dict=None):
 
     email = Email_api_service(
         user_email, 
-        content=render_template("email/user-validation.html", params = {"code":verification_code, "user_name": user_name}),
+        content=render_email("email/user-validation.html", params = {"code":verification_code, "user_name": user_name}),
         subject="[My App] - Código de Verificación"
     )
 
-    email.send_request()
+    email_queue.enqueue(email.to_message()) #the email is sent by the email worker
+
+    pass
+
+def send_invitation_emails(users:list):
+    '''
+    Funcion para enviar la invitacion a los usuarios creados por un administrador.
+    users: lista de {'fname', 'email'}, los correos se envian en lotes (send_bulk_email).
+    '''
+    if not users:
+        return None
+
+    return send_bulk_email(
+        "email/user-invitation.html",
+        [{'email': user['email'], 'name': user['fname'], 'params': {"user_name": user['fname']}} for user in users],
+        subject="[My App] - Invitación"
+    )
+
+
+def send_bulk_email(template:str, recipients:list, subject:str=default_subject, sender:dict=default_sender) -> dict:
+    '''
+    Envia la misma plantilla a muchos destinatarios, con variables por destinatario.
+    Args:
+        * template (str): plantilla de correo, sus variables se leen de params (ej. {{ params.user_name }}).
+        * recipients (list): lista de {'email', 'name' (opcional), 'params' (dict)}.
+    Returns:
+        {"batch": id, "queued": int, "rejected": [email]}
+
+    - la plantilla se renderiza una sola vez, el api smtp reemplaza los params de cada destinatario.
+    - se agrupan hasta EMAIL_BATCH_SIZE destinatarios por request al api (messageVersions),
+    cada lote es un mensaje de la cola de correos.
+    - el resultado de cada destinatario se consulta con email_queue.results(batch).
+    '''
+    rejected, versions, seen = [], [], set()
+    for recipient in recipients:
+        email = (recipient.get('email') or '').lower()
+        if not EMAIL_RE.search(email) or email in seen:
+            rejected.append(email)
+            continue
+        seen.add(email)
+        to = {'email': email}
+        if recipient.get('name'):
+            to['name'] = recipient['name']
+        versions.append({'to': [to], 'params': recipient.get('params') or {}})
+
+    content = _batch_content(current_app.jinja_env.get_template(template))
+    size = current_app.config['EMAIL_BATCH_SIZE']
+    batch = uuid.uuid4().hex
+    messages = []
+    for i in range(0, len(versions), size):
+        message = Email_batch_service(versions[i:i + size], content=content, sender=sender, subject=subject).to_message()
+        message['batch'] = batch
+        messages.append(message)
+
+    results = {v['to'][0]['email']: {'status': 'queued'} for v in versions}
+    results.update({email: {'status': 'rejected', 'error': "invalid or duplicated email"} for email in rejected if email not in seen})
+    if results:
+        email_queue.record(batch, results) #before the worker can update them
+    if messages:
+        email_queue.enqueue(*messages) #the emails are sent by the email worker
 
-    pass
\ No newline at end of file
+    return {"batch": batch, "queued": len(versions), "rejected": rejected}
@@ -0,0 +1,194 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor():
+    '''
+    Health of the app dependencies (postgresql, redis, smtp api), probed concurrently
+    by a background thread of each worker process. Requests are answered with the
+    last snapshot, so load balancer checks don't touch the db or redis.
+
+    - each probe has its own timeout. a probe that hangs is reported as down, and is
+    not started again until it returns, so a stuck dependency can't pile up threads.
+    - the snapshot keeps, for each dependency: up, latency_ms, last_success and error.
+    - the app is down if a critical dependency is down, degraded if any other is.
+
+    config:
+    - HEALTH_REFRESH_INTERVAL: seconds between probes.
+    - HEALTH_PROBE_TIMEOUT: seconds to wait for each probe.
+    - HEALTH_SMTP_URL: url of the smtp api, any response below 500 means it is up.
+    The smtp probe is skipped if empty.
+    - HEALTH_CRITICAL: dependencies that take the app down, default ('postgresql', 'redis').
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('HEALTH_REFRESH_INTERVAL', 5.0)
+        app.config.setdefault('HEALTH_PROBE_TIMEOUT', 2.0)
+        app.config.setdefault('HEALTH_SMTP_URL', None)
+        app.config.setdefault('HEALTH_CRITICAL', ('postgresql', 'redis'))
+
+        app.extensions['health'] = _HealthState(app)
+
+    @staticmethod
+    def _state(app=None):
+        return (app or current_app).extensions['health']
+
+    def snapshot(self, app=None) -> dict:
+        '''
+        returns the last health snapshot. the first call of each process waits for
+        one round of probes (bounded by HEALTH_PROBE_TIMEOUT).
+        '''
+        return self._state(app).snapshot()
+
+    def refresh(self, app=None) -> dict:
+        '''
+        probes every dependency now and returns the new snapshot.
+        '''
+        return self._state(app).refresh()
+
+
+def _probe_postgresql(app, timeout):
+    with app.app_context():
+        with app.extensions['sqlalchemy'].engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+
+def _probe_redis(app, timeout):
+    app.extensions['redis'].client.ping()
+
+
+def _probe_smtp(app, timeout):
+    import requests
+    resp = requests.head(app.config['HEALTH_SMTP_URL'], timeout=timeout)
+    if resp.status_code >= 500:
+        raise ConnectionError(f"smtp api responded {resp.status_code}")
+
+
+class _HealthState():
+
+    def __init__(self, app):
+        self.interval = app.config['HEALTH_REFRESH_INTERVAL']
+        self.timeout = app.config['HEALTH_PROBE_TIMEOUT']
+        self.critical = set(app.config['HEALTH_CRITICAL'])
+        self.probes = {'postgresql': _probe_postgresql, 'redis': _probe_redis}
+        if app.config['HEALTH_SMTP_URL']:
+            self.probes['smtp'] = _probe_smtp
+
+        self.results = {name: _result() for name in self.probes}
+        self.checked_at = None
+        self._app = app
+        self._running = {} #probe name -> future still in flight
+        self._executor = None
+        self._pid = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        self._ensure_worker()
+        if self.checked_at is None:
+            with self._refresh_lock:
+                if self.checked_at is None: #not done by the worker in the meantime
+                    return self._refresh()
+        return self._build()
+
+    def refresh(self) -> dict:
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> dict:
+        executor = self._ensure_executor()
+        started = {}
+        for name, probe in self.probes.items():
+            future = self._running.get(name)
+            if future is None or future.done():
+                future = self._running[name] = executor.submit(_timed, probe, self._app, self.timeout)
+            started[name] = future
+
+        wait(started.values(), timeout=self.timeout)
+        now = datetime.now(timezone.utc)
+        for name, future in started.items():
+            result = self.results[name]
+            if not future.done():
+                result.update(up=False, latency_ms=None, error=f"timeout after {self.timeout}s")
+                continue
+
+            latency, error = future.result()
+            result.update(up=error is None, latency_ms=round(latency * 1000, 2), error=error)
+            if error is None:
+                result['last_success'] = now
+
+        self.checked_at = now
+        return self._build()
+
+    def _build(self) -> dict:
+        dependencies = {name: dict(result) for name, result in self.results.items()}
+        down = {name for name, result in dependencies.items() if not result['up']}
+        if down & self.critical:
+            status = 'down'
+        elif down:
+            status = 'degraded'
+        else:
+            status = 'ok'
+
+        return {
+            "status": status,
+            "checked_at": self.checked_at,
+            "dependencies": dependencies
+        }
+
+    def _ensure_executor(self):
+        #created lazily in each worker process, threads don't survive a fork.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=len(self.probes), thread_name_prefix="health-probe")
+                    self._running = {}
+                    self._pid = pid
+        return self._executor
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker_pid == pid:
+            return
+
+        with self._lock:
+            if self._worker_pid == pid:
+                return
+            thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+            thread.start()
+            self._worker_pid = pid
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("health refresh failed: %s", e)
+            time.sleep(self.interval)
+
+
+def _result() -> dict:
+    return {"up": False, "latency_ms": None, "last_success": None, "error": "not checked yet"}
+
+
+def _timed(probe, app, timeout):
+    start = time.perf_counter()
+    try:
+        probe(app, timeout)
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, str(e) or e.__class__.__name__
@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_jwt_extended import decode_token
 
-from flask import jsonify
+from flask import jsonify, current_app, stream_with_context
 
 
 def _epoch_utc_to_datetime(epoch_utc):
@@ -42,19 +42,22 @@ class JSONResponse():
     - app_result = "success", "error"
     - status_code = http status code
     - payload = dict con cualquier informacion que se necesite enviar al usuario.
+    - headers = dict con headers http adicionales de la respuesta.
 
     methods:
 
     - serialize() -> return dict
     - to_json() -> http JSON response
+    - to_json_stream(key, items, trailer=None) -> streamed http JSON response
 
     '''
 
-    def __init__(self, message, app_result="success", status_code=200, payload=None):
+    def __init__(self, message, app_result="success", status_code=200, payload=None, headers=None):
         self.app_result = app_result
         self.status_code = status_code
         self.data = payload
         self.message = message
+        self.headers = headers
 
     def serialize(self):
         rv = {
@@ -65,4 +68,33 @@ class JSONResponse():
         return rv
 
     def to_json(self):
-        return jsonify(self.serialize()), self.status_code
\ No newline at end of file
+        if self.headers:
+            return jsonify(self.serialize()), self.status_code, self.headers
+        return jsonify(self.serialize()), self.status_code
+
+    def to_json_stream(self, key, items, trailer=None):
+        """
+        Respuesta JSON enviada por partes, los elementos del iterable "items" se escriben
+        en data[key] a medida que se generan, sin construir la respuesta completa en memoria.
+        trailer: callable que retorna un dict con campos adicionales de data, se evalua
+        luego de consumir "items" (p.ej. el cursor de la siguiente pagina).
+        """
+        dumps = current_app.json.dumps
+
+        def generate():
+            yield '{"result": %s, "message": %s, "data": {' % (dumps(self.app_result), dumps(self.message))
+            for k, v in dict(self.data or ()).items():
+                yield f'{dumps(k)}: {dumps(v)}, '
+
+            yield f'{dumps(key)}: ['
+            for i, item in enumerate(items):
+                yield f'{", " if i else ""}{dumps(item)}'
+            yield ']'
+
+            for k, v in (trailer() if trailer is not None else {}).items():
+                yield f', {dumps(k)}: {dumps(v)}'
+            yield '}}'
+
+        return current_app.response_class(
+            stream_with_context(generate()), status=self.status_code, headers=self.headers, mimetype='application/json'
+        )
\ No newline at end of file
@@ -0,0 +1,93 @@
+import decimal
+from datetime import date, datetime, timezone
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: #optional dependency
+    orjson = None
+
+
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def _http_date(o) -> str:
+    '''
+    same output as werkzeug.http.http_date (naive datetimes are UTC), without its overhead.
+    '''
+    if not isinstance(o, datetime):
+        o = datetime(o.year, o.month, o.day)
+    elif o.tzinfo is not None:
+        o = o.astimezone(timezone.utc)
+    return f"{_WEEKDAYS[o.weekday()]}, {o.day:02d} {_MONTHS[o.month - 1]} {o.year:04d} {o.hour:02d}:{o.minute:02d}:{o.second:02d} GMT"
+
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return _http_date(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+
+def _default_iso(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    return _default(o)
+
+
+class AppJSONProvider(DefaultJSONProvider):
+    '''
+    JSON provider of the app, used by jsonify, JSONResponse and APIException.
+
+    config:
+    - JSON_ENCODER_BACKEND: 'stdlib' or 'orjson'. orjson falls back to stdlib if it isn't installed.
+    - JSON_DATETIME_FORMAT: 'http' (RFC 822, flask's default format) or 'iso' (ISO 8601,
+    serialized natively by orjson, the fastest option).
+    - JSON_COMPACT: True = no indentation, even in debug mode. None = flask's behavior.
+
+    orjson writes utf-8 instead of \\u escapes, both are valid JSON for clients.
+    '''
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend = app.config.get('JSON_ENCODER_BACKEND', 'stdlib')
+        self.datetime_format = app.config.get('JSON_DATETIME_FORMAT', 'http')
+        self.compact = app.config.get('JSON_COMPACT', None)
+        self.default = _default_iso if self.datetime_format == 'iso' else _default
+
+        if self.backend == 'orjson' and orjson is None:
+            app.logger.warning("orjson is not installed, using the stdlib json encoder")
+            self.backend = 'stdlib'
+
+        if self.backend == 'orjson':
+            self._orjson_options = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                self._orjson_options |= orjson.OPT_SORT_KEYS
+            if self.datetime_format != 'iso':
+                self._orjson_options |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(self, obj, indent=False) -> bytes:
+        if self.backend == 'orjson':
+            options = self._orjson_options | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, default=self.default, option=options)
+
+        if indent:
+            return super().dumps(obj, indent=2).encode()
+        return super().dumps(obj, separators=(",", ":")).encode()
+
+    def dumps(self, obj, **kwargs) -> str:
+        if self.backend == 'orjson' and not kwargs:
+            return self.dumps_bytes(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
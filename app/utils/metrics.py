@@ -0,0 +1,220 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry():
+    '''
+    Histograms and counters kept in memory by each worker process, rendered in
+    the prometheus text format. observe() and inc() only take a lock and update a list.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {} #name -> {labels: [bucket counts..., sum, count]}
+        self._counters = {} #name -> {labels: value}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, labels:tuple, value:float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            h = series.get(labels)
+            if h is None:
+                h = series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def inc(self, name, labels:tuple, value=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def render(self, gauges=None, labels:tuple=()) -> str:
+        '''
+        gauges: {name: {labels: value}} sampled at render time.
+        labels are tuples of (key, value) pairs, the labels argument is added to every series.
+        '''
+        const = labels
+        lines = []
+        with self._lock:
+            histograms = {n: {l: list(h) for l, h in s.items()} for n, s in self._histograms.items()}
+            counters = {n: dict(s) for n, s in self._counters.items()}
+
+        for name, series in sorted(histograms.items()):
+            self._header(lines, name, 'histogram')
+            for labels, h in sorted(series.items()):
+                labels += const
+                cumulative = 0
+                for le, n in zip(self.buckets + ('+Inf',), h):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {h[-2]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h[-1]}")
+
+        for name, series in sorted(counters.items()):
+            self._header(lines, name, 'counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(labels + const)} {value}")
+
+        for name, series in sorted((gauges or {}).items()):
+            self._header(lines, name, 'gauge')
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(labels + const)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, kind):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@contextmanager
+def track(component):
+    '''
+    attributes the time spent inside the block to component (db, redis, email, password)
+    in the breakdown of the current request. no-op outside of a request.
+    '''
+    breakdown = g.get('_metrics') if has_app_context() else None
+    if breakdown is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(breakdown, component, time.perf_counter() - start)
+
+
+def _add(breakdown, component, elapsed):
+    item = breakdown.get(component)
+    if item is None:
+        breakdown[component] = [elapsed, 1]
+    else:
+        item[0] += elapsed
+        item[1] += 1
+
+
+class Metrics():
+    '''
+    Per-request latency, broken down by component, aggregated per endpoint and status code.
+
+    - http_request_duration_seconds{endpoint,method,status}: histogram.
+    - http_request_component_seconds{endpoint,component}: time of each request spent in db,
+    redis, email or password hashing.
+    - http_request_component_calls_total{endpoint,component}: number of queries / commands.
+
+    metrics are kept per worker process, every series has a pid label: a scrape reaches
+    one worker, aggregate with sum without (pid).
+    the status endpoints (metrics, pools) require METRICS_TOKEN as bearer token or a
+    super-user access token.
+    config:
+    - METRICS_ENABLED: default True.
+    - METRICS_TOKEN: bearer token of the scrapers, default None (super-user tokens only).
+    '''
+
+    def __init__(self, app=None):
+        self.registry = MetricsRegistry()
+        self.registry.describe('http_request_duration_seconds', "Request latency by endpoint and status code.")
+        self.registry.describe('http_request_component_seconds', "Time of each request spent in a component (db, redis, email, password).")
+        self.registry.describe('http_request_component_calls_total', "Calls made to each component (db queries, redis commands, ...).")
+        self._gauges = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_TOKEN', None)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        _listen_db_events()
+
+    def add_gauges(self, fn):
+        '''
+        registers a callable returning {name: {labels: value}}, sampled on each scrape.
+        '''
+        self._gauges.append(fn)
+        return fn
+
+    def _start(self):
+        g._metrics = {}
+        g._metrics_start = time.perf_counter()
+
+    def _finish(self, response):
+        start = g.pop('_metrics_start', None)
+        breakdown = g.pop('_metrics', None)
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        self.registry.observe(
+            'http_request_duration_seconds',
+            (('endpoint', endpoint), ('method', request.method), ('status', response.status_code)),
+            time.perf_counter() - start
+        )
+        for component, (elapsed, calls) in breakdown.items():
+            labels = (('component', component), ('endpoint', endpoint))
+            self.registry.observe('http_request_component_seconds', labels, elapsed)
+            self.registry.inc('http_request_component_calls_total', labels, calls)
+        return response
+
+    def render(self) -> str:
+        gauges = {}
+        for fn in self._gauges:
+            try:
+                gauges.update(fn())
+            except Exception:
+                pass
+        return self.registry.render(gauges, labels=(('pid', os.getpid()),))
+
+
+_db_events = []
+
+
+def _listen_db_events():
+    #global listeners, cover every engine (and bind) of the app.
+    if _db_events:
+        return
+    _db_events.append(True)
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['_metrics_start'] = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop('_metrics_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        breakdown = g.get('_metrics') if has_app_context() else None
+        if breakdown is not None:
+            _add(breakdown, 'db', elapsed)
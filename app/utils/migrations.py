@@ -0,0 +1,19 @@
+import os
+
+
+class LazyMigrate():
+    '''
+    Flask-Migrate, initialized only when the app runs under the flask cli (`flask db ...`).
+    alembic is the slowest import of the app and web workers (gunicorn) never use it.
+    '''
+
+    def __init__(self, app=None, db=None, **kwargs):
+        if app is not None:
+            self.init_app(app, db, **kwargs)
+
+    def init_app(self, app, db, **kwargs):
+        if os.environ.get('FLASK_RUN_FROM_CLI') != 'true': #set by the flask cli
+            return
+
+        from flask_migrate import Migrate
+        Migrate(app, db, **kwargs)
@@ -0,0 +1,72 @@
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+from app.extensions import db
+from app.utils.exceptions import APIException
+
+
+def _serializer(scope):
+    return URLSafeSerializer(current_app.config['SECRET_KEY'] or current_app.config['JWT_SECRET_KEY'], salt=f"cursor.{scope}")
+
+
+def encode_cursor(scope:str, position:dict) -> str:
+    '''
+    Genera un token de continuacion opaco (y firmado) para paginacion por keyset.
+    Args:
+        * scope (str): nombre del listado, un cursor solo es valido en su listado.
+        * position (dict): ultima posicion entregada al cliente.
+    Returns:
+        str: cursor url-safe
+    '''
+    return _serializer(scope).dumps(position)
+
+
+def decode_cursor(scope:str, cursor:str) -> dict:
+    '''
+    Decodifica un cursor generado con encode_cursor, raise APIException si el cursor es invalido.
+    '''
+    try:
+        return _serializer(scope).loads(cursor)
+    except BadSignature:
+        raise APIException("invalid cursor in request", payload={"invalid": {"cursor": cursor}})
+
+
+def page_size(requested, default:int, maximum:int) -> int:
+    '''
+    Valida el tamaño de pagina solicitado, raise APIException si esta fuera de rango.
+    '''
+    if requested is None:
+        return default
+    if requested < 1 or requested > maximum:
+        raise APIException(f"invalid page size, must be between 1 and {maximum}", payload={"invalid": {"limit": requested}})
+    return requested
+
+
+def keyset_page(scope:str, stmt, key, limit:int, cursor:str=None, filters:dict=None):
+    '''
+    Una pagina de un listado ordenado por key (columna unica, e.g. la primary key), sin OFFSET:
+    una sola consulta por pagina, sin importar la posicion en el listado.
+    Args:
+        * scope (str): nombre del listado.
+        * stmt: select de entidades, e.g. db.select(Asset).where(...)
+        * key: columna de ordenamiento, e.g. Asset.id
+        * limit (int): elementos por pagina.
+        * cursor (str): "next_cursor" de la pagina anterior, None para la primera pagina.
+        * filters (dict): filtros del listado, un cursor solo es valido con los mismos filtros.
+    Returns:
+        (items, next_cursor): next_cursor es None en la ultima pagina.
+    '''
+    filters = filters or {}
+    if cursor:
+        position = decode_cursor(scope, cursor)
+        if position.get('filters') != filters:
+            raise APIException("invalid cursor in request", payload={"invalid": {"cursor": cursor}})
+        stmt = stmt.where(key > position['after'])
+
+    items = db.session.scalars(stmt.order_by(key).limit(limit + 1)).all()
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    return items, encode_cursor(scope, {'after': getattr(items[-1], key.key), 'filters': filters})
+
@@ -0,0 +1,164 @@
+import os
+import sys
+import hmac
+import atexit
+import hashlib
+import threading
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from app.utils.exceptions import APIException
+from app.utils.metrics import track
+
+
+def _hash(method, password) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password) -> bool:
+    method, sep, rest = pwhash.partition("$")
+    if sep and method in hashlib.algorithms_guaranteed:
+        #legacy plain hashes (method='sha256'), no longer supported by werkzeug.
+        salt, _, hashval = rest.partition("$")
+        if salt:
+            digest = hmac.new(salt.encode(), password.encode(), method).hexdigest()
+        else:
+            digest = hashlib.new(method, password.encode()).hexdigest()
+        return hmac.compare_digest(digest, hashval)
+
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher():
+    '''
+    Password hashing and verification in a bounded worker pool, so request threads
+    don't pile up cpu-bound hashes. pbkdf2 and scrypt release the GIL, a thread pool
+    runs them in parallel; 'process' isolates them completely.
+
+    config:
+    - PASSWORD_HASH_METHOD: werkzeug method, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'.
+    - PASSWORD_HASH_EXECUTOR: 'thread' or 'process'.
+    - PASSWORD_HASH_WORKERS: size of the pool.
+    - PASSWORD_HASH_MAX_PENDING: hashes queued or running at once, beyond that requests get a 503.
+    - PASSWORD_HASH_TIMEOUT: seconds a request waits for its hash.
+    - PASSWORD_HASH_BATCH_WORKERS: processes of the pool used by hash_many (bulk jobs).
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_HASH_EXECUTOR', 'thread')
+        app.config.setdefault('PASSWORD_HASH_WORKERS', os.cpu_count() or 2)
+        app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 64)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 5)
+        app.config.setdefault('PASSWORD_HASH_BATCH_WORKERS', os.cpu_count() or 2)
+
+        app.extensions['password_hasher'] = _HasherState(app.config)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['password_hasher']
+
+    def hash(self, password) -> str:
+        state = self._state()
+        return state.run(_hash, state.method, password)
+
+    def hash_many(self, passwords:list) -> list:
+        '''
+        hashes of a list of passwords, in the same order. runs in a process pool separated
+        from the request pool, no limit of pending hashes nor timeout.
+        '''
+        state = self._state()
+        if not passwords:
+            return []
+        chunksize = max(len(passwords) // (state.batch_workers * 4), 1)
+        with track('password'):
+            return list(state.batch_executor().map(_hash, repeat(state.method), passwords, chunksize=chunksize))
+
+    def verify(self, pwhash, password) -> bool:
+        return self._state().run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash) -> bool:
+        '''
+        True if the hash wasn't made with the configured method and cost.
+        '''
+        return pwhash.partition("$")[0] != self._state().method_prefix
+
+
+class _HasherState():
+
+    def __init__(self, config):
+        self.method = config['PASSWORD_HASH_METHOD']
+        self.executor_type = config['PASSWORD_HASH_EXECUTOR']
+        self.workers = config['PASSWORD_HASH_WORKERS']
+        self.timeout = config['PASSWORD_HASH_TIMEOUT']
+        self.pending = threading.BoundedSemaphore(config['PASSWORD_HASH_MAX_PENDING'])
+        self.method_prefix = _method_prefix(self.method)
+        self.batch_workers = config['PASSWORD_HASH_BATCH_WORKERS']
+        self._executor = None
+        self._pid = None
+        self._batch_executor = None
+        self._batch_pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        #created lazily in each worker process, pools don't survive a fork.
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    if self.executor_type == 'process':
+                        self._executor = _process_pool(self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                    self._pid = pid
+        return self._executor
+
+    def batch_executor(self):
+        pid = os.getpid()
+        if self._batch_pid != pid:
+            with self._lock:
+                if self._batch_pid != pid:
+                    self._batch_executor = _process_pool(self.batch_workers)
+                    self._batch_pid = pid
+        return self._batch_executor
+
+    def run(self, fn, *args):
+        if not self.pending.acquire(timeout=self.timeout):
+            raise APIException("server busy, try again later", status_code=503)
+        try:
+            with track('password'):
+                return self.executor().submit(fn, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            raise APIException("server busy, try again later", status_code=503)
+        finally:
+            self.pending.release()
+
+
+def _process_pool(workers) -> ProcessPoolExecutor:
+    #the web workers run threads, a fork could copy a lock held by another thread: the
+    #processes are started from a clean forkserver (spawn where there isn't one).
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    #pending hashes are dropped when the worker process exits. before python 3.9 there's no
+    #cancel_futures, and an early shutdown breaks the exit hook of concurrent.futures, which
+    #already joins the processes.
+    if sys.version_info >= (3, 9):
+        atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+    return executor
+
+
+def _method_prefix(method) -> str:
+    #werkzeug stores the full parameters, 'scrypt' -> 'scrypt:32768:8:1'
+    name, *args = method.split(":")
+    if name == 'scrypt' and not args:
+        return "scrypt:32768:8:1"
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
@@ -0,0 +1,97 @@
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.extensions import db, password_hasher
+from app.models.main import User
+from app.utils.helpers import normalize_names
+from app.utils.validations import Schema, email_field, password_field, letters_field
+from app.utils.email_service import send_invitation_emails
+
+USER_SCHEMA = Schema({
+    "email": email_field(),
+    "password": password_field(),
+    "fname": letters_field(spaces=True),
+    "lname": letters_field(spaces=True)
+})
+
+
+def provision_users(users:list, send_invitations:bool=True, chunk_size:int=1000) -> dict:
+    '''
+    Crea usuarios en lote, para los administradores.
+    Args:
+        * users (list): lista de {email, password, fname, lname}, mismos campos de /sign-up.
+        * send_invitations (bool): agrega un correo de invitacion por usuario creado a la cola de correos.
+        * chunk_size (int): usuarios por INSERT y por transaccion.
+    Returns:
+        {"created": int, "existing": [email], "errors": [{"row", "email", "error", "data"}]}
+
+    - todas las filas se validan antes de calcular los hashes, las invalidas se reportan.
+    - los hashes se calculan en el pool de procesos de password_hasher.
+    - los correos ya registrados no se modifican (INSERT .. ON CONFLICT (email) DO NOTHING).
+    - los correos de invitacion se envian a la cola en un solo lote.
+    '''
+    errors = []
+    valid = []
+    seen = {}
+    for row, data in enumerate(users):
+        if not isinstance(data, dict):
+            errors.append({"row": row, "email": None, "error": "invalid user, an object is expected", "data": None})
+            continue
+        invalid = USER_SCHEMA.errors(data)
+        if invalid is not None:
+            message, payload = invalid
+            errors.append({"row": row, "email": data.get('email'), "error": message, "data": payload})
+            continue
+        email = data['email'].lower()
+        if email in seen:
+            errors.append({"row": row, "email": email, "error": f"duplicated email, first defined in row {seen[email]}", "data": None})
+            continue
+        seen[email] = row
+        valid.append((row, email, data))
+
+    hashes = password_hasher.hash_many([data['password'] for _, _, data in valid])
+
+    created = []
+    for i in range(0, len(valid), chunk_size):
+        chunk = valid[i:i + chunk_size]
+        values = [{
+            'email': email,
+            'password_hash': pwhash,
+            'fname': normalize_names(data['fname'], spaces=True),
+            'lname': normalize_names(data['lname'], spaces=True),
+            'email_confirmed': False,
+            'status': 'active'
+        } for (_, email, data), pwhash in zip(chunk, hashes[i:i + chunk_size])]
+
+        try:
+            inserted = db.session.scalars(_insert_new_users(values)).all()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            reason = str(getattr(e, 'orig', None) or e)
+            errors.extend({"row": row, "email": email, "error": f"insert failed: {reason}", "data": None} for row, email, _ in chunk)
+            continue
+
+        inserted = set(inserted)
+        created.extend(v for v in values if v['email'] in inserted)
+
+    if send_invitations:
+        send_invitation_emails([{'fname': u['fname'], 'email': u['email']} for u in created])
+
+    created_emails = {u['email'] for u in created}
+    failed = {e['email'] for e in errors}
+    return {
+        "created": len(created),
+        "existing": [email for _, email, _ in valid if email not in created_emails and email not in failed],
+        "errors": sorted(errors, key=lambda e: e['row'])
+    }
+
+
+def _insert_new_users(values):
+    #INSERT .. ON CONFLICT (email) DO NOTHING RETURNING email
+    if db.session.get_bind().dialect.name == 'sqlite':
+        stmt = sqlite_insert(User)
+    else:
+        stmt = pg_insert(User)
+    return stmt.values(values).on_conflict_do_nothing(index_elements=['email']).returning(User.email)
@@ -0,0 +1,154 @@
+import math
+import time
+import logging
+import threading
+from flask import current_app, request
+
+from app.utils.exceptions import APIException
+from app.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+
+def parse_limit(limit:str) -> tuple:
+    '''
+    "20/60" -> (20, 60): 20 requests every 60 seconds.
+    '''
+    count, _, seconds = limit.partition("/")
+    return int(count), int(seconds or 1)
+
+
+def _sliding_count(current, previous, elapsed, window) -> float:
+    #previous window weighted by the part of it still inside the sliding window.
+    return current + previous * (1 - elapsed / window)
+
+
+def _retry_after(current, previous, elapsed, window, limit) -> int:
+    if current >= limit or previous == 0:
+        return max(math.ceil(window - elapsed), 1)
+    #the weight of the previous window has to drop until the count fits again.
+    fits_at = window * (1 - (limit - current) / previous)
+    return max(math.ceil(fits_at - elapsed), 1)
+
+
+class RedisRateLimitBackend():
+    '''
+    Sliding-window counters on redis: one counter per fixed window, the count is
+    the current window plus the weighted previous one. one round-trip per check.
+    '''
+
+    def __init__(self, client, prefix='rl'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, window, now):
+        index = int(now // window)
+        current_key = f"{self.prefix}:{key}:{index}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(f"{self.prefix}:{key}:{index - 1}")
+        current, _, previous = pipe.execute()
+        return int(current), int(previous or 0)
+
+
+class MemoryRateLimitBackend():
+    '''
+    In-process stand-in of RedisRateLimitBackend, for tests.
+    '''
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, window, now):
+        index = int(now // window)
+        with self._lock:
+            current = self._counters.get((key, index), 0) + 1
+            self._counters[(key, index)] = current
+            previous = self._counters.get((key, index - 1), 0)
+            for k in [k for k in self._counters if k[0] == key and k[1] < index - 1]:
+                del self._counters[k]
+        return current, previous
+
+
+class RateLimiter():
+    '''
+    Load shedding for public endpoints. Checked in a before_request hook, so requests
+    over the limit are rejected before any db, hashing or email work.
+
+    config:
+    - RATE_LIMITS: {endpoint: {'ip': "count/seconds", 'email': "count/seconds"}}, endpoint
+    as in request.endpoint, e.g. 'auth_bp.login'. 'email' is read from the json body
+    or the query params.
+    - RATE_LIMIT_BACKEND: 'redis' or 'memory'.
+    - RATE_LIMIT_FAIL_OPEN: let requests through if redis can't be reached (default True).
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMITS', {})
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'redis')
+        app.config.setdefault('RATE_LIMIT_FAIL_OPEN', True)
+
+        #the redis backend is created on the first check, redis_service must be initialized first.
+        app.extensions['rate_limiter'] = MemoryRateLimitBackend() if app.config['RATE_LIMIT_BACKEND'] == 'memory' else None
+        app.before_request(self.check_request)
+
+    def check_request(self):
+        rules = current_app.config['RATE_LIMITS'].get(request.endpoint)
+        if not rules:
+            return None
+
+        for kind, limit in rules.items():
+            value = self._identity(kind)
+            if value:
+                self.check(f"{request.endpoint}:{kind}:{value}", limit)
+        return None
+
+    @staticmethod
+    def _identity(kind):
+        if kind == 'ip':
+            return request.remote_addr
+        if kind == 'email':
+            body = request.get_json(silent=True)
+            #GETs send an empty json body ({}), the email is in the query string
+            email = (body if isinstance(body, dict) else {}).get('email') or request.args.get('email')
+            return email.lower() if isinstance(email, str) else None
+        return None
+
+    @staticmethod
+    def _backend():
+        backend = current_app.extensions['rate_limiter']
+        if backend is None:
+            backend = current_app.extensions['rate_limiter'] = RedisRateLimitBackend(current_app.extensions['redis'].client)
+        return backend
+
+    def check(self, key, limit:str):
+        '''
+        counts a hit for key, raise APIException (429) with a Retry-After header if key is over the limit.
+        '''
+        count, window = parse_limit(limit)
+        now = time.time()
+        try:
+            with track('redis'):
+                current, previous = self._backend().hit(key, window, now)
+        except Exception as e:
+            if current_app.config['RATE_LIMIT_FAIL_OPEN']:
+                logger.warning("rate limiter unavailable, request allowed: %s", e)
+                return None
+            raise APIException("rate limiter service unavailable", status_code=503)
+
+        elapsed = now % window
+        if _sliding_count(current, previous, elapsed, window) > count:
+            retry_after = _retry_after(current, previous, elapsed, window, count)
+            raise APIException(
+                "too many requests, try again later",
+                status_code=429,
+                payload={"retry_after": retry_after},
+                headers={"Retry-After": str(retry_after)}
+            )
+        return None
@@ -0,0 +1,62 @@
+import time
+import threading
+import redis
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    '''
+    Bounded, blocking connection pool that keeps usage counters for monitoring.
+
+    redis-py checks the pid of the process on every get/release, so a pool
+    created before a fork (gunicorn --preload) is reset in the child and never
+    shares sockets with the parent. reset() also clears the counters.
+    '''
+
+    def reset(self):
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._created = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        super().reset()
+
+    def make_connection(self):
+        connection = super().make_connection()
+        with self._stats_lock:
+            self._created += 1
+        return connection
+
+    def get_connection(self, *args, **kwargs):
+        waited = self.pool.empty() #every slot is taken, the caller will block
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            with self._stats_lock:
+                self._timeouts += waited
+            raise
+
+        with self._stats_lock:
+            self._in_use += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += time.perf_counter() - start
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        with self._stats_lock:
+            self._in_use = max(self._in_use - 1, 0)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_connections": self.max_connections,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": max(self._created - self._in_use, 0),
+                "waits": self._waits,
+                "wait_time": round(self._wait_time, 6),
+                "timeouts": self._timeouts
+            }
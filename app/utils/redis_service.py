@@ -1,40 +1,120 @@
-import redis
 import os
-import datetime
-from app.utils import (
-    exceptions, helpers
-)
+import threading
+from flask import current_app, has_app_context
 from flask_jwt_extended import decode_token
 
 
-def redis_client():
+class RedisService():
     '''
-    define a redis client with os.environ variables.
+    App-scoped redis subsystem, one shared connection pool per app.
+    redis-py is imported and the pool created on first use, not in create_app.
+
+    config:
+    - REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB
+    - REDIS_POOL_MAX_CONNECTIONS: max sockets opened by each worker process.
+    - REDIS_POOL_TIMEOUT: seconds to wait for a free connection before failing.
+    - REDIS_SOCKET_TIMEOUT, REDIS_SOCKET_CONNECT_TIMEOUT: seconds.
+    - REDIS_HEALTH_CHECK_INTERVAL: seconds idle before a connection is pinged on checkout.
+    - REDIS_CONNECTION_CLASS: connection class of the pool, default redis.Connection. e.g.
+    fakeredis.FakeConnection in benchmarks, with REDIS_CONNECTION_OPTIONS {'server': FakeServer()}.
+    - REDIS_CONNECTION_OPTIONS: extra keyword arguments of the connections.
     '''
-    r = redis.Redis(
-        host= os.environ.get('REDIS_HOST', 'localhost'),
-        port= os.environ.get('REDIS_PORT', '6379'), 
-        password= os.environ.get('REDIS_PASSWORD', None)
-    )
-    return r
 
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REDIS_HOST', 'localhost')
+        app.config.setdefault('REDIS_PORT', 6379)
+        app.config.setdefault('REDIS_PASSWORD', None)
+        app.config.setdefault('REDIS_DB', 0)
+        app.config.setdefault('REDIS_POOL_MAX_CONNECTIONS', 20)
+        app.config.setdefault('REDIS_POOL_TIMEOUT', 2.0)
+        app.config.setdefault('REDIS_SOCKET_TIMEOUT', 1.0)
+        app.config.setdefault('REDIS_SOCKET_CONNECT_TIMEOUT', 1.0)
+        app.config.setdefault('REDIS_HEALTH_CHECK_INTERVAL', 30)
+        app.config.setdefault('REDIS_CONNECTION_CLASS', None)
+        app.config.setdefault('REDIS_CONNECTION_OPTIONS', {})
+
+        app.extensions['redis'] = _RedisState(app.config)
+
+    @staticmethod
+    def _state(app=None):
+        app = app or current_app
+        return app.extensions['redis']
+
+    def client(self, app=None):
+        return self._state(app).client
+
+    def pool_stats(self, app=None) -> dict:
+        return self._state(app).pool.stats()
+
+    def dedicated_client(self, app=None, **overrides):
+        '''
+        client outside of the shared pool, for long blocking commands that would
+        otherwise hold a pooled connection (or hit its socket timeout).
+        '''
+        import redis
+
+        pool = self._state(app).pool
+        kwargs = dict(pool.connection_kwargs)
+        kwargs.update(overrides)
+        return redis.Redis(connection_pool=redis.ConnectionPool(connection_class=pool.connection_class, **kwargs))
 
-def add_jwt_to_blocklist(claims):
 
-    r = redis_client()
+class _RedisState():
 
-    jti = claims['jti']
-    jwt_exp = helpers._epoch_utc_to_datetime(claims['exp'])
-    now_date = datetime.datetime.now()
+    def __init__(self, config):
+        self._config = config
+        self._client = None
+        self._lock = threading.Lock()
 
-    if (jwt_exp < now_date):
-        raise exceptions.APIException("invalid jwt in request", status_code=405)
-    else:
-        expires = jwt_exp - now_date
-    print(expires) #debug
-    try:
-        r.set(jti, "", ex=expires)
-    except :
-        raise exceptions.APIException("connection error with redis server", status_code=500)
+    @property
+    def pool(self):
+        return self.client.connection_pool
 
-    pass
\ No newline at end of file
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    def _connect(self):
+        import redis
+        from app.utils.redis_pool import InstrumentedConnectionPool
+
+        config = self._config
+        pool = InstrumentedConnectionPool(
+            connection_class=config['REDIS_CONNECTION_CLASS'] or redis.Connection,
+            max_connections=int(config['REDIS_POOL_MAX_CONNECTIONS']),
+            timeout=float(config['REDIS_POOL_TIMEOUT']),
+            host=config['REDIS_HOST'],
+            port=int(config['REDIS_PORT']),
+            password=config['REDIS_PASSWORD'],
+            db=int(config['REDIS_DB']),
+            socket_timeout=config['REDIS_SOCKET_TIMEOUT'],
+            socket_connect_timeout=config['REDIS_SOCKET_CONNECT_TIMEOUT'],
+            health_check_interval=config['REDIS_HEALTH_CHECK_INTERVAL'],
+            **config['REDIS_CONNECTION_OPTIONS']
+        )
+        return redis.Redis(connection_pool=pool)
+
+
+def redis_client():
+    '''
+    returns the redis client bound to the app's shared connection pool.
+    outside of an app context, a standalone client is defined with os.environ variables.
+    '''
+    if has_app_context() and 'redis' in current_app.extensions:
+        return current_app.extensions['redis'].client
+
+    import redis
+    r = redis.Redis(
+        host= os.environ.get('REDIS_HOST', 'localhost'),
+        port= os.environ.get('REDIS_PORT', '6379'),
+        password= os.environ.get('REDIS_PASSWORD', None)
+    )
+    return r
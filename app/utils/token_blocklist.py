@@ -0,0 +1,266 @@
+import os
+import math
+import time
+import datetime
+import logging
+import threading
+from flask import current_app
+
+from app.utils.cache import LRUCache
+from app.utils.exceptions import APIException
+from app.utils.metrics import track
+from app.utils.redis_service import redis_client
+
+logger = logging.getLogger(__name__)
+
+GENERATION_PREFIX = 'tokgen:'
+
+#new generation of an identity: max(now, current + 1), it always grows even if the clocks
+#of the workers disagree. published to the other workers in the same call.
+_BUMP_GENERATION_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local gen = string.format('%.0f', math.max(tonumber(ARGV[1]), current + 1))
+if ARGV[2] == '' then
+    redis.call('SET', KEYS[1], gen)
+else
+    redis.call('SET', KEYS[1], gen, 'EX', ARGV[2])
+end
+redis.call('PUBLISH', ARGV[3], KEYS[1] .. ' ' .. gen)
+return gen
+"""
+
+
+class TokenBlocklist():
+    '''
+    Revoked-token lookups served from a local cache in each worker process.
+
+    - revoked jtis are kept in a TTL-bounded LRU (ttl = remaining life of the token).
+    - tokens checked as "not revoked" are cached for JWT_BLOCKLIST_NEGATIVE_TTL seconds,
+    but only while this process is subscribed to the blocklist channel. Every revocation
+    is published on that channel, so the other workers learn about it without polling.
+    - if redis can't be reached and the cache has no answer, JWT_BLOCKLIST_FAIL_OPEN
+    decides: True lets the token through, False rejects the request with a 500 error.
+
+    token generations ("revoke all sessions"):
+    - every token gets the current generation of its identity in the `gen` claim (see the
+    additional_claims_loader of the app). tokens with an older generation are revoked.
+    - revoke_all(identity) is a single SET of tokgen:<identity>, whatever the number of
+    tokens issued. the generation is the revocation time (us), so the key can expire with
+    the tokens it revokes (JWT_ACCESS_TOKEN_EXPIRES) and later generations still grow.
+    the bump is atomic (lua): max(now, current + 1), a worker with a late clock can't
+    write a smaller generation.
+    - generations are cached locally for JWT_GENERATION_TTL seconds, revoke_all is also
+    published on the blocklist channel.
+
+    config:
+    - JWT_BLOCKLIST_LOCAL_CACHE: enables the local cache (default True).
+    - JWT_BLOCKLIST_CACHE_SIZE: max entries of each local cache.
+    - JWT_BLOCKLIST_NEGATIVE_TTL: seconds a "not revoked" answer is trusted.
+    - JWT_BLOCKLIST_CHANNEL: redis pub/sub channel for revocations.
+    - JWT_BLOCKLIST_FAIL_OPEN: policy while redis is unreachable.
+    - JWT_GENERATION_TTL: seconds a generation is cached locally.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JWT_BLOCKLIST_LOCAL_CACHE', True)
+        app.config.setdefault('JWT_BLOCKLIST_CACHE_SIZE', 10000)
+        app.config.setdefault('JWT_BLOCKLIST_NEGATIVE_TTL', 60)
+        app.config.setdefault('JWT_BLOCKLIST_CHANNEL', 'jwt-blocklist')
+        app.config.setdefault('JWT_BLOCKLIST_FAIL_OPEN', False)
+        app.config.setdefault('JWT_GENERATION_TTL', 30)
+
+        app.extensions['token_blocklist'] = _BlocklistState(app)
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['token_blocklist']
+
+    def is_revoked(self, jwt_payload) -> bool:
+        return self._state().is_revoked(jwt_payload['jti'], jwt_payload.get('sub'), jwt_payload.get('gen', 0))
+
+    def generation_claims(self, identity) -> dict:
+        '''
+        claims added to every new token of identity: {'gen': current generation}.
+        '''
+        return {'gen': self._state().generation(identity)}
+
+    def revoke_all(self, identity):
+        '''
+        revokes every token issued to identity so far, e.g. after a password change.
+        '''
+        self._state().revoke_all(identity)
+
+    def revoke_token(self, claims):
+        '''
+        revokes a single token (logout, verification tokens already used) for the rest
+        of its life. the jti key expires with the token, use revoke_all for every session.
+        '''
+        remaining = claims['exp'] - time.time()
+        if remaining <= 0:
+            raise APIException("invalid jwt in request", status_code=405)
+        self.revoke(claims['jti'], datetime.timedelta(seconds=math.ceil(remaining)))
+
+    def revoke(self, jti, expires):
+        '''
+        stores the jti in redis for the remaining life of the token and publishes it
+        to every worker. expires is a datetime.timedelta
+        '''
+        self._state().revoke(jti, expires)
+
+
+class _BlocklistState():
+
+    def __init__(self, app):
+        self.enabled = app.config['JWT_BLOCKLIST_LOCAL_CACHE']
+        self.negative_ttl = app.config['JWT_BLOCKLIST_NEGATIVE_TTL']
+        self.channel = app.config['JWT_BLOCKLIST_CHANNEL']
+        self.fail_open = app.config['JWT_BLOCKLIST_FAIL_OPEN']
+        self.revoked = LRUCache(maxsize=app.config['JWT_BLOCKLIST_CACHE_SIZE'])
+        self.not_revoked = LRUCache(maxsize=app.config['JWT_BLOCKLIST_CACHE_SIZE'], ttl=self.negative_ttl)
+        self.generations = LRUCache(maxsize=app.config['JWT_BLOCKLIST_CACHE_SIZE'], ttl=app.config['JWT_GENERATION_TTL'])
+        expires = app.config.get('JWT_ACCESS_TOKEN_EXPIRES')
+        self.generation_ttl = expires if isinstance(expires, datetime.timedelta) else None
+        self.subscribed = False
+        self._app = app
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti, identity=None, gen=0) -> bool:
+        current = self.generations.get(identity) if identity is not None else 0
+        if current is not None and gen < current:
+            return True
+        if self.enabled:
+            self._ensure_listener()
+            if jti in self.revoked:
+                return True
+            if current is not None and self.subscribed and jti in self.not_revoked:
+                return False
+
+        try:
+            pipe = redis_client().pipeline(transaction=False)
+            pipe.pttl(jti) #-2 if the key doesn't exists
+            if current is None:
+                pipe.get(f"{GENERATION_PREFIX}{identity}")
+            with track('redis'):
+                results = pipe.execute()
+        except Exception:
+            if self.fail_open:
+                logger.warning("redis unreachable, token %s accepted (fail-open policy)", jti)
+                return False
+            raise APIException("connection error with redis service", status_code=500)
+
+        ttl = results[0]
+        if current is None:
+            current = int(results[1] or 0)
+            self.generations.set(identity, current)
+            if gen < current:
+                return True
+
+        if ttl == -2:
+            if self.enabled and self.subscribed:
+                self.not_revoked.set(jti, True)
+            return False
+
+        if self.enabled:
+            self.revoked.set(jti, True, ttl=ttl / 1000 if ttl > 0 else None)
+        return True
+
+    def revoke(self, jti, expires):
+        try:
+            pipe = redis_client().pipeline(transaction=False)
+            pipe.set(jti, "", ex=expires)
+            pipe.publish(self.channel, f"{jti} {int(expires.total_seconds())}")
+            with track('redis'):
+                pipe.execute()
+        except Exception:
+            raise APIException("connection error with redis server", status_code=500)
+
+        self._mark_revoked(jti, expires.total_seconds())
+
+    def generation(self, identity) -> int:
+        current = self.generations.get(identity)
+        if current is not None:
+            return current
+        try:
+            with track('redis'):
+                current = int(redis_client().get(f"{GENERATION_PREFIX}{identity}") or 0)
+        except Exception as e:
+            #the oldest generation: the token is rejected if a revoke_all is missed, never accepted.
+            logger.warning("token generation of %s unknown, redis unreachable: %s", identity, e)
+            return 0
+        self.generations.set(identity, current)
+        return current
+
+    def revoke_all(self, identity):
+        key = f"{GENERATION_PREFIX}{identity}"
+        ttl = int(self.generation_ttl.total_seconds()) if self.generation_ttl else ''
+        try:
+            bump = redis_client().register_script(_BUMP_GENERATION_SCRIPT)
+            with track('redis'):
+                current = int(bump(keys=[key], args=[time.time_ns() // 1000, ttl, self.channel]))
+        except Exception:
+            raise APIException("connection error with redis server", status_code=500)
+
+        self.generations.set(identity, current)
+
+    def _mark_revoked(self, jti, ttl):
+        self.not_revoked.pop(jti)
+        self.revoked.set(jti, True, ttl=ttl)
+
+    def _ensure_listener(self):
+        #the listener thread is started lazily in each worker process (fork-safe)
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self.subscribed = False
+            self.not_revoked.clear()
+            thread = threading.Thread(target=self._listen, name="jwt-blocklist-listener", daemon=True)
+            thread.start()
+            self._listener_pid = pid
+
+    def _listen(self):
+        from app.extensions import redis_service
+
+        backoff = 0.5
+        while True:
+            client = pubsub = None
+            try:
+                #own connection, the subscription would hold one of the shared pool forever.
+                client = redis_service.dedicated_client(self._app)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.subscribed = True
+                backoff = 0.5
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message['type'] == 'message':
+                        data = message['data'].decode() if isinstance(message['data'], bytes) else message['data']
+                        key, _, value = data.partition(" ")
+                        if key.startswith(GENERATION_PREFIX):
+                            self.generations.set(key[len(GENERATION_PREFIX):], int(value))
+                        else:
+                            self._mark_revoked(key, int(value) if value.isdigit() else None)
+
+            except Exception as e:
+                #answers cached while unsubscribed could miss revocations, drop them.
+                self.subscribed = False
+                self.not_revoked.clear()
+                logger.warning("jwt blocklist listener disconnected: %s", e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+            finally:
+                for conn in (pubsub, client):
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except Exception:
+                            pass
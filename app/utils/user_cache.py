@@ -0,0 +1,156 @@
+import logging
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.utils.cache import LRUCache
+from app.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache():
+    '''
+    Read-through cache of serialized users, keyed by email (the jwt identity).
+
+    - first tier: LRU local to each worker process, short ttl.
+    - second tier (optional): redis, shared by every worker.
+    - rows of User changed in a session (insert, update, delete) are invalidated in
+    both tiers after the commit. The local tier of the other workers keeps the old
+    value at most USER_CACHE_LOCAL_TTL seconds.
+    - values are cached with the ('user', email) version stamp they were read under.
+    callers that answer with that stamp as ETag pass it, a value of another version is
+    read again from the db (a stale value never gets the new ETag).
+    - redis errors are logged and the value is read from the db.
+
+    config:
+    - USER_CACHE_ENABLED: default True.
+    - USER_CACHE_SIZE: max entries of the local tier.
+    - USER_CACHE_LOCAL_TTL: seconds in the local tier.
+    - USER_CACHE_REDIS: enables the redis tier.
+    - USER_CACHE_TTL: seconds in the redis tier.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_ENABLED', True)
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        app.config.setdefault('USER_CACHE_LOCAL_TTL', 10)
+        app.config.setdefault('USER_CACHE_REDIS', True)
+        app.config.setdefault('USER_CACHE_TTL', 300)
+
+        app.extensions['user_cache'] = _UserCacheState(app)
+        _listen_session_events()
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['user_cache']
+
+    def get(self, email, loader, version=None):
+        '''
+        returns the cached value of email, loader() is called on a miss and its result cached.
+        exceptions raised by loader are not cached. version: etag of the user stamp, cached
+        values of other versions are misses.
+        '''
+        state = self._state()
+        if not state.enabled:
+            return loader()
+
+        entry = state.local.get(email)
+        if entry is not None and (version is None or entry[0] == version):
+            return entry[1]
+
+        entry = state.redis_get(email)
+        if entry is None or (version is not None and entry[0] != version):
+            value = loader()
+            if value is None:
+                return None
+            entry = (version, value)
+            state.redis_set(email, entry)
+
+        state.local.set(email, entry)
+        return entry[1]
+
+    def invalidate(self, *emails):
+        self._state().invalidate(emails)
+
+
+class _UserCacheState():
+
+    def __init__(self, app):
+        self.enabled = app.config['USER_CACHE_ENABLED']
+        self.use_redis = app.config['USER_CACHE_REDIS']
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.local = LRUCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_LOCAL_TTL'])
+        self._app = app
+
+    def invalidate(self, emails):
+        for email in emails:
+            self.local.pop(email)
+        self.redis_delete(emails)
+
+    def _key(self, email):
+        return f"user-cache:{email}" #[version, user]
+
+    def redis_get(self, email):
+        if not self.use_redis:
+            return None
+        try:
+            with track('redis'):
+                data = self._app.extensions['redis'].client.get(self._key(email))
+        except Exception as e:
+            logger.warning("user cache, redis unreachable: %s", e)
+            return None
+        return self._app.json.loads(data) if data is not None else None
+
+    def redis_set(self, email, value):
+        if not self.use_redis:
+            return
+        try:
+            with track('redis'):
+                self._app.extensions['redis'].client.set(self._key(email), self._app.json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.warning("user cache, redis unreachable: %s", e)
+
+    def redis_delete(self, emails):
+        if not self.use_redis or not emails:
+            return
+        try:
+            with track('redis'):
+                self._app.extensions['redis'].client.delete(*[self._key(e) for e in emails])
+        except Exception as e:
+            #the redis tier expires in USER_CACHE_TTL seconds anyway.
+            logger.warning("user cache invalidation failed: %s", e)
+
+
+_session_events = []
+
+
+def _listen_session_events():
+    #global listeners, invalidation happens only once the changes are committed.
+    if _session_events:
+        return
+    _session_events.append(True)
+
+    from app.models.main import User
+
+    @event.listens_for(Session, 'after_flush')
+    def _collect_users(session, flush_context):
+        emails = session.info.setdefault('user_cache_invalidate', set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, User):
+                history = inspect(obj).attrs.email.history
+                emails.update(e for e in (*history.unchanged, *history.added, *history.deleted) if e)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidate_users(session):
+        emails = session.info.pop('user_cache_invalidate', None)
+        if emails and has_app_context() and 'user_cache' in current_app.extensions:
+            current_app.extensions['user_cache'].invalidate(emails)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_users(session):
+        session.info.pop('user_cache_invalidate', None)
@@ -1,6 +1,15 @@
 import re
 from app.utils.exceptions import APIException
 
+#Regular expression that checks a valid email
+EMAIL_RE = re.compile(r'^[\w]+[\._]?[\w]+[@]\w+[.]\w{2,3}$')
+#Regular expression that checks a secure password
+PASSWORD_RE = re.compile(r'^.*(?=.{8,})(?=.*\d)(?=.*[a-z])(?=.*[A-Z]).*$')
+#regular expression that checks only letters string
+LETTERS_RE = re.compile(r'^[a-zA-ZñáéíóúÑÁÉÍÓÚ]*$')
+#regular expression that check letters and spaces in a string
+LETTERS_SPACES_RE = re.compile(r'^[a-zA-Z ñáéíóúÑÁÉÍÓÚ]*$')
+
 def validate_email(email: str) -> dict:
     """Valida si una cadena de caracteres tiene un formato de correo electronico válido
     Args:
@@ -15,10 +24,7 @@ def validate_email(email: str) -> dict:
     if len(email) > 320:
         return {"error": True, "msg": "invalid email length, max is 320 chars"}
 
-    #Regular expression that checks a valid email
-    ereg = '^[\w]+[\._]?[\w]+[@]\w+[.]\w{2,3}$'
-
-    if not re.search(ereg, email):
+    if not EMAIL_RE.search(email):
         return {"error":True, "msg": f"invalid email format: <{email}>"}
     
     return {"error": False, "msg": "ok"}
@@ -35,9 +41,7 @@ def validate_pw(password: str) -> dict:
 
     if not isinstance(password, str):
         raise TypeError("Invalid argument format, str is expected")
-    #Regular expression that checks a secure password
-    preg = '^.*(?=.{8,})(?=.*\d)(?=.*[a-z])(?=.*[A-Z]).*$'
-    if not re.search(preg, password):
+    if not PASSWORD_RE.search(password):
         return {"error": True, "msg": "password is insecure"}
 
     return {"error": False, "msg": "ok"}
@@ -54,11 +58,7 @@ def only_letters(string:str, spaces:bool=False, max_length:int=64) -> dict:
     Returns:
         {'error':bool, 'msg':error message}
     """
-    
-    #regular expression that checks only letters string
-    sreg = '^[a-zA-ZñáéíóúÑÁÉÍÓÚ]*$'
-    #regular expression that check letters and spaces in a string
-    sregs = '^[a-zA-Z ñáéíóúÑÁÉÍÓÚ]*$'
+
     if not isinstance(string, str):
         raise TypeError("Invalid argument format, str is expected")
     if not isinstance(spaces, bool):
@@ -70,11 +70,11 @@ def only_letters(string:str, spaces:bool=False, max_length:int=64) -> dict:
         return {"error": True, "msg": "String is too long, {} length is allowed".format(max_length)}
     
     if spaces:
-        if not re.search(sregs, string):
+        if not LETTERS_SPACES_RE.search(string):
             # raise APIException("Only letter is valid in str, {} was passed".format(string))
             return {"error": True, "msg": f"String: <{string}> must include only letters"}
     else: 
-        if not re.search(sreg, string):
+        if not LETTERS_RE.search(string):
             # raise APIException("Only letter and no spaces is valid in str, {} was passed".format(string))
             return {"error": True, "msg": f"String: <{string}> must include only letters and no spaces"}
     return {"error": False, "msg": "ok"}
@@ -104,4 +104,108 @@ def validate_inputs(inputs:dict):
     if msg:
         raise APIException("invalid input in request", payload={'invalid': msg})
 
-    return None
\ No newline at end of file
+    return None
+
+class Field():
+    '''
+    Class
+    Regla declarativa para un campo del request. Los patrones se compilan una sola vez.
+
+    - type_: tipo esperado (o tupla de tipos).
+    - max_length: longitud maxima, None = sin limite.
+    - pattern: expresion regular (str o compilada) que debe cumplir el valor.
+    - length_msg, pattern_msg: mensajes de error, {value} y {max_length} son reemplazados.
+    '''
+    __slots__ = ('type_', 'max_length', 'pattern', 'length_msg', 'pattern_msg')
+
+    def __init__(self, type_=str, max_length=None, pattern=None, length_msg=None, pattern_msg=None):
+        self.type_ = type_
+        self.max_length = max_length
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.length_msg = length_msg or "String is too long, {max_length} length is allowed"
+        self.pattern_msg = pattern_msg or "invalid format: <{value}>"
+
+    def check(self, value):
+        '''returns the error message, or None if the value is valid.'''
+        if self.max_length is not None and len(value) > self.max_length:
+            return self.length_msg.format(value=value, max_length=self.max_length)
+        if self.pattern is not None and not self.pattern.search(value):
+            return self.pattern_msg.format(value=value, max_length=self.max_length)
+        return None
+
+
+def email_field() -> Field:
+    return Field(
+        str, max_length=320, pattern=EMAIL_RE,
+        length_msg="invalid email length, max is 320 chars",
+        pattern_msg="invalid email format: <{value}>"
+    )
+
+
+def password_field() -> Field:
+    return Field(str, pattern=PASSWORD_RE, pattern_msg="password is insecure")
+
+
+def letters_field(spaces:bool=False, max_length:int=64) -> Field:
+    if spaces:
+        return Field(str, max_length=max_length, pattern=LETTERS_SPACES_RE, pattern_msg="String: <{value}> must include only letters")
+    return Field(str, max_length=max_length, pattern=LETTERS_RE, pattern_msg="String: <{value}> must include only letters and no spaces")
+
+
+class Schema():
+    '''
+    Class
+    Esquema de validacion de un endpoint, compilado al importar el modulo.
+    Verifica presencia, tipo, longitud y formato de cada campo en una sola pasada.
+
+    - fields: dict {key: type | Field}
+    - query_params: el esquema se aplica a los parametros del url.
+
+    methods:
+
+    - validate(data) -> None, raise APIException con el mismo formato de json_required y validate_inputs.
+    - errors(data) -> None o (message, payload), para validar lotes de registros sin excepciones.
+    '''
+
+    def __init__(self, fields:dict, query_params:bool=False):
+        self.query_params = query_params
+        self._fields = tuple(
+            (k, v if isinstance(v, Field) else Field(v)) for k, v in fields.items()
+        )
+        self.param_types = {k: str(f.type_) for k, f in self._fields}
+
+    def validate(self, data):
+        errors = self.errors(data)
+        if errors is not None:
+            message, payload = errors
+            raise APIException(message, payload=payload)
+
+        return None
+
+    def errors(self, data):
+        missing = []
+        wrong_types = False
+        invalid = {}
+        for key, field in self._fields:
+            if key not in data:
+                missing.append(key)
+                continue
+            value = data[key]
+            if not isinstance(value, field.type_):
+                wrong_types = True
+                continue
+            if field.pattern is not None or field.max_length is not None:
+                msg = field.check(value)
+                if msg is not None:
+                    invalid[key] = msg
+
+        if missing:
+            return f"Missing arguments in {'url' if self.query_params is True else 'query params'}", {"missing": missing}
+
+        if wrong_types:
+            return "Data types in the request JSON doesn't match the required format", {"required": self.param_types}
+
+        if invalid:
+            return "invalid input in request", {'invalid': invalid}
+
+        return None
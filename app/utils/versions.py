@@ -0,0 +1,159 @@
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from flask import current_app, has_app_context, has_request_context, g
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.utils.metrics import track
+
+logger = logging.getLogger(__name__)
+
+
+class VersionStamps():
+    '''
+    Version stamps kept in redis, used as ETag and Last-Modified of the read endpoints.
+    A stamp changes after every commit that modifies the rows behind it, so a
+    conditional GET can be answered with a 304 before reading the db.
+
+    stamps:
+    - ('user', email): a User row.
+    - ('assets', None): any Asset row. asset paths include every ancestor, a global
+    stamp is the simplest one that stays correct on renames and moves.
+    - ('catalog', None): any Role or Plan row, checked by the catalog of each worker.
+
+    config:
+    - VERSION_STAMPS_ENABLED: default True.
+    - VERSION_STAMPS_TTL: seconds a stamp is kept in redis without changes.
+    '''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('VERSION_STAMPS_ENABLED', True)
+        app.config.setdefault('VERSION_STAMPS_TTL', 7 * 24 * 3600)
+
+        app.extensions['version_stamps'] = _StampsState(app)
+        _listen_session_events()
+
+    @staticmethod
+    def _state():
+        return current_app.extensions['version_stamps']
+
+    def get(self, kind, key=None):
+        '''
+        returns (etag, last_modified) of the stamp, created if missing.
+        None if the stamps are disabled or redis can't be reached.
+        '''
+        stamp = self._state().get(kind, key)
+        if stamp is not None and has_request_context():
+            g.setdefault('_version_stamps', {})[(kind, key)] = stamp[0]
+        return stamp
+
+    def checked(self, kind, key=None):
+        '''
+        etag of the stamp already read in this request (e.g. by conditional_get), None if it wasn't.
+        '''
+        stamps = g.get('_version_stamps') if has_request_context() else None
+        return stamps.get((kind, key)) if stamps else None
+
+    def bump(self, *stamps):
+        '''
+        stamps: (kind, key) tuples.
+        '''
+        self._state().bump(stamps)
+
+
+class _StampsState():
+
+    def __init__(self, app):
+        self.enabled = app.config['VERSION_STAMPS_ENABLED']
+        self.ttl = app.config['VERSION_STAMPS_TTL']
+        self._app = app
+
+    def _client(self):
+        return self._app.extensions['redis'].client
+
+    def get(self, kind, key):
+        if not self.enabled:
+            return None
+        name = _key(kind, key)
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            pipe.set(name, _new_value(), nx=True, ex=self.ttl)
+            pipe.get(name)
+            with track('redis'):
+                _, value = pipe.execute()
+        except Exception as e:
+            logger.warning("version stamps, redis unreachable: %s", e)
+            return None
+
+        token, _, modified = (value.decode() if isinstance(value, bytes) else value).partition(":")
+        return f"{kind}-{token}", datetime.fromtimestamp(int(modified), tz=timezone.utc)
+
+    def bump(self, stamps):
+        if not self.enabled or not stamps:
+            return
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            for kind, key in stamps:
+                pipe.set(_key(kind, key), _new_value(), ex=self.ttl)
+            with track('redis'):
+                pipe.execute()
+        except Exception as e:
+            logger.warning("version stamps not updated: %s", e)
+
+
+def _key(kind, key) -> str:
+    return f"ver:{kind}" if key is None else f"ver:{kind}:{key}"
+
+
+def _new_value() -> str:
+    return f"{uuid.uuid4().hex[:16]}:{int(time.time())}"
+
+
+_session_events = []
+
+
+def _listen_session_events():
+    #stamps change once the changes are committed.
+    if _session_events:
+        return
+    _session_events.append(True)
+
+    from app.models.main import User, Asset
+    from app.models.global_models import Role, Plan
+
+    @event.listens_for(Session, 'after_flush')
+    def _collect_stamps(session, flush_context):
+        stamps = session.info.setdefault('version_stamps', set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, User):
+                history = inspect(obj).attrs.email.history
+                stamps.update(('user', e) for e in (*history.unchanged, *history.added, *history.deleted) if e)
+            elif isinstance(obj, Asset):
+                stamps.add(('assets', None))
+            elif isinstance(obj, (Role, Plan)):
+                stamps.add(('catalog', None))
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _collect_statements(orm_execute_state):
+        #bulk statements, e.g. the asset import or the catalog seeding.
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            if orm_execute_state.bind_mapper is Asset.__mapper__: #statement.table is an annotated copy
+                orm_execute_state.session.info.setdefault('version_stamps', set()).add(('assets', None))
+            elif orm_execute_state.bind_mapper in (Role.__mapper__, Plan.__mapper__):
+                orm_execute_state.session.info.setdefault('version_stamps', set()).add(('catalog', None))
+
+    @event.listens_for(Session, 'after_commit')
+    def _bump_stamps(session):
+        stamps = session.info.pop('version_stamps', None)
+        if stamps and has_app_context() and 'version_stamps' in current_app.extensions:
+            current_app.extensions['version_stamps'].bump(stamps)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_stamps(session):
+        session.info.pop('version_stamps', None)
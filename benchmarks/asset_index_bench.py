@@ -0,0 +1,138 @@
+'''
+Asset hierarchy index on a synthetic tree: build time, memory and query latency.
+
+Generates --nodes assets with --width children per node (ids in bfs order, like the asset
+import), builds the index from the parent array and measures depth, path, "is X under Y"
+and subtree size on random assets, then incremental inserts and a move. --db also loads the
+tree through the app from a sqlite file (inserting 1M rows takes a while).
+
+    python benchmarks/asset_index_bench.py --nodes 1000000 --width 10
+    python benchmarks/asset_index_bench.py --nodes 200000 --db
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.utils.asset_index import _Hierarchy, ABSENT, ROOT
+
+
+def generate_parents(nodes, width) -> array:
+    #slot 0 is the virtual root, asset 1 the root of the tree
+    parent = array('i', [ABSENT]) * (nodes + 1)
+    parent[1] = ROOT
+    for i in range(2, nodes + 1):
+        parent[i] = (i - 2) // width + 1
+    return parent
+
+
+def timed(fn, ids) -> float:
+    start = time.perf_counter()
+    for i in ids:
+        fn(i)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+def bench_queries(h, nodes, samples):
+    ids = [random.randint(1, nodes) for _ in range(samples)]
+    pairs = [(random.randint(1, nodes), random.randint(1, nodes // 100 or 1)) for _ in range(samples)]
+    results = {
+        'depth': timed(h.get_depth, ids),
+        'path': timed(lambda i: [i, *h.ancestors(i)], ids),
+        'is_under': timed(lambda p: h.is_under(*p), pairs),
+        'subtree_size': timed(lambda i: h.size[i], ids)
+    }
+    for name, us in results.items():
+        print(f"  {name:<14} {us:8.2f} us/query")
+
+
+def bench_db(nodes, width):
+    from app import create_app
+    from app.extensions import db
+    from app.models.main import Asset
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp.name}",
+        'JWT_SECRET_KEY': 'bench-jwt-secret-key-0123456789abcdef',
+        'VERSION_STAMPS_ENABLED': False,
+        'ASSET_INDEX_MAX_NODES': nodes + 1
+    })
+    try:
+        with app.app_context():
+            db.create_all()
+            parent = generate_parents(nodes, width)
+            rows = [{'id': i, 'name': f"asset {i}", 'parent_id': parent[i] or None} for i in range(1, nodes + 1)]
+            for i in range(0, len(rows), 50000):
+                db.session.execute(db.insert(Asset), rows[i:i + 50000])
+            db.session.commit()
+
+            start = time.perf_counter()
+            app.extensions['asset_index'].reload()
+            print(f"load from the db: {time.perf_counter() - start:.2f}s {app.extensions['asset_index'].stats()}")
+            db.drop_all()
+    finally:
+        os.unlink(tmp.name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=1000000)
+    parser.add_argument('--width', type=int, default=10, help="children per node")
+    parser.add_argument('--samples', type=int, default=100000)
+    parser.add_argument('--db', action='store_true', help="also load the tree from a sqlite db through the app")
+    args = parser.parse_args()
+    random.seed(1)
+
+    parent = generate_parents(args.nodes, args.width)
+    start = time.perf_counter()
+    h = _Hierarchy(parent, args.nodes)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start() #second build, tracemalloc slows it down
+    _Hierarchy(array('i', parent), args.nodes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{args.nodes:,} assets, width {args.width}, max depth {max(h.depth)}")
+    print(f"build: {elapsed:.2f}s, arrays {h.nbytes() / 2**20:.1f} MiB ({h.nbytes() / args.nodes:.1f} B/asset), peak during build {peak / 2**20:.1f} MiB")
+    print("queries, fresh intervals:")
+    bench_queries(h, args.nodes, args.samples)
+
+    #incremental inserts, as applied after a commit
+    start = time.perf_counter()
+    n = 10000
+    h.grow(args.nodes + n + 1)
+    for i in range(args.nodes + 1, args.nodes + n + 1):
+        p = random.randint(1, args.nodes)
+        h.parent[i] = p
+        h.depth[i] = h.depth[p] + 1
+        h.add_size(i, 1)
+    print(f"inserts: {(time.perf_counter() - start) / n * 1e6:.2f} us/asset")
+
+    #move of a subtree: parent and sizes updated, intervals stale until the rebuild
+    node = random.randint(2, args.nodes // 100)
+    target = random.randint(2, args.nodes)
+    while target == node or h.is_under(target, node): #no cycles
+        target = random.randint(2, args.nodes)
+    h.add_size(node, -h.size[node])
+    h.parent[node] = target
+    h.add_size(node, h.size[node])
+    h.stale = True
+    print("queries, stale intervals (walks the parents):")
+    bench_queries(h, args.nodes, args.samples)
+    start = time.perf_counter()
+    _Hierarchy(array('i', h.parent), args.nodes + n)
+    print(f"rebuild of the intervals: {time.perf_counter() - start:.2f}s")
+
+    if args.db:
+        bench_db(args.nodes, args.width)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+CPU cost against bytes saved of each response encoding, on representative payloads.
+
+Payloads are built with the app's json provider: a deep asset path, a page of the
+asset subtree and a page of the users list. br and zstd are measured if installed.
+
+    python benchmarks/compression_bench.py --repeat 50
+'''
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import create_app
+from app.utils.compression import COMPRESSORS, compress
+
+LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 6, 11), 'zstd': (1, 3, 9, 19)}
+
+
+def asset_path(depth=60):
+    path = 'root'
+    for i in range(depth):
+        path = {'id': i + 1, 'name': f"level {i}", 'description': f"asset of the level {i} of the plant", 'parent': path}
+    return {'result': 'success', 'message': 'path to root', 'data': path}
+
+
+def subtree_page(nodes=5000):
+    return {'result': 'success', 'message': 'asset subtree', 'data': {'asset_id': 1, 'max_depth': None, 'nodes': [
+        {'id': i + 2, 'name': f"asset {i}", 'description': None if i % 3 else f"pump {i} of line {i // 50}",
+        'parent_id': i // 10 + 1, 'depth': len(str(i))} for i in range(nodes)
+    ], 'next_cursor': None}}
+
+
+def users_page(users=100):
+    return {'result': 'success', 'message': 'users', 'data': {'users': [
+        {'id': i + 1, 'fname': 'Luis', 'lname': 'Lucena', 'image': 'https://server.com/default.png',
+        'registration_date': datetime(2022, 1, 1 + i % 28), 'home_address': {'city': 'Caracas'},
+        'phone': f"+58 412 {i:07d}", 'user_status': 'active', 'email': f"user{i}@email.com"} for i in range(users)
+    ], 'next_cursor': 'eyJhZnRlciI6MTAwLCJmaWx0ZXJzIjp7fX0.abcdef'}}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'JWT_SECRET_KEY': 'bench-jwt-secret-key-0123456789abcdef'})
+    payloads = {
+        'asset path (60 levels)': asset_path(),
+        'subtree page (5000 nodes)': subtree_page(),
+        'users page (100)': users_page()
+    }
+
+    with app.app_context():
+        for name, payload in payloads.items():
+            data = app.json.dumps(payload).encode()
+            print(f"\n{name}: {len(data):,} bytes")
+            for encoding in COMPRESSORS:
+                for level in LEVELS[encoding]:
+                    start = time.perf_counter()
+                    for _ in range(args.repeat):
+                        out = compress(encoding, level, data)
+                    elapsed = (time.perf_counter() - start) / args.repeat
+                    print(f"  {encoding:<5} {level:>2}  {len(out):>9,} bytes ({len(out) / len(data):6.1%})"
+                          f"  {elapsed * 1000:8.2f} ms  {len(data) / elapsed / 1e6:8.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+'''
+Serialization cost of the JSON provider backends over realistic payloads:
+a page of User.serialize() results, a deep get-asset-path payload and a flat subtree page.
+
+    python benchmarks/json_bench.py --number 200
+'''
+import os
+import sys
+import timeit
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import create_app
+from app.models.main import User
+
+
+def payloads():
+    users = [
+        User(
+            id=i, fname="Luis", lname="Lucena", email=f"user{i}@email.com",
+            registration_date=datetime(2021, 5, 1, 12, 30), phone="+58 414 0000000",
+            home_address={"city": "Caracas", "street": "Av. Principal", "zip": "1010"}, status="active"
+        ).serialize() for i in range(100)
+    ]
+
+    path = 'root'
+    for i in range(8):
+        path = {"id": i, "name": f"level {i}", "description": "equipo de refrigeracion " * 3, "parent": path}
+
+    nodes = [
+        {"id": i, "name": f"asset {i}", "description": None, "parent_id": i // 10, "depth": 3}
+        for i in range(5000)
+    ]
+    return {
+        "users x100": {"result": "success", "message": "users", "data": {"users": users}},
+        "asset path (depth 8)": {"result": "success", "message": "path to root", "data": path},
+        "subtree page (5000)": {"result": "success", "message": "asset subtree", "data": {"nodes": nodes}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    variants = [
+        ("stdlib pretty", {'JSON_ENCODER_BACKEND': 'stdlib', 'JSON_COMPACT': False}),
+        ("stdlib compact", {'JSON_ENCODER_BACKEND': 'stdlib', 'JSON_COMPACT': True}),
+        ("orjson compact http-date", {'JSON_ENCODER_BACKEND': 'orjson', 'JSON_COMPACT': True}),
+        ("orjson compact iso", {'JSON_ENCODER_BACKEND': 'orjson', 'JSON_COMPACT': True, 'JSON_DATETIME_FORMAT': 'iso'}),
+    ]
+
+    data = payloads()
+    for name, payload in data.items():
+        print(name)
+        for label, config in variants:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', **config})
+            with app.app_context():
+                t = min(timeit.repeat(lambda: app.json.response(payload), number=args.number, repeat=3))
+                size = len(app.json.response(payload).get_data())
+            print(f"    {label:<26} {t / args.number * 1e6:>10.1f} us   {size:>8} bytes")
+
+
+if __name__ == '__main__':
+    main()
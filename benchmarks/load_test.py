@@ -0,0 +1,310 @@
+'''
+Load test of the API flows, against a real http server started in this process.
+
+Each virtual user runs sign-up -> get-verification-code -> check-verification-code ->
+confirm-user-email -> login -> profile -> logout, then --path-requests GET get-asset-path
+on the leaves of a generated tree of --tree-depth levels. Reports throughput, p50/p95/p99
+latency and db queries per endpoint, saved as json with --output.
+
+Local stand-ins: a sqlite file (or --db), fakeredis (or --redis real, REDIS_HOST / REDIS_PORT)
+and a stub of the smtp api, the emails go through the email queue and a worker thread.
+
+    pip install fakeredis lupa
+    python benchmarks/load_test.py --users 200 --concurrency 16 --output base.json
+    python benchmarks/load_test.py --users 200 --concurrency 16 --compare base.json
+'''
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PASSWORD = "Bench-Password-123"
+
+
+class SmtpStub(BaseHTTPRequestHandler):
+    #answers like the smtp api, counts the emails received.
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with SmtpStub.lock:
+            SmtpStub.received += 1
+        self._answer(201, b'{"messageId": "<stub@bench>"}')
+
+    def do_HEAD(self):
+        self._answer(200, b"")
+
+    def _answer(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class Recorder():
+    '''
+    client side latencies per endpoint, db queries counted on the server by request.endpoint.
+    '''
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def request(self, session, label, method, url, expected=200, **kwargs):
+        start = time.perf_counter()
+        resp = session.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[label].append(elapsed)
+            if resp.status_code != expected:
+                self.errors[label] += 1
+        if resp.status_code != expected:
+            raise RuntimeError(f"{label}: {resp.status_code} {resp.text[:200]}")
+        return resp.json()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        from flask import request, has_request_context
+        if has_request_context():
+            with self.lock:
+                self.queries[request.endpoint] += 1
+
+
+def percentile(values, p) -> float:
+    #nearest-rank, values sorted
+    if not values:
+        return 0.0
+    return values[max(int(round(p / 100 * len(values))) - 1, 0)]
+
+
+def claims(token) -> dict:
+    #payload of a jwt, not verified: the verification code travels in the token claims and in the email.
+    payload = token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+
+def user_flow(base, recorder, n, leaves, path_requests):
+    s = requests.Session()
+    email = f"bench{n}_{random.randrange(10**9)}@example.com"
+    api = f"{base}/api/v1"
+
+    recorder.request(s, 'auth_bp.signup', 'POST', f"{api}/auth/sign-up", expected=201,
+        json={"email": email, "password": PASSWORD, "fname": "Bench", "lname": "User"})
+    token = recorder.request(s, 'auth_bp.get_verification_code', 'GET', f"{api}/auth/get-verification-code",
+        params={"email": email}, json={})['data']['verification_token']
+    verified = recorder.request(s, 'auth_bp.check_verification_code', 'PUT', f"{api}/auth/check-verification-code",
+        headers={"Authorization": f"Bearer {token}"}, json={"verification_code": claims(token)['verification_code']}
+    )['data']['user_verified_token']
+    recorder.request(s, 'auth_bp.confirm_user_email', 'GET', f"{api}/auth/confirm-user-email",
+        headers={"Authorization": f"Bearer {verified}"}, json={})
+    access = recorder.request(s, 'auth_bp.login', 'POST', f"{api}/auth/login",
+        json={"email": email, "password": PASSWORD})['data']['access_token']
+    auth = {"Authorization": f"Bearer {access}"}
+    recorder.request(s, 'profile_bp.get_profile', 'GET', f"{api}/profile/", headers=auth, json={})
+
+    for _ in range(path_requests):
+        recorder.request(s, 'manage_bp.get_asset_path', 'GET', f"{api}/manage/get-asset-path/{random.choice(leaves)}", json={})
+
+    recorder.request(s, 'auth_bp.logout', 'DELETE', f"{api}/auth/logout", headers=auth, json={})
+
+
+def build_tree(depth, width) -> list:
+    '''
+    a chain of depth levels with width leaves on each level, returns the ids of the deepest leaves.
+    '''
+    from app.extensions import db
+    from app.models.assets_models import Asset
+    from app.utils.asset_import import AssetImport, read_rows
+
+    out = io.StringIO()
+    out.write("key,parent_key,name\n")
+    for level in range(depth):
+        parent = f"c{level - 1}" if level else ""
+        out.write(f"c{level},{parent},level {level}\n")
+        for leaf in range(width):
+            out.write(f"l{level}-{leaf},{parent},leaf {level}-{leaf}\n")
+    out.seek(0)
+    AssetImport().run(read_rows(out, 'csv'))
+    deepest = db.session.scalars(db.select(Asset.id).where(Asset.name.like(f"leaf {depth - 1}-%"))).all()
+    return deepest or [db.session.scalar(db.select(Asset.id).where(Asset.name == f"level {depth - 1}"))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(recorder, elapsed, users, failed_flows) -> dict:
+    endpoints = {}
+    for label, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": recorder.errors[label],
+            "throughput": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "queries_per_request": round(recorder.queries[label] / len(values), 2)
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {
+        "duration_s": round(elapsed, 3),
+        "flows": users,
+        "failed_flows": failed_flows,
+        "requests": total,
+        "throughput": round(total / elapsed, 2),
+        "endpoints": endpoints
+    }
+
+
+def compare(results, baseline):
+    print(f"\n{'endpoint':<36}{'p95 ms':>10}{'base':>10}{'change':>9}")
+    for label, item in results['endpoints'].items():
+        base = baseline['endpoints'].get(label)
+        if base is None or not base['p95_ms']:
+            continue
+        change = (item['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100
+        print(f"{label:<36}{item['p95_ms']:>10.2f}{base['p95_ms']:>10.2f}{change:>+8.1f}%")
+    change = (results['throughput'] - baseline['throughput']) / baseline['throughput'] * 100
+    print(f"throughput {results['throughput']:.1f} req/s, base {baseline['throughput']:.1f} req/s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100, help="sign-up flows to run")
+    parser.add_argument('--concurrency', type=int, default=8, help="flows running at the same time")
+    parser.add_argument('--path-requests', type=int, default=10, help="asset path requests per flow")
+    parser.add_argument('--tree-depth', type=int, default=40)
+    parser.add_argument('--tree-width', type=int, default=5, help="leaves per level")
+    parser.add_argument('--db', default=None, help="database url, defaults to a temporary sqlite file")
+    parser.add_argument('--redis', choices=('fake', 'real'), default='fake')
+    parser.add_argument('--hash-method', default='scrypt:32768:8:1', help="PASSWORD_HASH_METHOD")
+    parser.add_argument('--output', default=None, help="json file with the results")
+    parser.add_argument('--compare', default=None, help="json results of a previous run")
+    args = parser.parse_args()
+
+    smtp = ThreadingHTTPServer(('127.0.0.1', 0), SmtpStub)
+    smtp_url = serve(smtp)
+    #read when the email service is imported
+    os.environ.update({'SMTP_API_URL': smtp_url, 'SMTP_API_KEY': 'bench', 'MAIL_MODE': 'production'})
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING) #request log lines
+    from werkzeug.serving import make_server
+    from sqlalchemy import event
+    from app import create_app
+    from app.extensions import db
+    from app.utils.email_queue import EmailWorker
+
+    tmp = None
+    if args.db is None:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        args.db = f"sqlite:///{tmp.name}"
+
+    config = {
+        'SQLALCHEMY_DATABASE_URI': args.db,
+        'JWT_SECRET_KEY': 'bench-jwt-secret-key-0123456789abcdef',
+        'PASSWORD_HASH_METHOD': args.hash_method,
+        'RATE_LIMITS': {}, #every flow comes from the same ip
+        'HEALTH_SMTP_URL': smtp_url,
+        'EMAIL_RETRY_BACKOFF': 0.1
+    }
+    if args.redis == 'fake':
+        import fakeredis
+        config.update({
+            'REDIS_CONNECTION_CLASS': fakeredis.FakeConnection,
+            'REDIS_CONNECTION_OPTIONS': {'server': fakeredis.FakeServer()}
+        })
+    app = create_app(config)
+    recorder = Recorder()
+
+    with app.app_context():
+        db.create_all()
+        leaves = build_tree(args.tree_depth, args.tree_width)
+        event.listen(db.engine, 'before_cursor_execute', recorder.count_query)
+
+    worker = EmailWorker(app, worker_id='bench')
+    threading.Thread(target=worker.run, daemon=True).start()
+    http = make_server('127.0.0.1', 0, app, threaded=True)
+    base = serve(http)
+
+    failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(user_flow, base, recorder, n, leaves, args.path_requests) for n in range(args.users)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print("flow failed:", e)
+    elapsed = time.perf_counter() - start
+
+    deadline = time.monotonic() + 10 #emails still in the queue
+    while SmtpStub.received < args.users - failed and time.monotonic() < deadline:
+        time.sleep(0.05)
+    worker.stop()
+    http.shutdown()
+    smtp.shutdown()
+
+    results = {
+        "commit": git_commit(),
+        "date": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        "emails_delivered": SmtpStub.received,
+        **report(recorder, elapsed, args.users, failed)
+    }
+
+    print(f"{'endpoint':<36}{'reqs':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+    for label, item in results['endpoints'].items():
+        print(f"{label:<36}{item['requests']:>7}{item['errors']:>5}{item['throughput']:>9.1f}"
+              f"{item['p50_ms']:>9.2f}{item['p95_ms']:>9.2f}{item['p99_ms']:>9.2f}{item['queries_per_request']:>9.2f}")
+    print(f"{results['requests']} requests in {elapsed:.2f}s ({results['throughput']:.1f} req/s), "
+          f"{failed} failed flows, {results['emails_delivered']} emails delivered")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    if tmp is not None:
+        os.unlink(tmp.name)
+
+
+if __name__ == '__main__':
+    main()
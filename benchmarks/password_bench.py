@@ -0,0 +1,73 @@
+'''
+Password hashing throughput and simulated login latency at different cost settings.
+
+For each method: hashes/second through the PasswordHasher pool, and p50/p99 latency of
+--logins concurrent verifications coming from --threads request threads.
+
+    python benchmarks/password_bench.py --workers 4 --threads 16 --logins 200
+'''
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import create_app
+from app.extensions import password_hasher
+
+METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(int(len(values) * p) - 1, 0)]
+
+
+def bench(method, args):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'PASSWORD_HASH_METHOD': method,
+        'PASSWORD_HASH_EXECUTOR': args.executor,
+        'PASSWORD_HASH_WORKERS': args.workers,
+        'PASSWORD_HASH_MAX_PENDING': args.threads,
+        'PASSWORD_HASH_TIMEOUT': 60
+    })
+
+    def login(pwhash):
+        with app.app_context():
+            start = time.perf_counter()
+            password_hasher.verify(pwhash, "1478520.Lu")
+            return time.perf_counter() - start
+
+    with app.app_context():
+        pwhash = password_hasher.hash("1478520.Lu")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as request_threads:
+        latencies = list(request_threads.map(login, [pwhash] * args.logins))
+    elapsed = time.perf_counter() - start
+
+    print(f"{method:<24} {args.logins / elapsed:>8.1f} hashes/s   login p50 {percentile(latencies, 0.5) * 1000:>8.1f} ms   p99 {percentile(latencies, 0.99) * 1000:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--threads', type=int, default=16, help="concurrent request threads")
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--method', action='append', help="hash method(s) to test, defaults to a preset list")
+    args = parser.parse_args()
+
+    for method in args.method or METHODS:
+        bench(method, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Micro-benchmark: per-call redis client vs the app's shared pooled client.
+
+Simulates the blocklist lookup done by every authenticated request (GET <jti>),
+from several threads, against a running redis server:
+
+    REDIS_HOST=localhost python benchmarks/redis_pool_bench.py --requests 5000 --threads 8
+'''
+import os
+import sys
+import time
+import uuid
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.utils.redis_pool import InstrumentedConnectionPool
+
+
+def per_call_client():
+    #same behavior as the old redis_client(), a new client (and socket) on every call.
+    return redis.Redis(
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=os.environ.get('REDIS_PORT', '6379'),
+        password=os.environ.get('REDIS_PASSWORD', None)
+    )
+
+
+def run(label, get_client, n_requests, n_threads):
+    latencies = []
+
+    def one_check(_):
+        start = time.perf_counter()
+        get_client().get(str(uuid.uuid4()))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(executor.map(one_check, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<10} {n_requests / elapsed:>10.0f} req/s   p50 {statistics.median(latencies) * 1000:.3f} ms   p99 {p99 * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=20)
+    args = parser.parse_args()
+
+    pool = InstrumentedConnectionPool(
+        max_connections=args.pool_size,
+        timeout=2,
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=int(os.environ.get('REDIS_PORT', 6379)),
+        password=os.environ.get('REDIS_PASSWORD', None)
+    )
+    pooled = redis.Redis(connection_pool=pool)
+
+    run("per-call", per_call_client, args.requests, args.threads)
+    run("pooled", lambda: pooled, args.requests, args.threads)
+    print("pool stats:", pool.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+Per-request validation cost of the sign-up body, before and after the compiled schemas.
+
+"before" reproduces the previous flow: json_required scanned the body for missing keys
+and wrong types, then the endpoint ran validate_email/validate_pw/only_letters with
+string patterns and collected the results in validate_inputs.
+
+    python benchmarks/validation_bench.py --number 100000
+'''
+import os
+import re
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.utils import validations as val
+
+BODY = {"email": "valid.user@email.com", "password": "1478520.Lu", "fname": "Luis Alejandro", "lname": "Lucena"}
+REQUIRED = {"email": str, "password": str, "fname": str, "lname": str}
+
+
+def legacy_email(email):
+    if len(email) > 320:
+        return {"error": True, "msg": "invalid email length, max is 320 chars"}
+    if not re.search(r'^[\w]+[\._]?[\w]+[@]\w+[.]\w{2,3}$', email):
+        return {"error": True, "msg": f"invalid email format: <{email}>"}
+    return {"error": False, "msg": "ok"}
+
+
+def legacy_pw(password):
+    if not re.search(r'^.*(?=.{8,})(?=.*\d)(?=.*[a-z])(?=.*[A-Z]).*$', password):
+        return {"error": True, "msg": "password is insecure"}
+    return {"error": False, "msg": "ok"}
+
+
+def legacy_letters(string, max_length=64):
+    if len(string) > max_length:
+        return {"error": True, "msg": "String is too long, {} length is allowed".format(max_length)}
+    if not re.search(r'^[a-zA-Z ñáéíóúÑÁÉÍÓÚ]*$', string):
+        return {"error": True, "msg": f"String: <{string}> must include only letters"}
+    return {"error": False, "msg": "ok"}
+
+
+def before(body):
+    missing = [r for r in REQUIRED.keys() if r not in body]
+    wrong_types = [r for r in REQUIRED.keys() if not isinstance(body[r], REQUIRED[r])]
+    if missing or wrong_types:
+        raise ValueError()
+    inputs = {
+        'email': legacy_email(body['email'].lower()),
+        'password': legacy_pw(body['password']),
+        'fname': legacy_letters(body['fname']),
+        'lname': legacy_letters(body['lname'])
+    }
+    msg = {r: inputs[r]['msg'] for r in inputs if inputs[r]['error']}
+    if msg:
+        raise ValueError(msg)
+
+
+SCHEMA = val.Schema({
+    "email": val.email_field(),
+    "password": val.password_field(),
+    "fname": val.letters_field(spaces=True),
+    "lname": val.letters_field(spaces=True)
+})
+
+
+def after(body):
+    SCHEMA.validate(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    for label, fn in (("before", before), ("after", after)):
+        t = min(timeit.repeat(lambda: fn(BODY), number=args.number, repeat=5))
+        print(f"{label:<8} {t / args.number * 1e6:.2f} us/request")
+
+
+if __name__ == '__main__':
+    main()
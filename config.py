@@ -12,10 +12,87 @@ class Config(object):
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(days=1)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    #read replicas, comma separated urls. reads of read-only handlers are balanced between them
+    SQLALCHEMY_REPLICA_URIS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    DB_READ_YOUR_WRITES_WINDOW = float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', 5))
+    DB_REPLICA_RETRY_AFTER = float(os.environ.get('DB_REPLICA_RETRY_AFTER', 30))
+    #json responses
+    JSON_ENCODER_BACKEND = os.environ.get('JSON_ENCODER_BACKEND', 'orjson')
+    JSON_DATETIME_FORMAT = os.environ.get('JSON_DATETIME_FORMAT', 'http')
+    JSON_COMPACT = True
+    ASSET_SUBTREE_PAGE_SIZE = 5000
+    ASSET_SUBTREE_MAX_PAGE_SIZE = 20000
+    LIST_PAGE_SIZE = 100
+    LIST_MAX_PAGE_SIZE = 1000
+    ASSET_IMPORT_CHUNK_SIZE = int(os.environ.get('ASSET_IMPORT_CHUNK_SIZE', 5000))
+    #imports inside the request, larger files with `flask import-assets`
+    ASSET_IMPORT_MAX_BYTES = int(os.environ.get('ASSET_IMPORT_MAX_BYTES', 5 * 2**20))
+    ASSET_IMPORT_MAX_ROWS = int(os.environ.get('ASSET_IMPORT_MAX_ROWS', 50000))
+    #users hashed inside the request (a few seconds of scrypt), larger files with `flask provision-users`
+    PROVISION_MAX_USERS = int(os.environ.get('PROVISION_MAX_USERS', 200))
+    #css / js bundles: 'runtime' (compiled by flask_assets on demand) or 'manifest' (`flask build-assets`)
+    ASSETS_MODE = os.environ.get('ASSETS_MODE', 'runtime')
+    CATALOG_PRELOAD = True
+    ASSET_INDEX_MAX_NODES = int(os.environ.get('ASSET_INDEX_MAX_NODES', 2000000)) #~20 bytes per asset id, per worker
+    #redis
+    REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
+    REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+    REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD') or None
+    REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get('REDIS_POOL_MAX_CONNECTIONS', 20))
+    REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 2.0))
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 1.0))
+    REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', 1.0))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    #smtp api, read when the first email is sent
+    SMTP_API_URL = os.environ.get('SMTP_API_URL')
+    SMTP_API_KEY = os.environ.get('SMTP_API_KEY')
+    MAIL_MODE = os.environ.get('MAIL_MODE', 'production')
+    #email queue
+    EMAIL_QUEUE_BACKEND = os.environ.get('EMAIL_QUEUE_BACKEND', 'redis')
+    EMAIL_MAX_RETRIES = int(os.environ.get('EMAIL_MAX_RETRIES', 5))
+    EMAIL_RETRY_BACKOFF = float(os.environ.get('EMAIL_RETRY_BACKOFF', 2.0))
+    EMAIL_WORKER_CONCURRENCY = int(os.environ.get('EMAIL_WORKER_CONCURRENCY', 4))
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 500))
+    #password hashing
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    #rate limits of public endpoints, "count/seconds"
+    RATE_LIMITS = {
+        'auth_bp.signup': {'ip': '10/60'},
+        'auth_bp.login': {'ip': '30/60', 'email': '10/300'},
+        'auth_bp.get_verification_code': {'ip': '10/60', 'email': '3/300'}
+    }
+    RATE_LIMIT_BACKEND = 'redis'
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    #health snapshot of /api/v1/status
+    HEALTH_REFRESH_INTERVAL = float(os.environ.get('HEALTH_REFRESH_INTERVAL', 5.0))
+    HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', 2.0))
+    HEALTH_SMTP_URL = os.environ.get('SMTP_API_URL')
+    #response compression
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVELS = {
+        'gzip': int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)),
+        'br': int(os.environ.get('COMPRESS_BR_LEVEL', 4)),
+        'zstd': int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+    }
+    #user cache, keyed by jwt identity
+    USER_CACHE_LOCAL_TTL = int(os.environ.get('USER_CACHE_LOCAL_TTL', 10))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') #bearer token of the prometheus scrapers
+    #jwt blocklist local cache
+    JWT_BLOCKLIST_LOCAL_CACHE = True
+    JWT_BLOCKLIST_NEGATIVE_TTL = int(os.environ.get('JWT_BLOCKLIST_NEGATIVE_TTL', 60))
+    JWT_BLOCKLIST_FAIL_OPEN = os.environ.get('JWT_BLOCKLIST_FAIL_OPEN', 'false').lower() == 'true'
 
 
 class ProductionConfig(Config):
     DEBUG = False
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 1))
+    #fast cold start: bundles built at deploy time, no db round-trip in create_app
+    ASSETS_MODE = os.environ.get('ASSETS_MODE', 'manifest')
+    CATALOG_PRELOAD = False
 
 
 class StagingConfig(Config):
@@ -26,7 +103,13 @@ class StagingConfig(Config):
 class DevelopmentConfig(Config):
     DEVELOPMENT = True
     DEBUG = True
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:100000')
 
 
 class TestingConfig(Config):
-    TESTING = True
\ No newline at end of file
+    TESTING = True
+    EMAIL_QUEUE_BACKEND = 'memory'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    RATE_LIMIT_BACKEND = 'memory'
+    USER_CACHE_REDIS = False
+    DB_ROUTING_BACKEND = 'memory'
\ No newline at end of file
@@ -0,0 +1,321 @@
+import io
+import json
+from flask_jwt_extended import create_access_token
+from app.extensions import db, asset_index
+from app.models.main import Asset
+from app.utils.asset_import import AssetImport, read_rows
+from fixtures import DB_tests
+
+
+def make_tree(width, depth):
+    root = Asset(name="root")
+    level = [root]
+    for d in range(depth):
+        level = [Asset(name=f"{d}-{i}", parent=p) for p in level for i in range(width)]
+    db.session.add(root)
+    db.session.commit()
+    return root
+
+
+def make_chain(depth):
+    parent = None
+    for i in range(depth):
+        asset = Asset(name=f"level {i}", parent=parent)
+        db.session.add(asset)
+        parent = asset
+    db.session.commit()
+    return parent
+
+
+class Asset_path_tests(DB_tests):
+
+    def path_queries(self, asset_id):
+        db.session.expire_all()
+        self.queries.clear()
+        path = Asset.get_path(asset_id)
+        return path, len(self.queries)
+
+    def test1_nested_payload(self):
+        leaf = make_chain(3)
+        path, _ = self.path_queries(leaf.id)
+        self.assertEqual(path['name'], 'level 2')
+        self.assertEqual(path['parent']['name'], 'level 1')
+        self.assertEqual(path['parent']['parent']['name'], 'level 0')
+        self.assertEqual(path['parent']['parent']['parent'], 'root')
+
+    def test2_constant_query_count(self):
+        shallow = make_chain(2)
+        deep = make_chain(40)
+        _, shallow_queries = self.path_queries(shallow.id)
+        _, deep_queries = self.path_queries(deep.id)
+        self.assertEqual(shallow_queries, 1)
+        self.assertEqual(deep_queries, shallow_queries)
+
+    def test3_not_found(self):
+        self.assertIsNone(Asset.get_path(999))
+        resp = self.app.test_client().get('/api/v1/manage/get-asset-path/999', json={})
+        self.assertEqual(resp.status_code, 400)
+
+    def test4_endpoint(self):
+        leaf = make_chain(5)
+        resp = self.app.test_client().get(f'/api/v1/manage/get-asset-path/{leaf.id}', json={})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['data']['name'], 'level 4')
+
+
+class Asset_subtree_tests(DB_tests):
+
+    def get_subtree(self, asset_id, **params):
+        self.queries.clear()
+        resp = self.app.test_client().get(f'/api/v1/manage/get-asset-subtree/{asset_id}', json={}, query_string=params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()['data']
+
+    def test1_bfs_order(self):
+        root = make_tree(width=2, depth=3)
+        data = self.get_subtree(root.id)
+        self.assertEqual(len(data['nodes']), 2 + 4 + 8)
+        self.assertEqual([n['depth'] for n in data['nodes']], sorted(n['depth'] for n in data['nodes']))
+        self.assertIsNone(data['next_cursor'])
+
+    def test2_constant_query_count(self):
+        root = make_tree(width=3, depth=4)
+        self.get_subtree(root.id)
+        self.assertEqual(len(self.queries), 2)
+
+    def test3_max_depth(self):
+        root = make_tree(width=2, depth=3)
+        data = self.get_subtree(root.id, max_depth=2)
+        self.assertEqual(len(data['nodes']), 2 + 4)
+
+    def test4_cursor_pagination(self):
+        root = make_tree(width=3, depth=3)
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 10}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.get_subtree(root.id, **params)
+            ids += [n['id'] for n in data['nodes']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(ids), 3 + 9 + 27)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test5_invalid_cursor(self):
+        root = make_tree(width=1, depth=1)
+        resp = self.app.test_client().get(f'/api/v1/manage/get-asset-subtree/{root.id}', json={}, query_string={'cursor': 'x'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test6_pages_match_full_walk(self):
+        root = make_tree(width=2, depth=3)
+        parent = root.children[0]
+        for i in range(6): #a deeper branch, levels of different sizes
+            parent = Asset(name=f"chain {i}", parent=parent)
+            db.session.add(parent)
+        db.session.commit()
+        full = [(row.depth, row.id) for row in db.session.execute(Asset.subtree_query(root.id))]
+        self.assertEqual(len(full), 2 + 4 + 8 + 6)
+        for limit in (1, 3, 7, 100):
+            rows, after = [], None
+            while True:
+                page = [(row.depth, row.id) for row in db.session.execute(
+                    Asset.subtree_query(root.id, after=after, limit=limit)
+                )]
+                rows += page
+                if len(page) < limit:
+                    break
+                after = page[-1]
+            self.assertEqual(rows, full)
+
+
+class Asset_import_tests(DB_tests):
+
+    def import_csv(self, text, **kwargs):
+        self.queries.clear()
+        return AssetImport(**kwargs).run(read_rows(io.StringIO(text), 'csv'))
+
+    def test1_tree_by_levels(self):
+        report = self.import_csv(
+            "key,parent_key,name,description\n"
+            "c,b,leaf,\n"
+            "a,,plant,main plant\n"
+            "b,a,line 1,\n"
+            "d,a,line 2,\n"
+        )
+        self.assertEqual((report['created'], report['error_count']), (4, 0))
+
+        leaf = Asset.query.filter_by(name="leaf").one()
+        path = Asset.get_path(leaf.id)
+        self.assertEqual(path['parent']['name'], "line 1")
+        self.assertEqual(path['parent']['parent']['name'], "plant")
+        self.assertEqual(path['parent']['parent']['description'], "main plant")
+
+    def test2_row_errors(self):
+        report = self.import_csv(
+            "key,parent_key,name\n"
+            "a,,plant\n"
+            "b,a,\n"               #missing name
+            "c,b,child of b\n"     #parent with errors
+            "a,,again\n"           #duplicated
+            "d,x,orphan\n"         #unknown parent
+            "e,f,cycle 1\n"
+            "f,e,cycle 2\n"
+            "g,a,line\n"
+        )
+        self.assertEqual(report['created'], 2)
+        errors = {(e['line'], e['key']): e['error'] for e in report['errors']}
+        self.assertEqual(errors[(3, None)], "missing name")
+        self.assertIn("not found", errors[(4, 'c')])
+        self.assertIn("duplicated key", errors[(5, 'a')])
+        self.assertIn("not found", errors[(6, 'd')])
+        self.assertEqual(errors[(7, 'e')], "cycle in parent keys")
+        self.assertEqual(report['error_count'], 6)
+
+    def test3_chunks(self):
+        rows = "key,parent_key,name\n" + "".join(f"{i},,root {i}\n" for i in range(25))
+        report = self.import_csv(rows, chunk_size=10)
+        self.assertEqual(report['created'], 25)
+        self.assertEqual(Asset.query.filter(Asset.parent_id == None).count(), 25)
+
+    def test4_ndjson_endpoint(self):
+        parent = make_chain(1)
+        body = "\n".join(json.dumps(r) for r in [
+            {"key": 1, "name": "plant"},
+            {"key": 2, "parent_key": 1, "name": "line"},
+            {"key": 3, "parent_key": 2, "name": "machine"}
+        ]) + "\n[]\n"
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        resp = self.app.test_client().post(
+            '/api/v1/manage/import-assets', data=body, content_type='application/x-ndjson',
+            query_string={'parent_id': parent.id}, headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()['data']
+        self.assertEqual(data['created'], 3)
+        self.assertEqual(data['errors'], [{"line": 4, "key": None, "error": "invalid json, an object is expected"}])
+        self.assertEqual(len(self.get_subtree_ids(parent.id)), 3)
+
+    def test5_endpoint_limits(self):
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        body = "key,parent_key,name\n" + "".join(f"{i},,asset {i}\n" for i in range(5))
+        for config in ({'ASSET_IMPORT_MAX_ROWS': 4}, {'ASSET_IMPORT_MAX_BYTES': 10}):
+            self.app.config.update(config)
+            resp = self.app.test_client().post(
+                '/api/v1/manage/import-assets', data=body, content_type='text/csv', headers={"Authorization": f"Bearer {token}"}
+            )
+            self.assertEqual(resp.status_code, 413)
+            self.assertEqual(Asset.query.count(), 0) #nothing imported
+
+    def get_subtree_ids(self, asset_id):
+        return [row.id for row in db.session.execute(Asset.subtree_query(asset_id))]
+
+
+
+class Asset_index_tests(DB_tests):
+
+    def setUp(self):
+        super().setUp()
+        self.index = asset_index
+
+    def walk_depth(self, asset):
+        depth = 0
+        while asset.parent is not None:
+            asset, depth = asset.parent, depth + 1
+        return depth
+
+    def test1_answers_without_queries(self):
+        root = make_tree(width=3, depth=3)
+        leaf = Asset.query.order_by(Asset.id.desc()).first()
+        path = [root.id, leaf.parent.parent_id, leaf.parent_id, leaf.id]
+        self.assertTrue(self.index.available()) #loaded here
+        self.queries.clear()
+
+        self.assertEqual(self.index.depth(leaf.id), 3)
+        self.assertEqual(self.index.parent(leaf.id), path[2])
+        self.assertEqual(self.index.path(leaf.id), path)
+        self.assertEqual(self.index.subtree_size(root.id), 1 + 3 + 9 + 27)
+        self.assertEqual(self.index.subtree_size(path[2]), 4)
+        self.assertIsNone(self.index.parent(root.id))
+        with self.assertRaises(KeyError):
+            self.index.depth(999)
+        self.assertEqual(self.queries, [])
+
+        assets = Asset.query.all()
+        for asset in assets:
+            self.assertEqual(self.index.depth(asset.id), self.walk_depth(asset))
+            ancestors = set(self.index.path(asset.id)[:-1])
+            for other in assets:
+                self.assertEqual(self.index.is_under(asset.id, other.id), other.id in ancestors)
+
+    def test2_insert_and_delete(self):
+        root = make_tree(width=2, depth=2)
+        self.index.available()
+        state = self.app.extensions['asset_index']
+        loaded = state._hierarchy
+
+        child = Asset(name="new", parent_id=root.children[0].id)
+        grandchild = Asset(name="new 2", parent=child)
+        db.session.add(child)
+        db.session.commit()
+        self.assertIs(state._hierarchy, loaded) #updated, not reloaded
+        self.assertEqual(self.index.depth(grandchild.id), 3)
+        self.assertTrue(self.index.is_under(grandchild.id, root.id))
+        self.assertTrue(self.index.is_under(grandchild.id, child.id))
+        self.assertEqual(self.index.subtree_size(root.id), 1 + 2 + 4 + 2)
+
+        db.session.delete(child) #delete-orphan cascade
+        db.session.commit()
+        self.assertEqual(self.index.subtree_size(root.id), 1 + 2 + 4)
+        with self.assertRaises(KeyError):
+            self.index.depth(grandchild.id)
+
+    def test3_move(self):
+        a, b = make_chain(3), make_tree(width=2, depth=1)
+        self.index.available()
+        root_a = self.index.path(a.id)[0]
+
+        b.parent_id = a.id
+        db.session.commit()
+        for node in (b, *b.children):
+            self.assertTrue(self.index.is_under(node.id, root_a))
+        self.assertEqual(self.index.depth(b.children[1].id), 4)
+        self.assertEqual(self.index.subtree_size(root_a), 3 + 3)
+
+        state = self.app.extensions['asset_index']
+        if state._background is not None:
+            state._background.join()
+        state.hierarchy() #starts the rebuild of the intervals
+        state._background.join()
+        self.assertFalse(state._hierarchy.stale)
+        self.assertEqual(self.index.depth(b.children[1].id), 4)
+        self.assertTrue(self.index.is_under(b.children[1].id, root_a))
+
+    def test4_bulk_statements_reload(self):
+        self.index.available()
+        self.import_rows("key,parent_key,name\na,,plant\nb,a,line\n")
+        leaf = Asset.query.filter_by(name="line").one()
+        self.assertTrue(self.index.available()) #current arrays, reloaded in the background
+        self.app.extensions['asset_index']._background.join()
+        self.assertEqual(self.index.depth(leaf.id), 1)
+
+    def import_rows(self, text):
+        return AssetImport().run(read_rows(io.StringIO(text), 'csv'))
+
+    def test5_endpoint(self):
+        leaf = make_chain(3)
+        root_id = Asset.get_path(leaf.id)['parent']['parent']['id']
+        for config in ({}, {'ASSET_INDEX_MAX_NODES': 1}): #index, db fallback
+            self.app.extensions['asset_index'].max_nodes = config.get('ASSET_INDEX_MAX_NODES', 2000000)
+            self.app.extensions['asset_index']._too_large = None
+            self.app.extensions['asset_index']._hierarchy = None
+            resp = self.app.test_client().get(f'/api/v1/manage/get-asset-hierarchy/{leaf.id}', json={}, query_string={'under': root_id})
+            self.assertEqual(resp.status_code, 200)
+            data = resp.get_json()['data']
+            self.assertEqual((data['depth'], data['subtree_size'], data['under']), (2, 1, True))
+            self.assertEqual(data['path'][0], root_id)
+        self.assertFalse(self.index.available())
+
+        resp = self.app.test_client().get('/api/v1/manage/get-asset-hierarchy/999', json={})
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,104 @@
+import time
+import datetime
+import unittest
+from app import create_app
+from app.extensions import token_blocklist
+from app.utils.cache import LRUCache
+from app.utils.exceptions import APIException
+from fixtures import fakeredis, fake_redis
+
+
+class LRU_cache_tests(unittest.TestCase):
+
+    def test1_get_set(self):
+        c = LRUCache(maxsize=2)
+        c.set('a', 1)
+        self.assertEqual(c.get('a'), 1)
+        self.assertIsNone(c.get('b'))
+
+    def test2_evicts_least_recently_used(self):
+        c = LRUCache(maxsize=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        self.assertIn('a', c)
+        self.assertNotIn('b', c)
+        self.assertEqual(len(c), 2)
+
+    def test3_expired_items(self):
+        c = LRUCache(maxsize=2, ttl=0.01)
+        c.set('a', 1)
+        c.set('b', 2, ttl=60)
+        time.sleep(0.02)
+        self.assertNotIn('a', c)
+        self.assertIn('b', c)
+
+    def test4_pop_and_clear(self):
+        c = LRUCache()
+        c.set('a', 1)
+        self.assertEqual(c.pop('a'), 1)
+        self.assertIsNone(c.pop('a'))
+        c.set('b', 2)
+        c.clear()
+        self.assertEqual(len(c), 0)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class Token_blocklist_tests(unittest.TestCase):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        self.app = self.create()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.state = self.app.extensions['token_blocklist']
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def create(self, **config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            **config
+        })
+        fake_redis(app, self.server)
+        return app
+
+    def wait(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test1_revoke(self):
+        self.assertFalse(self.state.is_revoked("jti-1"))
+        token_blocklist.revoke("jti-1", datetime.timedelta(minutes=5))
+        self.assertAlmostEqual(self.app.extensions['redis'].client.ttl("jti-1"), 300, delta=2)
+        self.assertTrue(self.state.is_revoked("jti-1"))
+        self.assertFalse(self.state.is_revoked("jti-2"))
+
+    def test2_other_workers(self):
+        other = self.create()
+        other_state = other.extensions['token_blocklist']
+        self.assertFalse(other_state.is_revoked("jti-1")) #starts the listener
+        self.wait(lambda: other_state.subscribed)
+        self.assertFalse(other_state.is_revoked("jti-1"))
+        self.assertIn("jti-1", other_state.not_revoked) #answered from the local cache
+
+        token_blocklist.revoke("jti-1", datetime.timedelta(minutes=5))
+        self.wait(lambda: "jti-1" in other_state.revoked)
+        self.assertNotIn("jti-1", other_state.not_revoked)
+        self.assertTrue(other_state.is_revoked("jti-1"))
+
+    def test3_fail_closed(self):
+        self.server.connected = False
+        with self.assertRaises(APIException) as e:
+            self.state.is_revoked("jti-1")
+        self.assertEqual(e.exception.status_code, 500)
+
+    def test4_fail_open(self):
+        app = self.create(JWT_BLOCKLIST_FAIL_OPEN=True)
+        self.server.connected = False
+        self.assertFalse(app.extensions['token_blocklist'].is_revoked("jti-1"))
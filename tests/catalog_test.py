@@ -0,0 +1,71 @@
+import unittest
+from app.extensions import db, catalog, version_stamps
+from app.models.main import Role, Plan
+from fixtures import DB_tests, fakeredis, fake_redis
+
+
+class Catalog_tests(DB_tests):
+
+    def test1_seeding_is_a_single_upsert(self):
+        Role.add_default_roles()
+        Plan.add_default_plans()
+        self.assertEqual(len([q for q in self.queries if q.startswith("INSERT")]), 2)
+
+        Role.add_default_roles() #existing roles are kept
+        self.assertEqual(Role.query.count(), 3)
+
+    def test2_reloaded_after_commit(self):
+        self.assertIsNone(catalog.role('admin'))
+        Role.add_default_roles()
+        Plan.add_default_plans()
+
+        admin = catalog.role('admin')
+        self.assertTrue(admin.permits['delete'])
+        self.assertIs(catalog.role(admin.id), admin)
+        self.assertEqual(catalog.plan('basic').limits['assets'], 20)
+        self.assertEqual(len(catalog.roles()), 3)
+
+        tech = Role.query.filter_by(code='tech').first()
+        tech.permits = {'create': True, 'read': True, 'update': True, 'delete': False}
+        db.session.commit()
+        self.assertTrue(catalog.role('tech').permits['create'])
+
+    def test3_served_from_memory(self):
+        Role.add_default_roles()
+        catalog.role('obs')
+        self.queries.clear()
+        for _ in range(10):
+            self.assertFalse(catalog.role('obs').permits['update'])
+        self.assertEqual(len(self.queries), 0)
+
+    def test4_immutable(self):
+        Role.add_default_roles()
+        with self.assertRaises(TypeError):
+            catalog.role('obs').permits['update'] = True
+        with self.assertRaises(AttributeError):
+            catalog.role('obs').code = 'x'
+
+    @unittest.skipIf(fakeredis is None, "fakeredis not installed")
+    def test5_changes_of_other_workers(self):
+        fake_redis(self.app)
+        state = self.app.extensions['catalog']
+        state.check_interval = 0
+        Role.add_default_roles()
+        self.assertFalse(catalog.role('obs').permits['update'])
+
+        #commit of another worker: the row and the stamp change, no reload in this process
+        with db.engine.begin() as conn:
+            conn.execute(db.update(Role).where(Role.code == 'obs').values(permits={'update': True}))
+        self.assertFalse(catalog.role('obs').permits['update']) #same stamp
+        version_stamps.bump(('catalog', None))
+        self.assertTrue(catalog.role('obs').permits['update'])
+
+    def test6_commits_bump_the_stamp(self):
+        bumped = []
+        self.app.extensions['version_stamps'].bump = lambda stamps: bumped.extend(stamps)
+        Role.add_default_roles() #bulk upsert
+        self.assertIn(('catalog', None), bumped)
+        bumped.clear()
+        Role.query.filter_by(code='obs').one().name = "observer"
+        db.session.commit()
+        self.assertEqual(bumped, [('catalog', None)])
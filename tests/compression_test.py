@@ -0,0 +1,67 @@
+import gzip
+import unittest
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+from app.extensions import db
+from app.models.main import Asset
+from app.utils import compression
+from fixtures import DB_tests
+
+
+class Compression_tests(DB_tests):
+    config = {'COMPRESS_MIN_SIZE': 500}
+
+    def setUp(self):
+        super().setUp()
+        parent = None
+        for i in range(30):
+            parent = Asset(name=f"level {i}", description="repetitive description " * 3, parent=parent)
+            db.session.add(parent)
+        db.session.commit()
+        self.leaf = parent.id
+
+    def get(self, url, encoding, **headers):
+        return self.app.test_client().get(url, json={}, headers={'Accept-Encoding': encoding, **headers})
+
+    def test1_gzip(self):
+        plain = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'identity')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        resp = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'gzip, deflate')
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertLess(len(resp.data), len(plain.data))
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+
+    def test2_client_preference(self):
+        state = self.app.extensions['compression']
+        state.algorithms = ('zstd', 'br', 'gzip')
+        self.assertEqual(state.negotiate(parse_accept_header('gzip;q=1.0, zstd;q=0.5', Accept)), 'gzip')
+        self.assertEqual(state.negotiate(parse_accept_header('gzip, zstd', Accept)), 'zstd')
+        self.assertEqual(state.negotiate(parse_accept_header('*', Accept)), 'zstd')
+        self.assertIsNone(state.negotiate(parse_accept_header('gzip;q=0', Accept)))
+
+    def test3_small_responses(self):
+        resp = self.get('/api/v1/manage/get-asset-path/1', 'gzip')
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test4_streamed(self):
+        resp = self.get('/api/v1/manage/get-asset-subtree/1', 'gzip')
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', resp.headers)
+        data = self.app.json.loads(gzip.decompress(resp.data))
+        self.assertEqual(len(data['data']['nodes']), 29)
+
+    def test5_conditional_get(self):
+        resp = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'gzip')
+        self.assertTrue(resp.headers['ETag'].startswith('W/'))
+        resp = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'gzip', **{'If-None-Match': resp.headers['ETag']})
+        self.assertEqual(resp.status_code, 304)
+
+    @unittest.skipIf('br' not in compression.COMPRESSORS, "brotli not installed")
+    def test6_brotli(self):
+        import brotli
+        plain = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'identity')
+        resp = self.get(f'/api/v1/manage/get-asset-path/{self.leaf}', 'br')
+        self.assertEqual(resp.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(resp.data), plain.data)
@@ -0,0 +1,94 @@
+import unittest
+from datetime import datetime, timezone
+from flask_jwt_extended import create_access_token
+from app.extensions import db
+from app.models.main import User, Asset
+from fixtures import DB_tests, fakeredis, fake_redis
+
+
+class Conditional_get_tests(DB_tests):
+    config = {'USER_CACHE_REDIS': False}
+
+    def setUp(self):
+        super().setUp()
+        db.session.add(User(email="valid@email.com", password_hash="x", fname="Luis", status='active'))
+        db.session.commit()
+        token = create_access_token(identity="valid@email.com", additional_claims={'user_access_token': True})
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.queries.clear()
+
+    def get(self, url, **headers):
+        return self.app.test_client().get(url, json={}, headers={**self.headers, **headers})
+
+    def stamp(self, etag, modified=1700000000):
+        #fixed version stamp, as if read from redis
+        state = self.app.extensions['version_stamps']
+        state.get = lambda kind, key: (f"{kind}-{etag}", datetime.fromtimestamp(modified, tz=timezone.utc))
+        state.bump = lambda stamps: None
+
+    def test1_payload_hash_without_stamps(self):
+        resp = self.get('/api/v1/profile/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('private', resp.headers['Cache-Control'])
+        etag = resp.headers['ETag']
+
+        resp = self.get('/api/v1/profile/', **{'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b"")
+
+    def test2_stamp_checked_before_the_db(self):
+        self.stamp("abc")
+        resp = self.get('/api/v1/profile/')
+        self.assertEqual(resp.headers['ETag'], '"user-abc"')
+        self.assertEqual(resp.headers['Last-Modified'], 'Tue, 14 Nov 2023 22:13:20 GMT')
+
+        self.queries.clear()
+        resp = self.get('/api/v1/profile/', **{'If-None-Match': '"user-abc"'})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(len(self.queries), 0)
+
+        resp = self.get('/api/v1/profile/', **{'If-Modified-Since': 'Tue, 14 Nov 2023 22:13:20 GMT'})
+        self.assertEqual(resp.status_code, 304)
+
+        self.stamp("def")
+        resp = self.get('/api/v1/profile/', **{'If-None-Match': '"user-abc"'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test3_asset_path(self):
+        asset = Asset(name="root")
+        db.session.add(asset)
+        db.session.commit()
+        self.stamp("1")
+        resp = self.get(f'/api/v1/manage/get-asset-path/{asset.id}')
+        self.assertEqual(resp.status_code, 200)
+        self.queries.clear()
+        resp = self.get(f'/api/v1/manage/get-asset-path/{asset.id}', **{'If-None-Match': resp.headers['ETag']})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(len(self.queries), 0)
+
+    def test4_commits_bump_the_stamps(self):
+        bumped = []
+        self.app.extensions['version_stamps'].bump = lambda stamps: bumped.extend(stamps)
+        user = User.query.filter_by(email="valid@email.com").one()
+        user.fname = "Alejandro"
+        db.session.add(Asset(name="root"))
+        db.session.commit()
+        self.assertEqual(set(bumped), {('user', "valid@email.com"), ('assets', None)})
+
+    @unittest.skipIf(fakeredis is None, "fakeredis not installed")
+    def test5_cached_profile_of_another_stamp(self):
+        cache = self.app.extensions['user_cache']
+        cache.use_redis = True
+        fake_redis(self.app)
+        self.stamp("abc")
+        self.assertEqual(self.get('/api/v1/profile/').get_json()['data']['user']['fname'], "Luis")
+
+        #a loader that read before a commit writes the old user back after the invalidation
+        db.session.execute(db.update(User).values(fname="Alejandro"))
+        db.session.commit()
+        cache.local.clear()
+        self.stamp("def")
+        resp = self.get('/api/v1/profile/', **{'If-None-Match': '"user-abc"'})
+        self.assertEqual(resp.headers['ETag'], '"user-def"')
+        self.assertEqual(resp.get_json()['data']['user']['fname'], "Alejandro")
+        self.assertEqual(self.get('/api/v1/profile/', **{'If-None-Match': '"user-def"'}).status_code, 304)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from flask_jwt_extended import create_access_token
+from app.extensions import db
+from app.models.main import User, Asset
+from fixtures import DB_tests
+
+
+class Db_routing_tests(DB_tests):
+
+    def setUp(self):
+        #the app is created by each test, with its replicas
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        engines = (db.engine, *self.app.extensions['db_router'].engines.values())
+        super().tearDown()
+        for engine in engines:
+            engine.dispose()
+        shutil.rmtree(self.dir)
+
+    def create(self, replicas, **config):
+        #primary and replicas are sqlite files with the same rows, but different names.
+        self.config = {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.dir, 'primary.db')}",
+            'SQLALCHEMY_REPLICA_URIS': [f"sqlite:///{os.path.join(self.dir, r)}" for r in replicas],
+            'USER_CACHE_ENABLED': False,
+            'DB_ROUTING_BACKEND': 'memory',
+            'METRICS_TOKEN': 'test-metrics-token',
+            **config
+        }
+        super().setUp()
+        engines = {'primary': db.engine, **self.app.extensions['db_router'].engines}
+        for name, engine in engines.items():
+            try:
+                db.metadata.create_all(engine)
+                with engine.begin() as conn:
+                    conn.execute(db.insert(Asset), [{'id': 1, 'name': name}])
+                    conn.execute(db.insert(User), [
+                        {'email': e, 'password_hash': "x", 'fname': name, 'status': 'active'} for e in ("a@email.com", "b@email.com")
+                    ])
+            except Exception:
+                pass #unreachable replica
+
+    def headers(self, email):
+        token = create_access_token(identity=email, additional_claims={'user_access_token': True})
+        return {"Authorization": f"Bearer {token}"}
+
+    def asset_name(self):
+        resp = self.app.test_client().get('/api/v1/manage/assets', json={})
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()['data']['assets'][0]['name']
+
+    def profile_name(self, email):
+        resp = self.app.test_client().get('/api/v1/profile/', json={}, headers=self.headers(email))
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()['data']['user']['fname']
+
+    def test1_without_replicas(self):
+        self.create([])
+        self.assertEqual(self.asset_name(), "primary")
+        self.assertEqual(set(self.app.extensions['db_router'].pool_stats()), {'primary'})
+
+    def test2_round_robin(self):
+        self.create(['r0.db', 'r1.db'])
+        names = [self.asset_name() for _ in range(4)]
+        self.assertEqual(sorted(names), ["replica_0", "replica_0", "replica_1", "replica_1"])
+        self.assertNotEqual(names[0], names[1])
+
+        scraper = {"Authorization": "Bearer test-metrics-token"}
+        stats = self.app.test_client().get('/api/v1/status/db-pools', headers=scraper).get_json()['data']['pools']
+        self.assertEqual(set(stats), {'primary', 'replica_0', 'replica_1'})
+        self.assertEqual(stats['replica_0']['reads'], 2)
+        self.assertTrue(stats['replica_1']['up'])
+
+        metrics = self.app.test_client().get('/api/v1/status/metrics', headers=scraper).get_data(as_text=True)
+        self.assertIn(f'db_routed_reads{{bind="replica_0",pid="{os.getpid()}"}} 2', metrics)
+
+    def test3_read_your_writes(self):
+        self.create(['r0.db'])
+        self.assertEqual(self.profile_name("a@email.com"), "replica_0")
+
+        resp = self.app.test_client().put('/api/v1/profile/update', headers=self.headers("a@email.com"), json={
+            "fname": "Luis", "lname": "Lucena", "home_address": {}, "image": "", "phone": ""
+        })
+        self.assertEqual(resp.status_code, 200)
+
+        #the writer reads from the primary, the other users from the replica
+        self.assertEqual(self.profile_name("a@email.com"), "Luis")
+        self.assertEqual(self.profile_name("b@email.com"), "replica_0")
+
+        self.app.extensions['db_router']._writes.clear() #window over
+        db.session.remove() #the app context of the test outlives the requests, and its session
+        self.assertEqual(self.profile_name("a@email.com"), "replica_0")
+
+    def test4_replica_failure(self):
+        self.create(['missing-dir/r0.db'])
+        self.assertEqual(self.asset_name(), "primary")
+        self.assertEqual(self.asset_name(), "primary")
+
+        stats = self.app.extensions['db_router'].pool_stats()
+        self.assertEqual(stats['replica_0']['failures'], 1) #skipped after the first failure
+        self.assertFalse(stats['replica_0']['up'])
+
+    def test5_fresh_version_stamp(self):
+        self.create(['r0.db'])
+        state = self.app.extensions['version_stamps']
+        path = lambda: self.app.test_client().get('/api/v1/manage/get-asset-path/1', json={}).get_json()['data']['name']
+
+        state.get = lambda kind, key: ("assets-1", datetime.fromtimestamp(1700000000, tz=timezone.utc))
+        self.assertEqual(path(), "replica_0")
+
+        state.get = lambda kind, key: ("assets-2", datetime.now(timezone.utc))
+        self.assertEqual(path(), "primary")
+
+
+if __name__ == '__main__':
+    unittest.main()
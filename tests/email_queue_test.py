@@ -0,0 +1,121 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.extensions import email_queue
+from app.utils import email_service
+from app.utils.email_queue import EmailWorker
+from fixtures import DB_tests
+
+
+class StubSMTPHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    statuses = []
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append(body)
+        status = self.statuses.pop(0) if self.statuses else 201
+        #like the smtp api: one message id per version of a batch
+        answer = json.dumps({"messageIds": [f"<{v['to'][0]['email']}>" for v in body.get('messageVersions', [])]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+class Email_queue_tests(DB_tests):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubSMTPHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/v3/smtp/email"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StubSMTPHandler.statuses = []
+        StubSMTPHandler.received = []
+        self.config = {
+            'EMAIL_QUEUE_BACKEND': 'memory',
+            'EMAIL_MAX_RETRIES': 2,
+            'EMAIL_RETRY_BACKOFF': 0,
+            'EMAIL_BATCH_SIZE': 4,
+            'MAIL_MODE': 'production',
+            'SMTP_API_URL': self.url
+        }
+        super().setUp()
+
+    def enqueue(self, n=1):
+        email_queue.enqueue(*[
+            email_service.Email_api_service(f"user{i}@email.com").to_message() for i in range(n)
+        ])
+
+    def test1_worker_sends_queued_messages(self):
+        self.enqueue(3)
+        EmailWorker(self.app).run(burst=True)
+        self.assertEqual(len(StubSMTPHandler.received), 3)
+        self.assertEqual(email_queue.backend().size(), {"ready": 0, "delayed": 0, "dead": 0})
+
+    def test2_retry_then_success(self):
+        StubSMTPHandler.statuses = [503]
+        self.enqueue()
+        EmailWorker(self.app).run(burst=True)
+        self.assertEqual(len(StubSMTPHandler.received), 2)
+        self.assertEqual(email_queue.backend().size()['dead'], 0)
+
+    def test3_dead_letter_after_max_retries(self):
+        StubSMTPHandler.statuses = [500, 500, 500]
+        self.enqueue()
+        EmailWorker(self.app).run(burst=True)
+        queue = email_queue.backend()
+        self.assertEqual(len(StubSMTPHandler.received), 3)
+        self.assertEqual(queue.dead_letters[0]['attempts'], 3)
+
+    def test4_client_errors_are_not_retried(self):
+        StubSMTPHandler.statuses = [400]
+        self.enqueue()
+        EmailWorker(self.app).run(burst=True)
+        self.assertEqual(len(StubSMTPHandler.received), 1)
+        self.assertEqual(email_queue.backend().size()['dead'], 1)
+
+    def send_bulk(self, n):
+        recipients = [{'email': f"user{i}@email.com", 'name': f"User {i}", 'params': {'user_name': f"User {i}"}} for i in range(n)]
+        recipients.append({'email': "not-an-email"})
+        return email_service.send_bulk_email("email/user-invitation.html", recipients, subject="hi")
+
+    def results(self, batch):
+        return email_queue.results(batch)
+
+    def test5_bulk_email_batches(self):
+        report = self.send_bulk(10)
+        self.assertEqual((report['queued'], report['rejected']), (10, ["not-an-email"]))
+        self.assertEqual(self.results(report['batch'])["user0@email.com"], {'status': 'queued'})
+
+        EmailWorker(self.app).run(burst=True)
+        self.assertEqual(sorted(len(r['messageVersions']) for r in StubSMTPHandler.received), [2, 4, 4])
+        body = StubSMTPHandler.received[0]
+        self.assertIn("{{ params.user_name }}", body['htmlContent']) #rendered once, params filled by the api
+        self.assertEqual(set(body['messageVersions'][0]), {'to', 'params'})
+
+        results = self.results(report['batch'])
+        self.assertEqual(results["user7@email.com"], {'status': 'sent', 'message_id': "<user7@email.com>"})
+        self.assertEqual(results["not-an-email"]['status'], 'rejected')
+        self.assertEqual(len(results), 11)
+
+    def test6_bulk_email_failed_batch(self):
+        StubSMTPHandler.statuses = [400]
+        self.app.config['EMAIL_WORKER_CONCURRENCY'] = 1
+        report = self.send_bulk(6)
+        EmailWorker(self.app).run(burst=True)
+
+        statuses = [r['status'] for r in self.results(report['batch']).values()]
+        self.assertEqual(statuses.count('failed'), 4) #first batch rejected by the api
+        self.assertEqual(statuses.count('sent'), 2)
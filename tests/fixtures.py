@@ -0,0 +1,53 @@
+'''
+Shared fixtures of the tests.
+'''
+import unittest
+from sqlalchemy import event
+from app import create_app
+from app.extensions import db
+
+try:
+    import fakeredis
+except ImportError: #optional dev dependency, the tests that need it are skipped
+    fakeredis = None
+
+
+def fake_redis(app, server=None):
+    '''
+    replaces the redis client of the app with a fakeredis one. apps given the same server
+    share the data and the pub/sub channels, like workers of one deployment.
+    '''
+    client = fakeredis.FakeRedis(server=server or fakeredis.FakeServer())
+    app.extensions['redis']._client = client
+    return client
+
+
+class DB_tests(unittest.TestCase):
+    '''
+    app with an empty sqlite db in memory, pushed app context and the sql statements
+    executed by each test in self.queries. config: extra settings of the app.
+    '''
+    config = {}
+
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            'JWT_BLOCKLIST_FAIL_OPEN': True, #no redis here
+            **self.config
+        })
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.queries = []
+        event.listen(db.engine, 'before_cursor_execute', self._count)
+
+    def tearDown(self):
+        event.remove(db.engine, 'before_cursor_execute', self._count)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _count(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
@@ -0,0 +1,63 @@
+import time
+import threading
+import unittest
+from app.extensions import health_monitor
+from fixtures import DB_tests, fakeredis, fake_redis
+
+
+class Health_monitor_tests(DB_tests):
+    config = {
+        'REDIS_HOST': '127.0.0.1',
+        'REDIS_PORT': 1, #nothing listening
+        'HEALTH_PROBE_TIMEOUT': 0.5,
+        'HEALTH_REFRESH_INTERVAL': 60
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.state = self.app.extensions['health']
+
+    def test1_snapshot_of_each_dependency(self):
+        snapshot = health_monitor.refresh(self.app)
+        deps = snapshot['dependencies']
+        self.assertTrue(deps['postgresql']['up'])
+        self.assertIsNotNone(deps['postgresql']['last_success'])
+        self.assertIsNotNone(deps['postgresql']['latency_ms'])
+        self.assertFalse(deps['redis']['up'])
+        self.assertIsNone(deps['redis']['last_success'])
+        self.assertEqual(snapshot['status'], 'down')
+
+    def test2_hung_probe_times_out(self):
+        release = threading.Event()
+        calls = []
+        def hung(app, timeout):
+            calls.append(1)
+            release.wait(5)
+
+        self.state.probes = {'postgresql': self.state.probes['postgresql'], 'smtp': hung}
+        self.state.results['smtp'] = {"up": False, "latency_ms": None, "last_success": None, "error": None}
+        self.state.critical = {'postgresql'}
+        try:
+            start = time.perf_counter()
+            snapshot = health_monitor.refresh(self.app)
+            self.assertLess(time.perf_counter() - start, 2)
+            self.assertEqual(snapshot['status'], 'degraded')
+            self.assertIn('timeout', snapshot['dependencies']['smtp']['error'])
+
+            health_monitor.refresh(self.app)
+            self.assertEqual(len(calls), 1) #not started again while still running
+        finally:
+            release.set()
+
+    def test3_status_endpoint_serves_the_snapshot(self):
+        resp = self.app.test_client().get('/api/v1/status/')
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(resp.get_json()['message'], "redis service is down")
+        self.assertIn('dependencies', resp.get_json()['data'])
+
+    @unittest.skipIf(fakeredis is None, "fakeredis not installed")
+    def test4_all_up(self):
+        fake_redis(self.app)
+        snapshot = health_monitor.refresh(self.app)
+        self.assertTrue(snapshot['dependencies']['redis']['up'])
+        self.assertEqual(snapshot['status'], 'ok')
@@ -1,4 +1,7 @@
 import unittest
+from datetime import datetime
+from decimal import Decimal
+from app import create_app
 from app.utils.helpers import (
     _epoch_utc_to_datetime, normalize_names, 
 )
@@ -9,4 +12,27 @@ class Normalize_names_tests(unittest.TestCase):
         v = normalize_names('lUiS')
         self.assertEqual(v, "Luis")
 
-    
\ No newline at end of file
+    
+class JSON_provider_tests(unittest.TestCase):
+
+    payload = {'date': datetime(2021, 1, 2, 3, 4, 5), 'amount': Decimal('1.50')}
+
+    def dump(self, **config):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'JSON_COMPACT': True, **config})
+        with app.app_context():
+            return app.json.loads(app.json.response(self.payload).get_data())
+
+    def test1_stdlib_http_dates(self):
+        v = self.dump(JSON_ENCODER_BACKEND='stdlib')
+        self.assertEqual(v, {'date': 'Sat, 02 Jan 2021 03:04:05 GMT', 'amount': '1.50'})
+
+    def test2_iso_dates(self):
+        v = self.dump(JSON_ENCODER_BACKEND='stdlib', JSON_DATETIME_FORMAT='iso')
+        self.assertEqual(v['date'], '2021-01-02T03:04:05')
+
+    def test3_backends_match(self):
+        for fmt in ('http', 'iso'):
+            self.assertEqual(
+                self.dump(JSON_ENCODER_BACKEND='stdlib', JSON_DATETIME_FORMAT=fmt),
+                self.dump(JSON_ENCODER_BACKEND='orjson', JSON_DATETIME_FORMAT=fmt)
+            )
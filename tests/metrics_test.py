@@ -0,0 +1,71 @@
+import os
+import re
+import unittest
+from flask_jwt_extended import create_access_token
+from app.utils.metrics import MetricsRegistry
+from fixtures import DB_tests
+
+
+class Metrics_registry_tests(unittest.TestCase):
+
+    def test1_histogram_buckets(self):
+        r = MetricsRegistry(buckets=(0.1, 1.0))
+        r.observe('latency', (('endpoint', 'x'),), 0.05)
+        r.observe('latency', (('endpoint', 'x'),), 0.5)
+        r.observe('latency', (('endpoint', 'x'),), 5)
+        text = r.render()
+        self.assertIn('latency_bucket{endpoint="x",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{endpoint="x",le="1.0"} 2', text)
+        self.assertIn('latency_bucket{endpoint="x",le="+Inf"} 3', text)
+        self.assertIn('latency_count{endpoint="x"} 3', text)
+
+    def test2_counters_and_gauges(self):
+        r = MetricsRegistry()
+        r.inc('calls_total', (('component', 'db'),), 2)
+        r.inc('calls_total', (('component', 'db'),))
+        text = r.render({'pool': {(): 4}})
+        self.assertIn('# TYPE calls_total counter', text)
+        self.assertIn('calls_total{component="db"} 3', text)
+        self.assertIn('# TYPE pool gauge\npool 4', text)
+        self.assertIn('calls_total{component="db",pid="7"} 3', r.render(labels=(('pid', 7),)))
+
+
+class Metrics_endpoint_tests(DB_tests):
+    config = {
+        'RATE_LIMIT_BACKEND': 'memory',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'METRICS_TOKEN': 'test-metrics-token'
+    }
+
+    def scrape(self, series):
+        #metrics are process wide, other tests may have counted before.
+        resp = self.app.test_client().get('/api/v1/status/metrics', headers={"Authorization": "Bearer test-metrics-token"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith('text/plain'))
+        pid = f'pid="{os.getpid()}"' #series of this worker
+        series = f"{series[:-1]},{pid}}}" if series.endswith("}") else f"{series}{{{pid}}}"
+        found = re.search(rf"^{re.escape(series)} (\S+)$", resp.get_data(as_text=True), re.M)
+        return float(found.group(1)) if found else 0
+
+    def test1_breakdown_by_component(self):
+        duration = 'http_request_duration_seconds_count{endpoint="auth_bp.login",method="POST",status="404"}'
+        db_calls = 'http_request_component_calls_total{component="db",endpoint="auth_bp.login"}'
+        before = self.scrape(duration), self.scrape(db_calls)
+
+        resp = self.app.test_client().post('/api/v1/auth/login', json={"email": "valid@email.com", "password": "1478520.Lu"})
+        self.assertEqual(resp.status_code, 404)
+
+        self.assertEqual(self.scrape(duration), before[0] + 1)
+        self.assertEqual(self.scrape(db_calls), before[1] + 1)
+        self.assertGreater(self.scrape('redis_pool_connections{state="max_connections"}'), 0)
+
+    def test2_access(self):
+        client = self.app.test_client()
+        self.assertEqual(client.get('/api/v1/status/metrics').status_code, 401)
+        self.assertNotEqual(client.get('/api/v1/status/redis-pool', headers={"Authorization": "Bearer other-token"}).status_code, 200)
+
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        resp = client.get('/api/v1/status/redis-pool', headers={"Authorization": f"Bearer {token}"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['data']['pid'], os.getpid())
+        self.assertIn('in_use', resp.get_json()['data']['pool'])
@@ -0,0 +1,52 @@
+from flask_jwt_extended import create_access_token
+from app.extensions import db
+from app.models.main import Asset, User
+from fixtures import DB_tests
+
+
+class Keyset_list_tests(DB_tests):
+
+    def get_all(self, url, key, headers=None, **params):
+        items, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            self.queries.clear()
+            resp = self.app.test_client().get(url, json={}, query_string=query, headers=headers)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(len(self.queries), 1)
+            data = resp.get_json()['data']
+            items += data[key]
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return items, pages
+
+    def test1_assets_by_parent(self):
+        root = Asset(name="root", children=[Asset(name=f"child {i}") for i in range(25)])
+        db.session.add_all([root, Asset(name="other root")])
+        db.session.commit()
+
+        children, pages = self.get_all('/api/v1/manage/assets', 'assets', parent_id=root.id, limit=10)
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(children), 25)
+        self.assertEqual([a['id'] for a in children], sorted(a['id'] for a in children))
+        self.assertTrue(all(a['parent_id'] == root.id for a in children))
+
+        roots, _ = self.get_all('/api/v1/manage/assets', 'assets', roots='true')
+        self.assertEqual([a['name'] for a in roots], ["root", "other root"])
+
+    def test2_cursor_bound_to_filters(self):
+        db.session.add_all([Asset(name=f"asset {i}") for i in range(3)])
+        db.session.commit()
+        client = self.app.test_client()
+        cursor = client.get('/api/v1/manage/assets', json={}, query_string={'limit': 1}).get_json()['data']['next_cursor']
+        resp = client.get('/api/v1/manage/assets', json={}, query_string={'limit': 1, 'roots': 'true', 'cursor': cursor})
+        self.assertEqual(resp.status_code, 400)
+
+    def test3_users(self):
+        db.session.add_all([User(email=f"user{i}@email.com", password_hash="x", status='active') for i in range(12)])
+        db.session.commit()
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        users, pages = self.get_all('/api/v1/manage/users', 'users', headers={"Authorization": f"Bearer {token}"}, limit=5)
+        self.assertEqual(pages, 3)
+        self.assertEqual(len({u['email'] for u in users}), 12)
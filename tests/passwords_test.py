@@ -0,0 +1,78 @@
+import os
+import sys
+import hmac
+import unittest
+import subprocess
+from app import create_app
+from app.extensions import db, password_hasher
+from app.models.main import User
+
+
+def legacy_sha256_hash(password, salt="s4lt"):
+    #format of werkzeug generate_password_hash(password, method='sha256') before 2.3
+    return f"sha256${salt}${hmac.new(salt.encode(), password.encode(), 'sha256').hexdigest()}"
+
+
+class Password_hasher_tests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+            'PASSWORD_HASH_WORKERS': 2
+        })
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test1_hash_and_verify(self):
+        h = password_hasher.hash("1478520.Lu")
+        self.assertTrue(h.startswith("pbkdf2:sha256:1000$"))
+        self.assertTrue(password_hasher.verify(h, "1478520.Lu"))
+        self.assertFalse(password_hasher.verify(h, "wrong"))
+        self.assertFalse(password_hasher.needs_rehash(h))
+
+    def test2_legacy_hashes(self):
+        h = legacy_sha256_hash("1478520.Lu")
+        self.assertTrue(password_hasher.verify(h, "1478520.Lu"))
+        self.assertFalse(password_hasher.verify(h, "wrong"))
+        self.assertTrue(password_hasher.needs_rehash(h))
+
+    def test3_rehash_on_login(self):
+        user = User(
+            email="valid@email.com", password_hash=legacy_sha256_hash("1478520.Lu"),
+            email_confirmed=True, status='active'
+        )
+        db.session.add(user)
+        db.session.commit()
+
+        resp = self.app.test_client().post('/api/v1/auth/login', json={"email": "valid@email.com", "password": "1478520.Lu"})
+        self.assertEqual(resp.status_code, 200)
+        db.session.refresh(user)
+        self.assertTrue(user.password_hash.startswith("pbkdf2:sha256:1000$"))
+
+        resp = self.app.test_client().post('/api/v1/auth/login', json={"email": "valid@email.com", "password": "1478520.Lu"})
+        self.assertEqual(resp.status_code, 200)
+
+    def test4_process_pool_shutdown(self):
+        #the pools are stopped by atexit, the interpreter exits cleanly
+        script = (
+            "from app import create_app\n"
+            "from app.extensions import password_hasher\n"
+            "app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',\n"
+            "                  'PASSWORD_HASH_EXECUTOR': 'process', 'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})\n"
+            "with app.app_context():\n"
+            "    password_hasher.hash('1478520.Lu')\n"
+            "    password_hasher.hash_many(['1478520.Lu'])\n"
+        )
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("Traceback", result.stderr)
@@ -0,0 +1,65 @@
+from flask_jwt_extended import create_access_token
+from app.extensions import email_queue, password_hasher
+from app.models.main import User
+from app.utils.provisioning import provision_users
+from fixtures import DB_tests
+
+
+def make_user(n, **overrides):
+    user = {"email": f"user{n}@email.com", "password": "1478520.Lu", "fname": "Luis", "lname": "Lucena"}
+    user.update(overrides)
+    return user
+
+
+class Provisioning_tests(DB_tests):
+    config = {
+        'EMAIL_QUEUE_BACKEND': 'memory',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_BATCH_WORKERS': 2
+    }
+
+    def test1_bulk_create(self):
+        report = provision_users([make_user(n) for n in range(50)], chunk_size=20)
+        self.assertEqual(report['created'], 50)
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(User.query.count(), 50)
+        user = User.query.filter_by(email="user7@email.com").one()
+        self.assertTrue(password_hasher.verify(user.password_hash, "1478520.Lu"))
+        self.assertFalse(user.email_confirmed)
+        self.assertEqual(email_queue.backend().size()['ready'], 1) #one bulk email batch
+
+    def test2_errors_and_conflicts(self):
+        provision_users([make_user(0)], send_invitations=False)
+        report = provision_users([
+            make_user(0),                       #already exists
+            make_user(1, email="USER1@email.com"),
+            make_user(2, password="weak"),
+            make_user(3, fname=None),
+            make_user(1),                       #duplicated in the batch
+            "not an object"
+        ])
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['existing'], ["user0@email.com"])
+        self.assertEqual([e['row'] for e in report['errors']], [2, 3, 4, 5])
+        self.assertEqual(report['errors'][0]['data'], {'invalid': {'password': 'password is insecure'}})
+        self.assertEqual(email_queue.backend().size()['ready'], 1)
+
+    def test3_endpoint(self):
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        resp = self.app.test_client().post(
+            '/api/v1/manage/provision-users', json={"users": [make_user(n) for n in range(3)], "send_invitations": False},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.get_json()['data']['created'], 3)
+        self.assertEqual(email_queue.backend().size()['ready'], 0)
+
+    def test4_endpoint_limit(self):
+        self.app.config['PROVISION_MAX_USERS'] = 2
+        token = create_access_token(identity="super@email.com", additional_claims={'super_user': True})
+        resp = self.app.test_client().post(
+            '/api/v1/manage/provision-users', json={"users": [make_user(n) for n in range(3)]},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(User.query.count(), 0)
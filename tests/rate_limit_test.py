@@ -0,0 +1,67 @@
+import unittest
+from app.utils import rate_limit as rl
+from fixtures import DB_tests, fakeredis, fake_redis
+
+
+class Sliding_window_tests(unittest.TestCase):
+
+    def test1_parse_limit(self):
+        self.assertEqual(rl.parse_limit("20/60"), (20, 60))
+
+    def test2_previous_window_weight(self):
+        self.assertEqual(rl._sliding_count(current=2, previous=10, elapsed=30, window=60), 7)
+
+    def test3_retry_after(self):
+        self.assertEqual(rl._retry_after(current=5, previous=0, elapsed=20, window=60, limit=5), 40)
+        #10 * (1 - t/60) + 2 <= 5  ->  t >= 42
+        self.assertEqual(rl._retry_after(current=2, previous=10, elapsed=30, window=60, limit=5), 12)
+
+    def test4_memory_backend(self):
+        b = rl.MemoryRateLimitBackend()
+        self.assertEqual(b.hit('k', 60, now=0), (1, 0))
+        self.assertEqual(b.hit('k', 60, now=1), (2, 0))
+        self.assertEqual(b.hit('k', 60, now=61), (1, 2))
+
+
+class Rate_limited_endpoint_tests(DB_tests):
+    config = {
+        'RATE_LIMIT_BACKEND': 'memory',
+        'RATE_LIMITS': {
+            'auth_bp.login': {'ip': '100/60', 'email': '2/60'},
+            'auth_bp.get_verification_code': {'ip': '100/60', 'email': '2/60'}
+        }
+    }
+
+    def login(self, email):
+        return self.app.test_client().post('/api/v1/auth/login', json={"email": email, "password": "1478520.Lu"})
+
+    def test1_rejected_over_the_limit(self):
+        self.assertEqual(self.login("valid@email.com").status_code, 404)
+        self.assertEqual(self.login("VALID@email.com").status_code, 404)
+        resp = self.login("valid@email.com")
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp.headers['Retry-After']), 1)
+        self.assertEqual(resp.get_json()['result'], 'error')
+        self.assertEqual(resp.get_json()['data']['retry_after'], int(resp.headers['Retry-After']))
+
+    def test2_limits_are_per_email(self):
+        for _ in range(2):
+            self.login("valid@email.com")
+        self.assertEqual(self.login("other@email.com").status_code, 404)
+
+    def test3_email_in_the_query_string(self):
+        #json_required asks for a body, GETs send {} and the email in the query string
+        get = lambda email: self.app.test_client().get('/api/v1/auth/get-verification-code', json={}, query_string={'email': email})
+        self.assertEqual(get("valid@email.com").status_code, 404)
+        self.assertEqual(get("VALID@email.com").status_code, 404)
+        self.assertEqual(get("valid@email.com").status_code, 429)
+        self.assertEqual(get("other@email.com").status_code, 404)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class Redis_rate_limited_endpoint_tests(Rate_limited_endpoint_tests):
+    config = {**Rate_limited_endpoint_tests.config, 'RATE_LIMIT_BACKEND': 'redis', 'RATE_LIMIT_FAIL_OPEN': False}
+
+    def setUp(self):
+        super().setUp()
+        fake_redis(self.app)
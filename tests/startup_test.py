@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+from unittest import mock
+from app import create_app
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+#seconds for import + create_app of a fresh process, generous: ci machines are slow
+STARTUP_BUDGET = float(os.environ.get('STARTUP_BUDGET', 5.0))
+DEFERRED_MODULES = ('flask_assets', 'webassets', 'flask_migrate', 'alembic', 'redis', 'requests')
+
+STARTUP_SCRIPT = '''
+import sys, json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app({
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+    'ASSETS_MODE': 'manifest',
+    'CATALOG_PRELOAD': False
+})
+print(json.dumps({
+    'import': imported - start,
+    'create_app': time.perf_counter() - imported,
+    'modules': [m for m in %r if m in sys.modules]
+}))
+''' % (DEFERRED_MODULES,)
+
+
+class Startup_tests(unittest.TestCase):
+
+    def config(self, **config):
+        return {
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            **config
+        }
+
+    def test1_cold_start(self):
+        env = {k: v for k, v in os.environ.items() if k not in ('SMTP_API_URL', 'SMTP_API_KEY', 'MAIL_MODE', 'FLASK_RUN_FROM_CLI')}
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(result['modules'], []) #loaded on first use
+        self.assertLess(result['import'] + result['create_app'], STARTUP_BUDGET)
+
+    def test2_manifest_urls(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'manifest.json')
+            with open(path, 'w') as f:
+                json.dump({'main_css': 'bundle/main.1a2b3c.css', 'main_js': 'bundle/main.4d5e6f.js'}, f)
+
+            app = create_app(self.config(ASSETS_MODE='manifest', ASSETS_MANIFEST=path))
+            with app.test_request_context():
+                html = app.jinja_env.from_string("{{ asset_url('main_css') }} {{ asset_url('main_js') }}").render()
+            self.assertEqual(html, "/static/bundle/main.1a2b3c.css /static/bundle/main.4d5e6f.js")
+
+    def test3_missing_manifest(self):
+        app = create_app(self.config(ASSETS_MODE='manifest', ASSETS_MANIFEST='/nonexistent/manifest.json'))
+        with app.test_request_context():
+            with self.assertRaises(RuntimeError):
+                app.jinja_env.from_string("{{ asset_url('main_css') }}").render()
+
+    def test4_migrate_only_in_the_cli(self):
+        app = create_app(self.config())
+        self.assertNotIn('migrate', app.extensions)
+
+        with mock.patch.dict(os.environ, {'FLASK_RUN_FROM_CLI': 'true'}):
+            app = create_app(self.config())
+        self.assertIn('migrate', app.extensions)
+
+
+if __name__ == '__main__':
+    unittest.main()
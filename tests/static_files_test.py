@@ -0,0 +1,98 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from app import create_app
+from app.utils import compression
+from app.utils.assets import precompress
+
+CSS = b"body{margin:0}" * 200
+
+
+class Static_files_tests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, 'bundle'))
+        self.css = os.path.join(self.dir, 'bundle', 'main.1a2b3c.css')
+        with open(self.css, 'wb') as f:
+            f.write(CSS)
+        with open(os.path.join(self.dir, 'robots.txt'), 'w') as f:
+            f.write("User-agent: *")
+        self.manifest = os.path.join(self.dir, 'bundle', 'manifest.json')
+        with open(self.manifest, 'w') as f:
+            json.dump({'main_css': 'bundle/main.1a2b3c.css'}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def client(self, **config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            'ASSETS_MODE': 'manifest',
+            'ASSETS_MANIFEST': self.manifest,
+            **config
+        })
+        app.static_folder = self.dir
+        return app.test_client()
+
+    def get(self, client, path, encoding=None):
+        headers = {'Accept-Encoding': encoding} if encoding else {}
+        resp = client.get(path, headers=headers)
+        data = resp.get_data() #closes the file
+        resp.close()
+        return resp, data
+
+    def test1_precompress(self):
+        written = precompress(self.css, ('gzip',))
+        self.assertEqual(written, [self.css + '.gz'])
+        with gzip.open(self.css + '.gz') as f:
+            self.assertEqual(f.read(), CSS)
+
+    def test2_immutable_hashed_file(self):
+        resp, data = self.get(self.client(), '/static/bundle/main.1a2b3c.css')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(data, CSS)
+        self.assertEqual(resp.mimetype, 'text/css')
+        self.assertTrue(resp.cache_control.immutable)
+        self.assertTrue(resp.cache_control.public)
+        self.assertEqual(resp.cache_control.max_age, 365 * 24 * 3600)
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test3_precompressed_sibling(self):
+        precompress(self.css, ('gzip',))
+        client = self.client()
+
+        resp, data = self.get(client, '/static/bundle/main.1a2b3c.css', 'gzip, deflate')
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(resp.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', resp.vary)
+        self.assertEqual(gzip.decompress(data), CSS)
+
+        resp, data = self.get(client, '/static/bundle/main.1a2b3c.css', 'identity')
+        self.assertNotIn('Content-Encoding', resp.headers)
+        self.assertEqual(data, CSS)
+
+    @unittest.skipIf('br' not in compression.COMPRESSORS, "brotli not installed")
+    def test4_client_preference(self):
+        precompress(self.css, ('br', 'gzip'))
+        client = self.client()
+        resp, _ = self.get(client, '/static/bundle/main.1a2b3c.css', 'gzip, br')
+        self.assertEqual(resp.headers['Content-Encoding'], 'br')
+        resp, _ = self.get(client, '/static/bundle/main.1a2b3c.css', 'gzip;q=1, br;q=0.5')
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+
+    def test5_other_static_files(self):
+        for config in ({}, {'ASSETS_MODE': 'runtime'}):
+            resp, data = self.get(self.client(**config), '/static/robots.txt', 'gzip')
+            self.assertEqual(data, b"User-agent: *")
+            self.assertFalse(resp.cache_control.immutable)
+            self.assertNotIn('Content-Encoding', resp.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import time
+import datetime
+import unittest
+from unittest import mock
+from flask_jwt_extended import create_access_token, decode_token
+from app import create_app
+from app.extensions import db, token_blocklist
+from app.models.main import User
+from fixtures import fakeredis, fake_redis
+
+
+class _Token_tests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = self.create()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.add_user()
+        self.state = self.app.extensions['token_blocklist']
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def add_user(self):
+        db.create_all()
+        db.session.add(User(email="a@email.com", password_hash="x", fname="a", status='active', email_confirmed=True))
+        db.session.commit()
+
+    def create(self, **config):
+        return create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'JWT_SECRET_KEY': 'test-jwt-secret-key-0123456789abcdef',
+            'USER_CACHE_ENABLED': False,
+            **config
+        })
+
+    def token(self, **claims):
+        return create_access_token(identity="a@email.com", additional_claims=claims or {'user_access_token': True})
+
+    def profile(self, token, app=None):
+        return (app or self.app).test_client().get('/api/v1/profile/', json={}, headers={"Authorization": f"Bearer {token}"})
+
+
+class Token_generation_tests(_Token_tests):
+
+    def create(self, **config):
+        return super().create(JWT_BLOCKLIST_FAIL_OPEN=True, **config) #no redis here
+
+    def test1_gen_claim(self):
+        self.state.generations.set("a@email.com", 1700000000000000) #cached, as read from redis
+        self.assertEqual(decode_token(self.token())['gen'], 1700000000000000)
+
+    def test2_older_generation_revoked(self):
+        old = self.token() #redis unreachable: generation 0
+        self.assertEqual(decode_token(old)['gen'], 0)
+        self.assertEqual(self.profile(old).status_code, 200)
+
+        self.state.generations.set("a@email.com", 1700000000000000) #revoke_all in other worker
+        self.assertEqual(self.profile(old).status_code, 401)
+        self.assertEqual(self.profile(self.token()).status_code, 200)
+
+    def test3_tokens_of_other_users(self):
+        self.state.generations.set("b@email.com", 1700000000000000)
+        self.assertEqual(self.profile(self.token()).status_code, 200)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class Revoke_all_tests(_Token_tests):
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        super().setUp()
+
+    def create(self, **config):
+        app = super().create(JWT_ACCESS_TOKEN_EXPIRES=datetime.timedelta(minutes=10), **config) #fail-closed, the production default
+        fake_redis(app, self.server)
+        return app
+
+    def test1_revoke_all(self):
+        before = self.token()
+        self.assertEqual(self.profile(before).status_code, 200)
+
+        token_blocklist.revoke_all("a@email.com")
+        client = self.app.extensions['redis'].client
+        self.assertGreater(int(client.get("tokgen:a@email.com")), 0)
+        self.assertAlmostEqual(client.ttl("tokgen:a@email.com"), 600, delta=2) #expires with the tokens
+
+        self.assertEqual(self.profile(before).status_code, 401)
+        self.assertEqual(self.profile(self.token()).status_code, 200)
+
+    def test2_generation_always_grows(self):
+        token_blocklist.revoke_all("a@email.com")
+        first = self.state.generation("a@email.com")
+        with mock.patch('app.utils.token_blocklist.time.time_ns', return_value=0): #worker with a late clock
+            token_blocklist.revoke_all("a@email.com")
+        self.assertEqual(self.state.generation("a@email.com"), first + 1)
+
+    def test3_other_workers(self):
+        other = self.create()
+        token = self.token()
+        with other.app_context():
+            self.add_user() #the db of the other worker is another sqlite in memory
+            self.assertEqual(self.profile(token, other).status_code, 200) #generation cached, listener started
+            other_state = other.extensions['token_blocklist']
+            deadline = time.monotonic() + 5
+            while not other_state.subscribed and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        token_blocklist.revoke_all("a@email.com") #published on the blocklist channel
+        deadline = time.monotonic() + 5
+        while other_state.generations.get("a@email.com") == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(other_state.generations.get("a@email.com"), self.state.generation("a@email.com"))
+        with other.app_context():
+            self.assertEqual(self.profile(token, other).status_code, 401)
+
+    def test4_password_change(self):
+        session = self.token()
+        verified = self.token(verified_token=True)
+        resp = self.app.test_client().put(
+            '/api/v1/auth/password-change', json={"new_password": "1478520.Lu"},
+            headers={"Authorization": f"Bearer {verified}"}
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(self.profile(session).status_code, 401)
+        resp = self.app.test_client().put(
+            '/api/v1/auth/password-change', json={"new_password": "1478520.Lu"},
+            headers={"Authorization": f"Bearer {verified}"}
+        )
+        self.assertEqual(resp.status_code, 401) #the token of the change is revoked too
+
+    def test5_logout(self):
+        session, other = self.token(), self.token()
+        resp = self.app.test_client().delete('/api/v1/auth/logout', json={}, headers={"Authorization": f"Bearer {session}"})
+        self.assertEqual(resp.status_code, 200)
+
+        jti = decode_token(session)['jti']
+        self.assertAlmostEqual(self.app.extensions['redis'].client.ttl(jti), 600, delta=2) #expires with the token
+        self.assertEqual(self.profile(session).status_code, 401)
+        self.assertEqual(self.profile(other).status_code, 200) #only this session
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from flask_jwt_extended import create_access_token
+from app.extensions import db, user_cache
+from app.models.main import User
+from fixtures import DB_tests
+
+
+class User_cache_tests(DB_tests):
+    config = {
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'USER_CACHE_REDIS': False
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.user = User(email="valid@email.com", password_hash="x", fname="Luis", email_confirmed=True, status='active')
+        db.session.add(self.user)
+        db.session.commit()
+        token = create_access_token(identity="valid@email.com", additional_claims={'user_access_token': True})
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.queries.clear()
+
+    def get_profile(self):
+        resp = self.app.test_client().get('/api/v1/profile/', headers=self.headers, json={})
+        self.assertEqual(resp.status_code, 200)
+        return resp.get_json()['data']['user']
+
+    def test1_warm_cache_skips_the_db(self):
+        first = self.get_profile()
+        self.assertEqual(len(self.queries), 1)
+        self.queries.clear()
+        self.assertEqual(self.get_profile(), first)
+        self.assertEqual(len(self.queries), 0)
+
+    def test2_invalidated_on_commit(self):
+        self.assertEqual(self.get_profile()['fname'], "Luis")
+        self.user.fname = "Alejandro"
+        db.session.commit()
+        self.assertEqual(self.get_profile()['fname'], "Alejandro")
+
+    def test3_not_invalidated_on_rollback(self):
+        self.get_profile()
+        self.user.fname = "Alejandro"
+        db.session.flush()
+        db.session.rollback()
+        self.queries.clear()
+        self.assertEqual(self.get_profile()['fname'], "Luis")
+        self.assertEqual(len(self.queries), 0)
+
+    def test4_missing_users_are_not_cached(self):
+        calls = []
+        def loader():
+            calls.append(1)
+            return None
+        user_cache.get("other@email.com", loader)
+        user_cache.get("other@email.com", loader)
+        self.assertEqual(len(calls), 2)
@@ -92,3 +92,46 @@ class Input_validator_tests(unittest.TestCase):
     def test3_wrong_input_instance(self):
         with self.assertRaises(TypeError):
             val.validate_inputs('string_input3')
+
+
+class Schema_validation_tests(unittest.TestCase):
+
+    schema = val.Schema({
+        'email': val.email_field(),
+        'password': val.password_field(),
+        'fname': val.letters_field(spaces=True),
+        'age': int
+    })
+
+    def get_error(self, data):
+        try:
+            self.schema.validate(data)
+        except Exception as e:
+            return e.serialize()
+        return None
+
+    def test1_valid_input(self):
+        v = self.schema.validate({'email': 'valid@email.com', 'password': '1478520.Lu', 'fname': 'Luis Ale', 'age': 3})
+        self.assertEqual(v, None)
+
+    def test2_missing_keys(self):
+        e = self.get_error({'email': 'valid@email.com'})
+        self.assertEqual(e['data'], {'missing': ['password', 'fname', 'age']})
+
+    def test3_wrong_types(self):
+        e = self.get_error({'email': 'valid@email.com', 'password': '1478520.Lu', 'fname': 'Luis', 'age': '3'})
+        self.assertIn('required', e['data'])
+        self.assertEqual(e['data']['required']['age'], str(int))
+
+    def test4_invalid_values_match_validators(self):
+        e = self.get_error({'email': 'invalid@@email', 'password': '1', 'fname': 'lui28', 'age': 3})
+        self.assertEqual(e['data']['invalid'], {
+            'email': val.validate_email('invalid@@email')['msg'],
+            'password': val.validate_pw('1')['msg'],
+            'fname': val.only_letters('lui28', spaces=True)['msg']
+        })
+
+    def test5_max_length(self):
+        schema = val.Schema({'name': val.letters_field(max_length=2)})
+        with self.assertRaises(Exception):
+            schema.validate({'name': 'superlong'})